@@ -2,7 +2,8 @@
 # coding=utf8
 """Annotator"""
 import json
-from lazy import lazy
+from bisect import bisect_left, bisect_right
+import numpy as np
 import maximum_weight_interval_set as mwis
 
 
@@ -72,9 +73,86 @@ class AnnoDoc(object):
             ])
             tier.spans = []
         my_mwis = mwis.find_maximum_weight_interval_set(intervals)
+        retained_spans = {}
         for interval in my_mwis:
             tier, span = interval.corresponding_object
-            tier.spans.append(span)
+            retained_spans.setdefault(tier, []).append(span)
+        # The spans are reassigned rather than appended so the tiers'
+        # range query indexes are invalidated.
+        for tier, spans in retained_spans.items():
+            tier.spans = spans
+
+
+class AnnoTierIndex(object):
+    """
+    A sorted index of the start offsets of the spans in a tier used to answer
+    range queries with binary searches rather than scanning the whole tier.
+    Spans that overlap a range are found with an implicit interval tree over
+    the sorted spans. Each node is the midpoint of a range of sorted spans
+    and stores the greatest end offset in that range, so ranges that end
+    before the query are skipped even when the tier has some long spans.
+    """
+
+    def __init__(self, spans):
+        self.order = sorted(range(len(spans)), key=lambda idx: spans[idx].start)
+        self.starts = [spans[idx].start for idx in self.order]
+        self.ends = [spans[idx].end for idx in self.order]
+        self.max_ends = list(self.ends)
+        if self.ends:
+            self._build_max_ends(0, len(self.ends))
+        # The index is rebuilt if the tier's span list is replaced or changes
+        # size.
+        self.spans_id = id(spans)
+        self.size = len(spans)
+
+    def _build_max_ends(self, lo, hi):
+        mid = (lo + hi) // 2
+        if lo < mid:
+            self.max_ends[mid] = max(
+                self.max_ends[mid], self._build_max_ends(lo, mid))
+        if mid + 1 < hi:
+            self.max_ends[mid] = max(
+                self.max_ends[mid], self._build_max_ends(mid + 1, hi))
+        return self.max_ends[mid]
+
+    def is_current(self, spans):
+        return self.spans_id == id(spans) and self.size == len(spans)
+
+    def _select(self, spans, sorted_idxs):
+        # Spans are returned in tier order.
+        return [spans[idx] for idx in sorted(self.order[i] for i in sorted_idxs)]
+
+    def over(self, spans, start, end):
+        # Only spans that start before the end of the range can overlap it.
+        hi = bisect_left(self.starts, end)
+        sorted_idxs = []
+        subtrees = [(0, len(self.starts))]
+        while subtrees:
+            lo, subtree_hi = subtrees.pop()
+            if lo >= subtree_hi or lo >= hi:
+                continue
+            mid = (lo + subtree_hi) // 2
+            if self.max_ends[mid] <= start:
+                continue
+            subtrees.append((lo, mid))
+            if mid < hi:
+                # Empty spans do not overlap anything.
+                if self.ends[mid] > max(start, self.starts[mid]):
+                    sorted_idxs.append(mid)
+                subtrees.append((mid + 1, subtree_hi))
+        return self._select(spans, sorted_idxs)
+
+    def within(self, spans, start, end):
+        lo = bisect_left(self.starts, start)
+        hi = bisect_right(self.starts, end)
+        return self._select(spans, [
+            i for i in range(lo, hi) if self.ends[i] <= end])
+
+    def at(self, spans, start, end):
+        lo = bisect_left(self.starts, start)
+        hi = bisect_right(self.starts, start)
+        return self._select(spans, [
+            i for i in range(lo, hi) if self.ends[i] == end])
 
 
 class AnnoTier(object):
@@ -85,19 +163,42 @@ class AnnoTier(object):
         else:
             self.spans = sorted(spans)
 
+    @property
+    def spans(self):
+        return self._spans
+
+    @spans.setter
+    def spans(self, spans):
+        self._spans = spans
+        self._index = None
+
+    @property
+    def index(self):
+        """
+        The range query index is built lazily on the first query and rebuilt
+        when the spans are reassigned or the span list changes size.
+        Call invalidate_index after editing spans in place.
+        """
+        spans = self.spans
+        if self._index is None or not self._index.is_current(spans):
+            self._index = AnnoTierIndex(spans)
+        return self._index
+
+    def invalidate_index(self):
+        """Rebuild the range query index on the next query"""
+        self._index = None
+
     def __repr__(self):
         return unicode([unicode(span) for span in self.spans])
 
     def __len__(self):
         return len(self.spans)
 
+    def __iter__(self):
+        return iter(self.spans)
+
     def to_json(self):
-        docless_spans = []
-        for span in self.spans:
-            span_dict = span.__dict__.copy()
-            del span_dict['doc']
-            docless_spans.append(span_dict)
-        return json.dumps(docless_spans)
+        return json.dumps([span.attribute_dict() for span in self.spans])
 
     def group_spans_by_containing_span(self, other_tier, allow_partial_containment=False):
         """
@@ -146,18 +247,17 @@ class AnnoTier(object):
         """Get all spans which overlap a position or range"""
         if not end:
             end = start + 1
-        return filter(lambda span: len(set(range(span.start, span.end)).
-                                       intersection(range(start, end))) > 0,
-                      self.spans)
+        if start >= end:
+            return []
+        return self.index.over(self.spans, start, end)
 
     def spans_in(self, start, end):
         """Get all spans which are contained in a range"""
-        return filter(lambda span: span.start >= start and span.end <= end, self.spans)
+        return self.index.within(self.spans, start, end)
 
     def spans_at(self, start, end):
         """Get all spans with certain start and end positions"""
-        return filter(lambda span: start == span.start and end == span.end,
-                      self.spans)
+        return self.index.at(self.spans, start, end)
 
     def spans_over_span(self, span):
         """Get all spans which overlap another span"""
@@ -185,23 +285,223 @@ class AnnoTier(object):
 
     def filter_overlapping_spans(self, score_func=None):
         """Remove the smaller of any overlapping spans."""
-        my_mwis = mwis.find_maximum_weight_interval_set([
-            mwis.Interval(
-                start=span.start,
-                end=span.end,
-                weight=score_func(span) if score_func else (
-                    span.end - span.start),
-                corresponding_object=span
-            )
-            for span in self.spans
-        ])
-        self.spans = [
-            interval.corresponding_object
-            for interval in my_mwis
-        ]
+        mwis_indices = mwis.find_maximum_weight_interval_set_indices(
+            [span.start for span in self.spans],
+            [span.end for span in self.spans],
+            [score_func(span) if score_func else (span.end - span.start)
+             for span in self.spans])
+        self.spans = [self.spans[idx] for idx in mwis_indices]
+
+
+class ColumnarAnnoTier(AnnoTier):
+    """
+    An AnnoTier that stores the span offsets and label codes in NumPy arrays.
+    AnnoSpans are only created for the spans that are accessed. Accessing the
+    spans attribute materializes and caches a span for every row, so code that
+    handles large tiers should prefer iteration, the spans_* queries and the
+    starts/ends arrays.
+    Spans without a label code are labeled with their text like AnnoSpans
+    created without a label.
+    """
+
+    def __init__(self, doc, starts=None, ends=None, labels=None):
+        self.doc = doc
+        if starts is None:
+            starts = []
+            ends = []
+        self.set_columns(starts, ends, labels)
+
+    @classmethod
+    def from_spans(cls, spans, doc=None):
+        spans = list(spans)
+        if doc is None and len(spans) > 0:
+            doc = spans[0].doc
+        tier = cls(doc)
+        tier.spans = spans
+        return tier
+
+    def set_columns(self, starts, ends, labels=None, label_names=None):
+        """
+        Replace the spans in the tier. Labels can either be a sequence of
+        label strings (or None) or an array of codes into label_names.
+        """
+        starts = np.asarray(starts, dtype=np.int32)
+        ends = np.asarray(ends, dtype=np.int32)
+        if label_names is not None:
+            label_codes = np.asarray(labels, dtype=np.int32)
+        elif labels is not None:
+            label_names = []
+            label_name_to_code = {}
+            label_codes = np.empty(len(starts), dtype=np.int32)
+            for idx, label in enumerate(labels):
+                if label is None:
+                    label_codes[idx] = -1
+                    continue
+                if label not in label_name_to_code:
+                    label_name_to_code[label] = len(label_names)
+                    label_names.append(label)
+                label_codes[idx] = label_name_to_code[label]
+        else:
+            label_names = []
+            label_codes = np.full(len(starts), -1, dtype=np.int32)
+        order = np.argsort(starts, kind='mergesort')
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.label_codes = label_codes[order]
+        self.label_names = list(label_names)
+        self.max_length = int((self.ends - self.starts).max()) if len(
+            self.starts) > 0 else 0
+        self._spans = None
+        self._index = None
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            self._spans = [self.make_span(idx) for idx in range(len(self))]
+        return self._spans
+
+    @spans.setter
+    def spans(self, spans):
+        spans = sorted(spans)
+        self.set_columns(
+            [span.start for span in spans],
+            [span.end for span in spans],
+            [span._label for span in spans])
+        # The given spans are kept so they retain their identities.
+        self._spans = spans
+
+    def make_span(self, idx):
+        code = self.label_codes[idx]
+        return AnnoSpan(int(self.starts[idx]), int(self.ends[idx]), self.doc,
+                        self.label_names[code] if code >= 0 else None)
+
+    def span(self, idx):
+        """Get the span in the given row, creating it if necessary"""
+        if self._spans is not None:
+            return self._spans[idx]
+        return self.make_span(idx)
+
+    def _select(self, idxs):
+        return [self.span(idx) for idx in idxs]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.span(idx)
+
+    def spans_over(self, start, end=None):
+        """Get all spans which overlap a position or range"""
+        if not end:
+            end = start + 1
+        if start >= end:
+            return []
+        lo = np.searchsorted(self.starts, start - self.max_length, 'right')
+        hi = np.searchsorted(self.starts, end, 'left')
+        ends = self.ends[lo:hi]
+        mask = (ends > start) & (ends > self.starts[lo:hi])
+        return self._select(lo + np.flatnonzero(mask))
+
+    def spans_in(self, start, end):
+        """Get all spans which are contained in a range"""
+        lo = np.searchsorted(self.starts, start, 'left')
+        hi = np.searchsorted(self.starts, end, 'right')
+        return self._select(lo + np.flatnonzero(self.ends[lo:hi] <= end))
+
+    def spans_at(self, start, end):
+        """Get all spans with certain start and end positions"""
+        lo = np.searchsorted(self.starts, start, 'left')
+        hi = np.searchsorted(self.starts, start, 'right')
+        return self._select(lo + np.flatnonzero(self.ends[lo:hi] == end))
+
+    def spans_with_label(self, label):
+        """Get all spans which have a given label"""
+        mask = np.zeros(len(self), dtype=bool)
+        if label in self.label_names:
+            mask |= self.label_codes == self.label_names.index(label)
+        for idx in np.flatnonzero(self.label_codes == -1):
+            if self.doc.text[self.starts[idx]:self.ends[idx]] == label:
+                mask[idx] = True
+        return self._select(np.flatnonzero(mask))
+
+    def labels(self):
+        """Get a list of all labels in this tier"""
+        return [
+            self.label_names[code] if code >= 0 else
+            self.doc.text[start:end]
+            for start, end, code in zip(
+                self.starts.tolist(),
+                self.ends.tolist(),
+                self.label_codes.tolist())]
+
+    def group_spans_by_containing_span(self, other_tier, allow_partial_containment=False):
+        """
+        Group spans in the other tier by the spans that contain them.
+        The groups are the same as those produced by
+        AnnoTier.group_spans_by_containing_span, but the bounds of every group
+        are found at once with binary searches over the other tier's columns.
+        """
+        if isinstance(other_tier, ColumnarAnnoTier):
+            other_starts = other_tier.starts
+            other_ends = other_tier.ends
+            get_other_span = other_tier.span
+        else:
+            if isinstance(other_tier, AnnoTier):
+                other_spans = other_tier.spans
+            else:
+                other_spans = sorted(other_tier)
+            other_starts = np.array(
+                [span.start for span in other_spans], dtype=np.int32)
+            other_ends = np.array(
+                [span.end for span in other_spans], dtype=np.int32)
+            get_other_span = other_spans.__getitem__
+        group_ends = np.searchsorted(other_starts, self.ends, 'left')
+        if allow_partial_containment:
+            # Groups begin at the first span that ends after the containing
+            # span starts.
+            if len(other_ends) > 0:
+                max_other_ends = np.maximum.accumulate(other_ends)
+            else:
+                max_other_ends = other_ends
+            group_starts = np.searchsorted(
+                max_other_ends, self.starts, 'right')
+            group_ends = np.maximum(group_starts, group_ends)
+        else:
+            group_starts = np.searchsorted(other_starts, self.starts, 'left')
+        for idx, group_start, group_end in zip(
+                range(len(self)), group_starts.tolist(), group_ends.tolist()):
+            group_idxs = range(group_start, group_end)
+            if not allow_partial_containment:
+                group_idxs = group_start + np.flatnonzero(
+                    other_ends[group_start:group_end] <= self.ends[idx])
+            yield self.span(idx), [get_other_span(i) for i in group_idxs]
+
+    def filter_overlapping_spans(self, score_func=None):
+        """Remove the smaller of any overlapping spans."""
+        if score_func:
+            weights = [score_func(span) for span in self]
+        else:
+            weights = (self.ends - self.starts).tolist()
+        retained = np.array(mwis.find_maximum_weight_interval_set_indices(
+            self.starts, self.ends, weights), dtype=np.intp)
+        spans = self._spans
+        self.set_columns(
+            self.starts[retained],
+            self.ends[retained],
+            self.label_codes[retained],
+            self.label_names)
+        if spans is not None:
+            self._spans = [spans[idx] for idx in retained]
 
 
 class AnnoSpan(object):
+    """
+    Spans only store their offsets. The text is sliced from the document when
+    it is accessed, and spans without a label are labeled with their text.
+    Subclasses must declare their attributes in __slots__.
+    """
+    __slots__ = ['start', 'end', 'doc', '_label']
 
     def __repr__(self):
         return u'{0}-{1}:{2}'.format(self.start, self.end, self.label)
@@ -210,17 +510,13 @@ class AnnoSpan(object):
         self.start = start
         self.end = end
         self.doc = doc
-
-        if label is None:
-            self.label = self.text
-        else:
-            self.label = label
+        self._label = label
 
     def __lt__(self, other):
         return self.start < other.start
 
     def __len__(self):
-        return len(self.text)
+        return self.end - self.start
 
     def overlaps(self, other_span):
         return (
@@ -258,10 +554,33 @@ class AnnoSpan(object):
 
     def size(self): return self.end - self.start
 
-    @lazy
+    @property
     def text(self):
         return self.doc.text[self.start:self.end]
 
+    @property
+    def label(self):
+        if self._label is None:
+            return self.text
+        return self._label
+
+    @label.setter
+    def label(self, label):
+        self._label = label
+
+    def attribute_dict(self):
+        """
+        Return a dictionary of the span's attributes other than its document.
+        """
+        result = {}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', []):
+                if slot != 'doc' and hasattr(self, slot):
+                    result[slot] = getattr(self, slot)
+        del result['_label']
+        result['label'] = self.label
+        return result
+
     def to_dict(self):
         """
         Return a json serializable dictionary.
@@ -6,6 +6,7 @@ cumulative, case, death, age, hospitalization, approximate, min, max
 import re
 from annotator import Annotator, AnnoTier, AnnoSpan
 from jvm_nlp_annotator import JVMNLPAnnotator
+from number_annotator import NumberAnnotator
 from spacy_annotator import SpacyAnnotator
 import result_aggregators as ra
 from result_aggregators import MatchSpan
@@ -14,8 +15,14 @@ import logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s %(message)s')
 logger = logging.getLogger(__name__)
 
+# The annotators that numbers can be found with. stanford uses the NUMBER
+# named entities from the jvm-nlp service and spacy uses the NumberAnnotator,
+# which does not make requests to the service.
+NUMBER_SOURCES = ['stanford', 'spacy']
+
 
 class CountSpan(AnnoSpan):
+    __slots__ = ['match', 'metadata']
     attributes = [
         "annual",
         "approximate",
@@ -37,7 +44,7 @@ class CountSpan(AnnoSpan):
         self.start = match_span.start
         self.end = match_span.end
         self.doc = match_span.doc
-        self.label = match_span.text
+        self.label = None
         self.match = match_span
         match_dict = match_span.groupdict()
         attributes = set([
@@ -94,16 +101,35 @@ def search_spans_for_regex(regex_term, spans, match_name=None):
 
 
 class CountAnnotator(Annotator):
-    def annotate(self, doc):
-        if 'spacy.tokens' not in doc.tiers:
-            doc.add_tier(SpacyAnnotator())
+    def __init__(self, number_source='stanford'):
+        """
+        number_source is one of NUMBER_SOURCES. It chooses whether the
+        numbers in counts are found by the jvm-nlp service or in the spaCy
+        tokens.
+        """
+        if number_source not in NUMBER_SOURCES:
+            raise ValueError("Unknown number source: " + number_source)
+        self.number_source = number_source
+
+    def number_spans(self, doc):
+        if self.number_source == 'spacy':
+            if 'numbers' not in doc.tiers:
+                doc.add_tier(NumberAnnotator())
+            return doc.tiers['numbers'].spans
         if 'stanford.times' not in doc.tiers:
             doc.add_tier(JVMNLPAnnotator([
                 'times', 'nes', 'sentences', 'tokens']))
+        return [
+            ne_span for ne_span in doc.tiers['stanford.nes'].spans
+            if ne_span.type == 'NUMBER']
+
+    def annotate(self, doc):
+        if 'spacy.tokens' not in doc.tiers:
+            doc.add_tier(SpacyAnnotator())
         counts = []
-        for ne_span in doc.tiers['stanford.nes'].spans:
-            if ne_span.type == 'NUMBER' and is_valid_count(ne_span.text):
-                counts.append(MatchSpan(ne_span, 'count'))
+        for number_span in self.number_spans(doc):
+            if is_valid_count(number_span.text):
+                counts.append(MatchSpan(number_span, 'count'))
 
         def search_regex(regex_term, match_name=None):
             return search_spans_for_regex(
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Match dictionary entries against the token ngrams of a document"""
+from bisect import bisect_right
+from annotator import ColumnarAnnoTier
+
+
+class DictionaryMatcher(object):
+    """
+    Finds the sequences of up to max_tokens tokens whose text is a key in
+    a dictionary.
+
+    The keys are kept in a sorted list which is used like a trie: Matching
+    starts at every token and extends the match one token at a time until
+    no key begins with the text matched so far. Each step is a binary search,
+    so matching a document does not depend on the number of keys beyond that,
+    and no ngrams are created for text that cannot match.
+    """
+
+    def __init__(self, entries, max_tokens=7):
+        """
+        entries is a dictionary or a sequence of key, value pairs.
+        """
+        self.entries = {}
+        for key, value in dict(entries).items():
+            if isinstance(key, str):
+                key = key.decode('utf8')
+            self.entries[key] = value
+        self.sorted_keys = sorted(self.entries)
+        self.max_tokens = max_tokens
+
+    def __len__(self):
+        return len(self.entries)
+
+    def has_longer_key(self, prefix):
+        """Is there a key that begins with but is longer than the prefix?"""
+        idx = bisect_right(self.sorted_keys, prefix)
+        return (idx < len(self.sorted_keys) and
+                self.sorted_keys[idx].startswith(prefix))
+
+    def match(self, doc, token_tier, lowercase=False):
+        """
+        Yield the start offset, end offset, matched text and value for
+        every token sequence whose text is a key. The text is lowercased
+        before it is matched if lowercase is True.
+        """
+        if isinstance(token_tier, ColumnarAnnoTier):
+            token_starts = token_tier.starts.tolist()
+            token_ends = token_tier.ends.tolist()
+        else:
+            token_starts = [span.start for span in token_tier.spans]
+            token_ends = [span.end for span in token_tier.spans]
+        text = doc.text
+        lowercase_each = False
+        if lowercase:
+            # Lowercasing the whole document only preserves offsets when no
+            # character lowercases to multiple characters.
+            lowercase_text = text.lower()
+            if len(lowercase_text) == len(text):
+                text = lowercase_text
+            else:
+                lowercase_each = True
+        entries = self.entries
+        num_tokens = len(token_starts)
+        for first_token in range(num_tokens):
+            start = token_starts[first_token]
+            last_token = first_token
+            while last_token < num_tokens:
+                end = token_ends[last_token]
+                ngram = text[start:end]
+                if lowercase_each:
+                    ngram = ngram.lower()
+                if ngram in entries:
+                    yield start, end, ngram, entries[ngram]
+                last_token += 1
+                if (last_token - first_token >= self.max_tokens or
+                        not self.has_longer_key(ngram)):
+                    break
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""Vectorized distance and containment computations for geonames"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.009
+
+ADMIN_CODE_FIELDS = [
+    'country_code',
+    'admin1_code',
+    'admin2_code',
+    'admin3_code',
+    'admin4_code'
+]
+
+
+def great_circle_distances(lats_a, longs_a, lats_b, longs_b):
+    """
+    Return the great circle distances in kilometers between the points in
+    arrays of latitudes and longitudes given in degrees.
+    This uses the same formula as geopy's great_circle so the distances
+    match the ones the geoname classifier was trained with.
+    """
+    lats_a = np.radians(lats_a)
+    lats_b = np.radians(lats_b)
+    delta_longs = np.radians(longs_b) - np.radians(longs_a)
+    sin_lats_a = np.sin(lats_a)
+    cos_lats_a = np.cos(lats_a)
+    sin_lats_b = np.sin(lats_b)
+    cos_lats_b = np.cos(lats_b)
+    cos_delta_longs = np.cos(delta_longs)
+    central_angles = np.arctan2(
+        np.sqrt(
+            (cos_lats_b * np.sin(delta_longs)) ** 2 +
+            (cos_lats_a * sin_lats_b -
+             sin_lats_a * cos_lats_b * cos_delta_longs) ** 2),
+        sin_lats_a * sin_lats_b + cos_lats_a * cos_lats_b * cos_delta_longs)
+    return EARTH_RADIUS_KM * central_angles
+
+
+def feature_level(feature_code):
+    """
+    Return the level of the administrative division a feature code
+    represents. Countries are level 1 and ADM1 through ADM4 divisions are
+    levels 2 through 5. Other features have level 0.
+    """
+    if feature_code.startswith('PCL') and len(feature_code) > 3:
+        return 1
+    elif feature_code in ('ADM1', 'ADM2', 'ADM3', 'ADM4'):
+        return int(feature_code[3]) + 1
+    else:
+        return 0
+
+
+def admin_path(geoname):
+    """
+    Return the admin codes of a geoname down to its first empty code joined
+    with periods, e.g. US.WA.033
+    """
+    codes = []
+    for field in ADMIN_CODE_FIELDS:
+        code = geoname[field]
+        if not code:
+            break
+        codes.append(code)
+    return '.'.join(codes)
+
+
+def admin_path_prefix(path, level):
+    """
+    Return the first level codes of an admin path, or None if the path has
+    fewer codes.
+    """
+    if level == 0 or not path:
+        return None
+    codes = path.split('.')
+    if len(codes) < level:
+        return None
+    return '.'.join(codes[:level])
+
+
+def containment_key(feature_level, admin_path):
+    """
+    Return the admin path prefix that the geonames a division contains
+    begin with, or None if the geoname is not a division that can contain
+    other geonames.
+    """
+    return admin_path_prefix(admin_path, feature_level)
+
+
+def admin_path_prefix_matrix(admin_paths):
+    """
+    Return an integer matrix with a row for each admin path and a column for
+    each level. Each prefix of the paths is given a unique integer and
+    levels beyond the end of a path are -1.
+    """
+    matrix = np.full(
+        (len(admin_paths), len(ADMIN_CODE_FIELDS)), -1, dtype=np.int32)
+    prefix_ids = {}
+    for row, path in enumerate(admin_paths):
+        if not path:
+            continue
+        codes = path.split('.')
+        for level in range(1, len(codes) + 1):
+            prefix = '.'.join(codes[:level])
+            matrix[row, level - 1] = prefix_ids.setdefault(
+                prefix, len(prefix_ids))
+    return matrix
+
+
+def containment_levels(levels, prefix_ids, outer, inner):
+    """
+    Return the level at which the geonames at the outer indices contain the
+    geonames at the inner indices, or 0 where they do not.
+    levels are the feature levels of the geonames and prefix_ids is their
+    admin path prefix matrix. A division contains the geonames with its
+    admin path prefix at its level. Geonames do not contain themselves.
+    """
+    outer_levels = levels[outer]
+    level_columns = np.maximum(outer_levels - 1, 0)
+    outer_keys = np.where(
+        outer_levels > 0, prefix_ids[outer, level_columns], -1)
+    return np.where(
+        (outer != inner) & (outer_keys != -1) &
+        (prefix_ids[inner, level_columns] == outer_keys),
+        outer_levels, 0)
+
+
+# The spatial index divides the globe into a grid of cells this many degrees
+# of latitude high and longitude wide. Cells are numbered row by row from
+# the south west corner.
+GRID_CELL_DEGREES = 0.5
+GRID_ROWS = int(180 / GRID_CELL_DEGREES)
+GRID_COLUMNS = int(360 / GRID_CELL_DEGREES)
+
+
+def _grid_rows(lats):
+    return np.clip(np.floor(
+        (np.asarray(lats, dtype=np.float64) + 90) / GRID_CELL_DEGREES
+    ).astype(np.int64), 0, GRID_ROWS - 1)
+
+
+def _grid_columns(longs):
+    return np.clip(np.floor(
+        (np.asarray(longs, dtype=np.float64) + 180) / GRID_CELL_DEGREES
+    ).astype(np.int64), 0, GRID_COLUMNS - 1)
+
+
+def grid_cells(lats, longs):
+    """
+    Return the grid cells of the points in arrays of latitudes and longitudes.
+    """
+    return _grid_rows(lats) * GRID_COLUMNS + _grid_columns(longs)
+
+
+def grid_cell_ranges(lat, long, radius_km):
+    """
+    Return an array of the first and last cells of the runs of grid cells
+    that contain all the points within radius_km of a point.
+    """
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    min_lat = lat - np.degrees(angular_radius)
+    max_lat = lat + np.degrees(angular_radius)
+    long_ranges = [(-180.0, 180.0)]
+    if min_lat > -90 and max_lat < 90:
+        # The longitudes where the circle is widest.
+        sin_delta_long = np.sin(angular_radius) / np.cos(np.radians(lat))
+        if sin_delta_long < 1:
+            delta_long = np.degrees(np.arcsin(sin_delta_long))
+            min_long = long - delta_long
+            max_long = long + delta_long
+            # Circles that cross the antimeridian have cells at both ends
+            # of the rows.
+            if min_long < -180:
+                long_ranges = [(-180.0, max_long), (min_long + 360, 180.0)]
+            elif max_long > 180:
+                long_ranges = [(-180.0, max_long - 360), (min_long, 180.0)]
+            else:
+                long_ranges = [(min_long, max_long)]
+    rows = np.arange(_grid_rows(min_lat), _grid_rows(max_lat) + 1)
+    ranges = [
+        np.column_stack([
+            rows * GRID_COLUMNS + _grid_columns(range_min_long),
+            rows * GRID_COLUMNS + _grid_columns(range_max_long)])
+        for range_min_long, range_max_long in long_ranges]
+    return np.concatenate(ranges)
@@ -1,19 +1,19 @@
 #!/usr/bin/env python
 """Geoname Annotator"""
-import math
-import re
 import itertools
-import sqlite3
 from collections import defaultdict
-from lazy import lazy
 
-from annotator import Annotator, AnnoDoc, AnnoTier, AnnoSpan
+from annotator import Annotator, AnnoTier, AnnoSpan
 from ngram_annotator import NgramAnnotator
 from ne_annotator import NEAnnotator
-from geopy.distance import great_circle
+import numpy as np
 from maximum_weight_interval_set import Interval, find_maximum_weight_interval_set
+from lru_cache import LRUCache
+from geoname_store import SQLiteGeonameStore
+from geo_utils import (
+    great_circle_distances, containment_key, admin_path_prefix,
+    admin_path_prefix_matrix, containment_levels)
 
-from get_database_connection import get_database_connection
 import geoname_classifier
 
 import logging
@@ -50,36 +50,20 @@ def location_contains(loc_outer, loc_inner):
     In order for containment to be detected the outer location must have a
     ADM* or PCL* feature code, which is most countries, states, and districts.
     """
-    props = [
-        'country_code',
-        'admin1_code',
-        'admin2_code',
-        'admin3_code',
-        'admin4_code'
-    ]
     if loc_outer['geonameid'] == loc_inner['geonameid']:
         return 0
-    if re.match("^PCL.", loc_outer['feature_code']):
-        outer_feature_level = 1
-    elif loc_outer['feature_code'] == 'ADM1':
-        outer_feature_level = 2
-    elif loc_outer['feature_code'] == 'ADM2':
-        outer_feature_level = 3
-    elif loc_outer['feature_code'] == 'ADM3':
-        outer_feature_level = 4
-    elif loc_outer['feature_code'] == 'ADM4':
-        outer_feature_level = 5
-    else:
+    outer_feature_level = loc_outer['feature_level']
+    key = containment_key(outer_feature_level, loc_outer['admin_path'])
+    if key is None:
+        return 0
+    if admin_path_prefix(loc_inner['admin_path'], outer_feature_level) != key:
         return 0
-    for prop in props[:outer_feature_level]:
-        if loc_outer[prop] == '':
-            return 0
-        if loc_outer[prop] != loc_inner[prop]:
-            return 0
     return outer_feature_level
 
 
 class GeoSpan(AnnoSpan):
+    __slots__ = ['geoname']
+
     def __init__(self, start, end, doc, geoname):
         self.start = start
         self.end = end
@@ -93,45 +77,50 @@ class GeoSpan(AnnoSpan):
         return result
 
 
-class GeonameRow(sqlite3.Row):
-    def __init__(self, *args):
-        super(GeonameRow, self).__init__(*args)
-        self.alternate_locations = set()
+class GeonameCandidate(object):
+    """
+    A geoname that a document may refer to. Its values can be accessed like
+    those of the GeonameRecord it wraps.
+    """
+
+    def __init__(self, record):
+        self.record = record
         self.spans = set()
+        self.names_used = set()
+        self.alternate_locations = set()
         self.parents = set()
         self.score = None
+        self.high_confidence = False
 
-    def add_spans(self, span_text_to_spans):
-        for name in self['names_used'].split(';'):
-            for span in span_text_to_spans[name.lower().strip()]:
-                self.spans.add(span)
+    def __getitem__(self, key):
+        return self.record[key]
 
-    @lazy
-    def lat_long(self):
-        return (self['latitude'], self['longitude'])
+    def keys(self):
+        return self.record.keys()
 
-    def __hash__(self):
-        return id(self)
+    @property
+    def lat_long(self):
+        return self.record.lat_long
 
     def __repr__(self):
-        return self['name']
+        return self.record.name
 
     def to_dict(self):
-        result = {}
-        for key in self.keys():
-            result[key] = self[key]
+        result = self.record.to_dict()
+        result['names_used'] = ';'.join(sorted(self.names_used))
         result['parents'] = [p.to_dict() for p in self.parents]
         result['score'] = self.score
         return result
 
 
-class GeonameFeatures(object):
+class GeonameFeatureMatrix(object):
     """
-    This represents the aspects of a condidate geoname that are used to
-    determine whether it is being referenced.
+    This represents the aspects of a list of candidate geonames that are
+    used to determine whether they are being referenced. The values are held
+    in a matrix with a row for each geoname and a column for each feature.
     """
     # The feature name array is used to maintain the order of the
-    # values in the feature vector.
+    # columns of the feature matrix.
     feature_names = [
         'log_population',
         'name_count',
@@ -160,130 +149,223 @@ class GeonameFeatures(object):
         # for example, when they are the only location mentioned.
         'high_confidence',
     ]
+    feature_index = {name: idx for idx, name in enumerate(feature_names)}
 
-    def __init__(self, geoname, spans_to_nes, span_to_tokens):
-        self.geoname = geoname
-        # The set of geonames that are mentioned in proximity to the spans
-        # corresponding to this feature.
-        # This will be populated by the add_contextual_features function.
-        self.nearby_mentions = set()
-        d = {}
-        d['log_population'] = math.log(geoname['population'] + 1)
+    def __init__(self, geonames):
+        self.geonames = geonames
+        self.values = np.zeros((len(geonames), len(self.feature_names)))
+        # The indices of the geonames that are mentioned in proximity to the
+        # spans of each geoname.
+        # These are populated by the add_contextual_features function.
+        self.nearby_mentions = [set() for geoname in geonames]
+
+    def __len__(self):
+        return len(self.geonames)
+
+    def column(self, feature_name):
+        return self.values[:, self.feature_index[feature_name]]
+
+    def set_column(self, feature_name, values):
+        self.values[:, self.feature_index[feature_name]] = values
+
+    def to_dict(self, idx):
+        return dict(zip(self.feature_names, self.values[idx].tolist()))
+
+    def set_base_features(self, spans_to_nes, span_to_tokens):
+        """
+        Set the values that can be extracted from the geoname database and
+        the spans of the geonames.
+        """
+        geonames = self.geonames
+        populations = np.array([geoname['population'] for geoname in geonames])
+        self.set_column('log_population', np.log(populations + 1))
         # Geonames with lots of alternate names
         # tend to be the ones most commonly referred to.
-        d['name_count'] = geoname['name_count']
-        d['num_spans'] = len(geoname.spans)
-        d['max_span_length'] = max([
-            len(span.text) for span in geoname.spans])
-        d['cannonical_name_used'] = 1 if any([
-            span.text == geoname['name'] for span in geoname.spans
-        ]) else 0
-        loc_NEs_overlap = 0
-        other_NEs_overlap = 0
-        total_spans = len(geoname.spans)
-        for span in geoname.spans:
+        self.set_column('name_count', [
+            geoname['name_count'] for geoname in geonames])
+        self.set_column('ambiguity', [
+            len(geoname.alternate_locations) for geoname in geonames])
+        feature_code_columns = []
+        for geoname in geonames:
+            feature_code = geoname['feature_code']
+            if feature_code.startswith('PPL'):
+                feature_code_feature = 'PPL_feature_code'
+            elif feature_code.startswith('ADM'):
+                feature_code_feature = 'ADM_feature_code'
+            elif feature_code.startswith('CONT'):
+                feature_code_feature = 'CONT_feature_code'
+            else:
+                feature_code_feature = 'other_feature_code'
+            feature_code_columns.append(
+                self.feature_index[feature_code_feature])
+        self.values[np.arange(len(geonames)), feature_code_columns] = 1
+        # Spans are often shared by several geonames, so the NE and token
+        # statistics of each span are computed once and then aggregated
+        # over the pairs of geonames and spans.
+        span_indices = {}
+        spans = []
+        pair_geonames = []
+        pair_spans = []
+        cannonical_name_used = np.zeros(len(geonames))
+        for idx, geoname in enumerate(geonames):
+            name = geoname['name']
+            for span in geoname.spans:
+                span_idx = span_indices.get(span)
+                if span_idx is None:
+                    span_idx = span_indices[span] = len(spans)
+                    spans.append(span)
+                pair_geonames.append(idx)
+                pair_spans.append(span_idx)
+                if span.text == name:
+                    cannonical_name_used[idx] = 1
+        span_stats = np.zeros((len(spans), 6))
+        for span_idx, span in enumerate(spans):
+            loc_NEs_overlap = 0
+            other_NEs_overlap = 0
             for ne_span in spans_to_nes[span]:
                 if ne_span.label == 'GPE' or ne_span.label == 'LOC':
                     loc_NEs_overlap += 1
                 else:
                     other_NEs_overlap += 1
-        d['loc_NE_portion'] = float(loc_NEs_overlap) / total_spans
-        d['other_NE_portion'] = float(other_NEs_overlap) / total_spans
-        noun_pos_tags = 0
-        other_pos_tags = 0
-        pos_tags = 0
-        min_token_prob = 1.0
-        for span in geoname.spans:
+            noun_pos_tags = 0
+            other_pos_tags = 0
+            min_token_prob = 1.0
             for token_span in span_to_tokens[span]:
                 token = token_span.token
-                pos_tags += 1
                 if token.tag_.startswith("NN") or token.tag_ == "FW":
                     noun_pos_tags += 1
                 else:
                     other_pos_tags += 1
                 if token.prob < min_token_prob:
                     min_token_prob = token.prob
-        d['min_token_prob'] = min_token_prob
-        d['noun_portion'] = float(noun_pos_tags) / pos_tags
-        d['other_pos_portion'] = float(other_pos_tags) / pos_tags
-        d['num_tokens'] = pos_tags
-        d['ambiguity'] = len(geoname.alternate_locations)
-        feature_code = geoname['feature_code']
-        if feature_code.startswith('PPL'):
-            d['PPL_feature_code'] = 1
-        elif feature_code.startswith('ADM'):
-            d['ADM_feature_code'] = 1
-        elif feature_code.startswith('CONT'):
-            d['CONT_feature_code'] = 1
-        else:
-            d['other_feature_code'] = 1
-        self._values = [0] * len(self.feature_names)
-        self.set_values(d)
-
-    def set_value(self, feature_name, value):
-        self._values[self.feature_names.index(feature_name)] = value
+            span_stats[span_idx] = (
+                loc_NEs_overlap, other_NEs_overlap, noun_pos_tags,
+                other_pos_tags, min_token_prob, len(span))
+        pair_geonames = np.array(pair_geonames, dtype=np.int64)
+        pair_stats = span_stats[np.array(pair_spans, dtype=np.int64)]
+
+        def total(stat_idx):
+            return np.bincount(
+                pair_geonames, weights=pair_stats[:, stat_idx],
+                minlength=len(geonames))
+        num_spans = np.bincount(pair_geonames, minlength=len(geonames))
+        noun_pos_tags = total(2)
+        other_pos_tags = total(3)
+        pos_tags = noun_pos_tags + other_pos_tags
+        min_token_probs = np.ones(len(geonames))
+        np.minimum.at(min_token_probs, pair_geonames, pair_stats[:, 4])
+        max_span_lengths = np.zeros(len(geonames))
+        np.maximum.at(max_span_lengths, pair_geonames, pair_stats[:, 5])
+        # Spans always contain tokens, so this only guards against
+        # dividing by zero for geonames without spans.
+        num_spans_divisor = np.maximum(num_spans, 1)
+        pos_tags_divisor = np.maximum(pos_tags, 1)
+        self.set_column('num_spans', num_spans)
+        self.set_column('max_span_length', max_span_lengths)
+        self.set_column('cannonical_name_used', cannonical_name_used)
+        self.set_column('loc_NE_portion', total(0) / num_spans_divisor)
+        self.set_column('other_NE_portion', total(1) / num_spans_divisor)
+        self.set_column('noun_portion', noun_pos_tags / pos_tags_divisor)
+        self.set_column('other_pos_portion', other_pos_tags / pos_tags_divisor)
+        self.set_column('num_tokens', pos_tags)
+        self.set_column('min_token_prob', min_token_probs)
+
+
+def set_contextual_features(feature_matrix):
+    """
+    Set the values of the feature matrix that are based on its
+    nearby_mentions. The distances and containment levels of every pair of
+    a geoname and a nearby mention are computed at once.
+    """
+    geonames = feature_matrix.geonames
+    pair_geonames = []
+    pair_mentions = []
+    for idx, mention_indices in enumerate(feature_matrix.nearby_mentions):
+        for mention_idx in mention_indices:
+            if mention_idx != idx:
+                pair_geonames.append(idx)
+                pair_mentions.append(mention_idx)
+    pair_geonames = np.array(pair_geonames, dtype=np.int64)
+    pair_mentions = np.array(pair_mentions, dtype=np.int64)
+    lats = np.array([geoname['latitude'] for geoname in geonames])
+    longs = np.array([geoname['longitude'] for geoname in geonames])
+    distances = great_circle_distances(
+        lats[pair_mentions], longs[pair_mentions],
+        lats[pair_geonames], longs[pair_geonames])
+    levels = np.array([geoname['feature_level'] for geoname in geonames])
+    prefix_ids = admin_path_prefix_matrix([
+        geoname['admin_path'] for geoname in geonames])
+    pair_containment_levels = np.maximum(
+        containment_levels(levels, prefix_ids, pair_geonames, pair_mentions),
+        containment_levels(levels, prefix_ids, pair_mentions, pair_geonames))
+    num_geonames = len(geonames)
+
+    def count(pair_mask):
+        return np.bincount(pair_geonames[pair_mask], minlength=num_geonames)
+    feature_matrix.set_column('close_locations', count(distances < 400))
+    feature_matrix.set_column('very_close_locations', count(distances < 100))
+    feature_matrix.set_column(
+        'containing_locations', count(pair_containment_levels > 0))
+    max_containment_levels = np.zeros(num_geonames, dtype=np.int64)
+    np.maximum.at(
+        max_containment_levels, pair_geonames, pair_containment_levels)
+    feature_matrix.set_column('max_containment_level', max_containment_levels)
+
+
+# The number of lemmatized names whose geonames are kept in memory.
+CANDIDATE_CACHE_SIZE = 100000
 
-    def set_values(self, value_dict):
-        for idx, name in enumerate(self.feature_names):
-            if name in value_dict:
-                self._values[idx] = value_dict[name]
 
-    def set_contextual_features(self):
+class GeonameAnnotator(Annotator):
+    def __init__(self, custom_classifier=None, candidate_cache=None,
+                 geoname_store=None):
         """
-        GeonameFeatures are initialized with only values that can be extracted
-        from the geoname database and span. This extends the GeonameFeature
-        with values that require information from nearby_mentions.
+        candidate_cache is an LRUCache of the geonames for lemmatized names.
+        It may be shared by annotators that use the same geoname store.
+        geoname_store is where geonames are looked up. By default they are
+        looked up in the sqlite database, but an MMapGeonameStore may be
+        used instead.
         """
-        geoname = self.geoname
-        close_locations = 0
-        very_close_locations = 0
-        containing_locations = 0
-        max_containment_level = 0
-        for recently_mentioned_geoname in self.nearby_mentions:
-            if recently_mentioned_geoname == geoname:
-                continue
-            containment_level = max(
-                location_contains(geoname, recently_mentioned_geoname),
-                location_contains(recently_mentioned_geoname, geoname))
-            if containment_level > 0:
-                containing_locations += 1
-            if containment_level > max_containment_level:
-                max_containment_level = containment_level
-            distance = great_circle(
-                recently_mentioned_geoname.lat_long, geoname.lat_long
-            ).kilometers
-            if distance < 400:
-                close_locations += 1
-            if distance < 100:
-                very_close_locations += 1
-        self.set_values(dict(
-            close_locations=close_locations,
-            very_close_locations=very_close_locations,
-            containing_locations=containing_locations,
-            max_containment_level=max_containment_level))
-
-    def to_dict(self):
-        return {
-            key: value
-            for key, value in zip(self.feature_names, self._values)}
-
-    def values(self):
-        return self._values
-
-
-class GeonameAnnotator(Annotator):
-    def __init__(self, custom_classifier=None):
-        self.connection = get_database_connection()
-        self.connection.row_factory = GeonameRow
+        if geoname_store is None:
+            geoname_store = SQLiteGeonameStore()
+        self.geoname_store = geoname_store
         if custom_classifier:
             self.geoname_classifier = custom_classifier
         else:
             self.geoname_classifier = geoname_classifier
+        if candidate_cache is None:
+            candidate_cache = LRUCache(CANDIDATE_CACHE_SIZE)
+        self.candidate_cache = candidate_cache
 
-    def get_candidate_geonames(self, doc):
+    @property
+    def cache_hits(self):
+        return self.candidate_cache.hits
+
+    @property
+    def cache_misses(self):
+        return self.candidate_cache.misses
+
+    def get_geoname_records(self, names):
         """
-        Returns an array of geoname dicts correponding to locations that the document may refer to.
-        The dicts are extended with lists of associated AnnoSpans.
+        Return a dict mapping each of the given lemmatized names to a tuple of
+        the GeonameRecords it is an alternatename of. Only the names that are
+        not in the candidate cache are looked up in the geoname store.
+        """
+        name_to_records, missing_names = self.candidate_cache.get_many(names)
+        if len(missing_names) > 0:
+            fetched_records = self.geoname_store.lookup(missing_names)
+            for name in missing_names:
+                # Names without geonames are cached too so they are not
+                # looked up again.
+                records = tuple(fetched_records.get(name, []))
+                self.candidate_cache.set(name, records)
+                name_to_records[name] = records
+        return name_to_records
+
+    def get_candidate_names(self, doc):
+        """
+        Return a dict mapping the lemmatized ngrams of the document that may
+        be geoname names to the offsets of the spans they occur at.
         """
         if 'ngrams' not in doc.tiers:
             ngram_annotator = NgramAnnotator()
@@ -303,35 +385,56 @@ class GeonameAnnotator(Annotator):
             if len(text) < 3 and text != text.upper():
                 return False
             return True
-        all_ngrams = list(set([span.text.lower()
-                               for span in doc.tiers['ngrams'].spans
-                               if is_possible_geoname(span.text)
-                               ]))
-        logger.info('%s ngrams extracted' % len(all_ngrams))
-        cursor = self.connection.cursor()
-        geoname_results = list(cursor.execute('''
-        SELECT
-            geonames.*,
-            count AS name_count,
-            group_concat(alternatename, ";") AS names_used
-        FROM geonames
-        JOIN alternatename_counts USING ( geonameid )
-        JOIN alternatenames USING ( geonameid )
-        WHERE alternatename_lemmatized IN (''' +
-                                              ','.join('?' for x in all_ngrams) +
-                                              ''') GROUP BY geonameid''', all_ngrams))
-        logger.info('%s geonames fetched' % len(geoname_results))
+        # Map the possible geoname ngrams to their offsets. Spans are only
+        # created for the ngrams that match geonames.
+        span_text_to_offsets = defaultdict(list)
+        for start, end, ngram in doc.tiers['ngrams'].iter_ngrams():
+            if is_possible_geoname(ngram):
+                span_text_to_offsets[ngram.lower()].append((start, end))
+        logger.info('%s ngrams extracted' % len(span_text_to_offsets))
+        return span_text_to_offsets
+
+    def get_candidate_geonames(self, doc):
+        """
+        Returns an array of geoname dicts correponding to locations that the document may refer to.
+        The dicts are extended with lists of associated AnnoSpans.
+        """
+        span_text_to_offsets = self.get_candidate_names(doc)
+        name_to_records = self.get_geoname_records(span_text_to_offsets.keys())
+        return self.build_candidate_geonames(
+            doc, span_text_to_offsets, name_to_records)
+
+    def build_candidate_geonames(self, doc, span_text_to_offsets,
+                                 name_to_records):
+        """
+        Create the candidate geonames for the names returned by
+        get_candidate_names from a dict of the GeonameRecords of each name.
+        The dict may include the names of other documents.
+        """
+        logger.info('%s candidate cache hits, %s misses' % (
+            self.cache_hits, self.cache_misses))
         # Associate spans with the geonames.
         # This is done up front so span information can be used in the scoring
         # function
-        span_text_to_spans = defaultdict(list)
-        for span in doc.tiers['ngrams'].spans:
-            if is_possible_geoname(span.text):
-                span_text_to_spans[span.text.lower()].append(span)
-        candidate_geonames = []
-        for geoname in geoname_results:
-            geoname.add_spans(span_text_to_spans)
-            candidate_geonames.append(geoname)
+        geonameid_to_candidates = {}
+        for name in span_text_to_offsets:
+            records = name_to_records[name]
+            if len(records) == 0:
+                continue
+            spans = [
+                AnnoSpan(start, end, doc)
+                for start, end in span_text_to_offsets[name]]
+            for record in records:
+                candidate = geonameid_to_candidates.get(record.geonameid)
+                if candidate is None:
+                    candidate = GeonameCandidate(record)
+                    geonameid_to_candidates[record.geonameid] = candidate
+                candidate.spans.update(spans)
+                candidate.names_used.update(record.names_used.split(';'))
+        candidate_geonames = [
+            geonameid_to_candidates[geonameid]
+            for geonameid in sorted(geonameid_to_candidates)]
+        logger.info('%s geonames fetched' % len(candidate_geonames))
         # Add combined spans to locations that are adjacent to a span linked to
         # an administrative division. e.g. Seattle, WA
         span_to_geonames = defaultdict(list)
@@ -400,17 +503,20 @@ class GeonameAnnotator(Annotator):
         for span, token_spans in geospan_tier.group_spans_by_containing_span(
                 doc.tiers['spacy.tokens']):
             span_to_tokens[span] = token_spans
-        return [GeonameFeatures(geoname, spans_to_nes, span_to_tokens) for geoname in geonames]
+        feature_matrix = GeonameFeatureMatrix(geonames)
+        feature_matrix.set_base_features(spans_to_nes, span_to_tokens)
+        return feature_matrix
 
-    def add_contextual_features(self, features):
+    def add_contextual_features(self, feature_matrix):
         """
-        Extend a list of features with values that are based on the geonames
+        Extend a feature matrix with values that are based on the geonames
         mentioned nearby.
         """
         logger.info('adding contextual features')
+        geonames = feature_matrix.geonames
         span_to_features = defaultdict(list)
-        for feature in features:
-            for span in feature.geoname.spans:
+        for feature, geoname in enumerate(geonames):
+            for span in geoname.spans:
                 span_to_features[span].append(feature)
         geoname_span_tier = AnnoTier(span_to_features.keys())
 
@@ -419,11 +525,11 @@ class GeonameAnnotator(Annotator):
                 for feature in span_to_features[span]:
                     if filter_fun(feature):
                         yield span.start, feature
-        # Create iterators that will cycle through all the spans returning the span
-        # offset and the associated feature.
+        # Create iterators that will cycle through all the spans returning the
+        # span offset and the index of the associated feature row.
         all_feature_span_iter = feature_generator()
         resolved_feature_span_iter = feature_generator(
-            lambda x: x.geoname.high_confidence)
+            lambda x: geonames[x].high_confidence)
         # boolean indicators of whether the corresponding iterator has reached
         # its end.
         afs_iter_end = False
@@ -444,7 +550,7 @@ class GeonameAnnotator(Annotator):
         while len(rf_buffer) < BUFFER_SIZE:
             try:
                 rf_start, feature = next(resolved_feature_span_iter)
-                rf_buffer.append(feature.geoname)
+                rf_buffer.append(feature)
             except StopIteration:
                 rfs_iter_end = True
                 break
@@ -457,16 +563,14 @@ class GeonameAnnotator(Annotator):
                 except StopIteration:
                     afs_iter_end = True
                     break
-                feature.nearby_mentions.update(rf_buffer)
+                feature_matrix.nearby_mentions[feature].update(rf_buffer)
             try:
                 rf_start, resolved_feature = next(resolved_feature_span_iter)
-                rf_buffer[rf_buffer_idx %
-                          BUFFER_SIZE] = resolved_feature.geoname
+                rf_buffer[rf_buffer_idx % BUFFER_SIZE] = resolved_feature
                 rf_buffer_idx += 1
             except StopIteration:
                 rfs_iter_end = True
-        for feature in features:
-            feature.set_contextual_features()
+        set_contextual_features(feature_matrix)
 
     def cull_geospans(self, geo_spans):
         mwis = find_maximum_weight_interval_set([
@@ -483,27 +587,54 @@ class GeonameAnnotator(Annotator):
         logger.info('overlapping geospans removed')
         return retained_spans
 
-    def annotate(self, doc):
-        logger.info('geoannotator started')
-        candidate_geonames = self.get_candidate_geonames(doc)
-        features = self.extract_features(candidate_geonames, doc)
-        if len(features) == 0:
-            doc.tiers['geonames'] = AnnoTier([])
-            return doc
-        scores = self.geoname_classifier.predict_proba_base([
-            f.values() for f in features])
-        for geoname, feature, score in zip(candidate_geonames, features, scores):
-            geoname.high_confidence = float(
-                score[1]) > self.geoname_classifier.HIGH_CONFIDENCE_THRESHOLD
-            feature.set_value('high_confidence', geoname.high_confidence)
-        has_high_confidence_features = any(
-            [geoname.high_confidence for geoname in candidate_geonames])
-        if has_high_confidence_features:
-            self.add_contextual_features(features)
-            scores = self.geoname_classifier.predict_proba_contextual([
-                f.values() for f in features])
-        for geoname, score in zip(candidate_geonames, scores):
-            geoname.score = float(score[1])
+    def score_geonames(self, feature_matrices):
+        """
+        Set the scores of the geonames in a list of feature matrices.
+        The matrices of all the documents are scored by each classifier at
+        once. The contextual classifier is only used for the documents that
+        have high confidence geonames.
+        """
+        feature_matrices = [
+            feature_matrix for feature_matrix in feature_matrices
+            if len(feature_matrix) > 0]
+        if len(feature_matrices) == 0:
+            return
+        offsets = np.cumsum([0] + [
+            len(feature_matrix) for feature_matrix in feature_matrices])
+        scores = self.geoname_classifier.predict_proba_base(
+            np.vstack([
+                feature_matrix.values for feature_matrix in feature_matrices]))
+        high_confidence = (
+            scores[:, 1] > self.geoname_classifier.HIGH_CONFIDENCE_THRESHOLD)
+        contextual_matrices = []
+        contextual_rows = []
+        for feature_matrix, start, end in zip(
+                feature_matrices, offsets[:-1], offsets[1:]):
+            matrix_high_confidence = high_confidence[start:end]
+            for geoname, geoname_high_confidence in zip(
+                    feature_matrix.geonames, matrix_high_confidence.tolist()):
+                geoname.high_confidence = geoname_high_confidence
+            feature_matrix.set_column('high_confidence', matrix_high_confidence)
+            if matrix_high_confidence.any():
+                self.add_contextual_features(feature_matrix)
+                contextual_matrices.append(feature_matrix)
+                contextual_rows.append(np.arange(start, end))
+        if len(contextual_matrices) > 0:
+            scores[np.concatenate(contextual_rows)] = (
+                self.geoname_classifier.predict_proba_contextual(np.vstack([
+                    feature_matrix.values
+                    for feature_matrix in contextual_matrices])))
+        for feature_matrix, start, end in zip(
+                feature_matrices, offsets[:-1], offsets[1:]):
+            for geoname, score in zip(
+                    feature_matrix.geonames, scores[start:end, 1].tolist()):
+                geoname.score = score
+
+    def geonames_tier(self, doc, candidate_geonames):
+        """
+        Create a tier of the spans of the scored geonames that are likely to
+        be correct with overlapping spans removed.
+        """
         culled_geonames = [geoname
                            for geoname in candidate_geonames
                            if geoname.score > self.geoname_classifier.GEONAME_SCORE_THRESHOLD]
@@ -514,5 +645,36 @@ class GeonameAnnotator(Annotator):
                     span.start, span.end, doc, geoname)
                 geo_spans.append(geo_span)
         culled_geospans = self.cull_geospans(geo_spans)
-        doc.tiers['geonames'] = AnnoTier(culled_geospans)
+        return AnnoTier(culled_geospans)
+
+    def annotate(self, doc):
+        self.annotate_many([doc])
         return doc
+
+    def annotate_many(self, docs):
+        """
+        Add geonames tiers to a batch of documents.
+        The geonames of the names in all the documents are looked up at once
+        and their features are scored together, so this is faster than
+        annotating the documents individually.
+        """
+        logger.info('geoannotator started')
+        doc_names = [self.get_candidate_names(doc) for doc in docs]
+        all_names = set()
+        for span_text_to_offsets in doc_names:
+            all_names.update(span_text_to_offsets)
+        name_to_records = self.get_geoname_records(list(all_names))
+        feature_matrices = []
+        for doc, span_text_to_offsets in zip(docs, doc_names):
+            candidate_geonames = self.build_candidate_geonames(
+                doc, span_text_to_offsets, name_to_records)
+            if len(candidate_geonames) == 0:
+                feature_matrices.append(GeonameFeatureMatrix([]))
+            else:
+                feature_matrices.append(
+                    self.extract_features(candidate_geonames, doc))
+        self.score_geonames(feature_matrices)
+        for doc, feature_matrix in zip(docs, feature_matrices):
+            doc.tiers['geonames'] = self.geonames_tier(
+                doc, feature_matrix.geonames)
+        return docs
@@ -0,0 +1,537 @@
+#!/usr/bin/env python
+"""
+Stores that look up the geonames with a given lemmatized alternatename.
+"""
+import os
+import sqlite3
+from collections import defaultdict, namedtuple
+import numpy as np
+
+from get_database_connection import get_database_connection, ANNOTATOR_DB_PATH
+from geo_utils import (
+    feature_level, admin_path, great_circle_distances, grid_cell_ranges,
+    EARTH_RADIUS_KM)
+
+GEONAME_FIELDS = [
+    'geonameid',
+    'name',
+    'asciiname',
+    'latitude',
+    'longitude',
+    'feature_class',
+    'feature_code',
+    'country_code',
+    'cc2',
+    'admin1_code',
+    'admin2_code',
+    'admin3_code',
+    'admin4_code',
+    'population',
+    # These are precomputed by sqlite_import_geonames.add_containment_keys
+    'feature_level',
+    'admin_path',
+    'name_count',
+]
+
+
+# names_used is the original alternatenames, separated by semicolons, that
+# a geoname was looked up by. It is None for geonames found by location.
+RECORD_FIELDS = GEONAME_FIELDS + ['names_used']
+
+
+def join_names_used(names):
+    """Return the names_used value of a list of alternatenames"""
+    return ';'.join(sorted(set(names)))
+
+
+class GeonameRecord(namedtuple('GeonameRecord', RECORD_FIELDS)):
+    """
+    The database values of a geoname. Records are shared by every document
+    that mentions the geoname through the candidate cache, so they are
+    immutable. The state of a geoname within a document is held by a
+    GeonameCandidate.
+    """
+    __slots__ = ()
+    field_indices = {name: idx for idx, name in enumerate(RECORD_FIELDS)}
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return tuple.__getitem__(self, self.field_indices[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._fields)
+
+    @property
+    def lat_long(self):
+        return (self.latitude, self.longitude)
+
+    def to_dict(self):
+        return dict(zip(self._fields, self))
+
+
+def get_geoname_columns_sql(geonames_columns=GEONAME_FIELDS):
+    """
+    Return the expressions selecting the GEONAME_FIELDS from the geonames and
+    alternatename_counts tables. Fields that are not in the given geonames
+    table columns are selected as NULL.
+    """
+    return ',\n        '.join(
+        'geonames.' + field if field in geonames_columns else 'NULL AS ' + field
+        for field in GEONAME_FIELDS[:-1]) + ',\n        count AS name_count'
+
+
+def get_candidate_geonames_query(geonames_columns=GEONAME_FIELDS):
+    """
+    Return the query for the geonames with the lemmatized names in the
+    candidate_names table.
+    """
+    # The names being looked up are loaded into a temporary table rather
+    # than passed as query parameters so the number of names is not limited
+    # by SQLite's maximum number of host parameters. The CROSS JOIN makes
+    # SQLite use the temporary table as the outer loop of the join, so each
+    # name is looked up in the alternatenames index.
+    return '''
+    SELECT
+        candidate_names.name AS lookup_name,
+        group_concat(alternatename, ';') AS names_used,
+        ''' + get_geoname_columns_sql(geonames_columns) + '''
+    FROM candidate_names
+    CROSS JOIN alternatenames ON alternatename_lemmatized = candidate_names.name
+    JOIN geonames USING ( geonameid )
+    JOIN alternatename_counts USING ( geonameid )
+    GROUP BY candidate_names.name, geonameid
+    '''
+
+
+CANDIDATE_GEONAMES_QUERY = get_candidate_geonames_query()
+
+
+def get_geonameid_geonames_query(geonames_columns=GEONAME_FIELDS):
+    """
+    Return the query for the geonames in the candidate_geonameids table in
+    the order of their positions.
+    """
+    return '''
+    SELECT
+        ''' + get_geoname_columns_sql(geonames_columns) + '''
+    FROM candidate_geonameids
+    CROSS JOIN geonames USING ( geonameid )
+    JOIN alternatename_counts USING ( geonameid )
+    ORDER BY position
+    '''
+
+
+# The radius of the first search for the nearest geonames to a point.
+# It is quadrupled until enough geonames are found.
+NEAREST_GEONAMES_SEARCH_RADIUS_KM = 25.0
+# The distance to the opposite side of the earth.
+MAX_DISTANCE_KM = np.pi * EARTH_RADIUS_KM
+
+
+def points_within(latitude, longitude, keys, latitudes, longitudes,
+                  radius_km):
+    """
+    Return the keys of the points within radius_km of a point and their
+    distances, ordered by distance and then by key.
+    """
+    distances = great_circle_distances(
+        latitude, longitude, latitudes, longitudes)
+    within = distances <= radius_km
+    keys = keys[within]
+    distances = distances[within]
+    order = np.lexsort((keys, distances))
+    return keys[order], distances[order]
+
+
+class GeonameStore(object):
+    """
+    The spatial queries shared by the geoname stores. Stores implement
+    lookup, get_admin_divisions, _nearby_geonames and _records_by_key.
+    """
+
+    def get_admin_divisions(self, admin_paths):
+        """
+        Return a dict mapping the given admin paths to the geonameids of the
+        countries or administrative divisions they belong to.
+        """
+        raise NotImplementedError(
+            "get_admin_divisions must be implemented in child")
+
+    def geonames_within(self, latitude, longitude, radius_km):
+        """
+        Return (GeonameRecord, distance) pairs for the geonames within
+        radius_km of a point, nearest first. Distances are in kilometers.
+        """
+        keys, distances = self._nearby_geonames(latitude, longitude, radius_km)
+        return zip(self._records_by_key(keys), distances.tolist())
+
+    def nearest_geonames(self, latitude, longitude, count):
+        """
+        Return (GeonameRecord, distance) pairs for the count geonames nearest
+        to a point, nearest first. Distances are in kilometers.
+        """
+        radius_km = NEAREST_GEONAMES_SEARCH_RADIUS_KM
+        while True:
+            # All the geonames within the radius are found, so when there
+            # are enough of them the nearest geonames are among them.
+            keys, distances = self._nearby_geonames(
+                latitude, longitude, radius_km)
+            if len(keys) >= count or radius_km >= MAX_DISTANCE_KM:
+                break
+            radius_km *= 4
+        return zip(
+            self._records_by_key(keys[:count]), distances[:count].tolist())
+
+
+class SQLiteGeonameStore(GeonameStore):
+    """
+    Looks geonames up in the tables created by sqlite_import_geonames.
+    """
+
+    def __init__(self, connection=None):
+        if connection is None:
+            connection = get_database_connection()
+        self.connection = connection
+        self.connection.row_factory = sqlite3.Row
+        columns = [row['name'] for row in self.connection.execute(
+            'PRAGMA table_info(geonames)')]
+        # Databases imported before the containment keys were added have
+        # them computed when geonames are looked up.
+        self.has_containment_keys = 'admin_path' in columns
+        self.has_spatial_index = 'grid_cell' in columns
+        self.candidate_geonames_query = get_candidate_geonames_query(columns)
+        self.geonameid_geonames_query = get_geonameid_geonames_query(columns)
+
+    def query_geonames(self, names):
+        """
+        Return rows for the geonames with lemmatized alternatenames in the
+        given list of names. The lookup_name column is the name the geoname
+        was found by, so a geoname is returned once per name, and the
+        names_used column lists the alternatenames it matched.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute('''CREATE TEMP TABLE IF NOT EXISTS candidate_names
+                       (name text PRIMARY KEY)''')
+        cursor.execute('DELETE FROM candidate_names')
+        cursor.executemany('INSERT OR IGNORE INTO candidate_names VALUES (?)',
+                           ((name,) for name in names))
+        return list(cursor.execute(self.candidate_geonames_query))
+
+    def _record(self, row, names_used=None):
+        record = GeonameRecord(
+            *[row[field] for field in GEONAME_FIELDS] + [names_used])
+        if not self.has_containment_keys:
+            record = record._replace(
+                feature_level=feature_level(record.feature_code),
+                admin_path=admin_path(record))
+        return record
+
+    def lookup(self, names):
+        """
+        Return a dict mapping the given lemmatized names that have geonames
+        to lists of their GeonameRecords.
+        """
+        name_to_records = defaultdict(list)
+        for row in self.query_geonames(names):
+            name_to_records[row['lookup_name']].append(self._record(
+                row, join_names_used(row['names_used'].split(';'))))
+        return dict(name_to_records)
+
+    def _nearby_geonames(self, latitude, longitude, radius_km):
+        """
+        Return the integer geonameids of the geonames within radius_km of
+        a point and their distances.
+        """
+        if not self.has_spatial_index:
+            raise Exception(
+                "The geonames table has no spatial index.\n"
+                "Run `python -m annotator.sqlite_import_geonames "
+                "--add-spatial-index` to add one.")
+        cursor = self.connection.cursor()
+        cursor.execute('''CREATE TEMP TABLE IF NOT EXISTS candidate_grid_cells
+                       (first_cell integer, last_cell integer)''')
+        cursor.execute('DELETE FROM candidate_grid_cells')
+        cursor.executemany(
+            'INSERT INTO candidate_grid_cells VALUES (?, ?)',
+            grid_cell_ranges(latitude, longitude, radius_km).tolist())
+        # The coordinates are read from the grid cell index.
+        points = np.array(list(cursor.execute('''
+            SELECT CAST(geonameid AS INTEGER), latitude, longitude
+            FROM candidate_grid_cells
+            CROSS JOIN geonames
+                ON geonames.grid_cell BETWEEN first_cell AND last_cell
+            ''')), dtype=np.float64).reshape(-1, 3)
+        return points_within(
+            latitude, longitude, points[:, 0].astype(np.int64),
+            points[:, 1], points[:, 2], radius_km)
+
+    def _records_by_key(self, geonameids):
+        cursor = self.connection.cursor()
+        cursor.execute('''CREATE TEMP TABLE IF NOT EXISTS candidate_geonameids
+                       (position integer PRIMARY KEY, geonameid text)''')
+        cursor.execute('DELETE FROM candidate_geonameids')
+        cursor.executemany(
+            'INSERT INTO candidate_geonameids VALUES (?, ?)',
+            enumerate(unicode(geonameid) for geonameid in geonameids))
+        return [
+            self._record(row)
+            for row in cursor.execute(self.geonameid_geonames_query)]
+
+    def get_admin_divisions(self, admin_paths):
+        if not self.has_containment_keys:
+            return {}
+        cursor = self.connection.cursor()
+        cursor.execute('''CREATE TEMP TABLE IF NOT EXISTS candidate_admin_paths
+                       (admin_path text PRIMARY KEY)''')
+        cursor.execute('DELETE FROM candidate_admin_paths')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO candidate_admin_paths VALUES (?)',
+            ((path,) for path in admin_paths))
+        return dict(cursor.execute('''
+            SELECT admin_path, geonameid FROM candidate_admin_paths
+            CROSS JOIN admin_divisions USING ( admin_path )'''))
+
+
+MMAP_GEONAME_STORE_PATH = ANNOTATOR_DB_PATH + '.geonames'
+
+# Strings are stored as UTF-8 in a byte array with an array of offsets
+# marking where each one begins and ends.
+VARIABLE_WIDTH_FIELDS = ['name', 'asciiname', 'admin_path']
+# Codes are stored in fixed width byte string arrays.
+FIXED_WIDTH_FIELDS = [
+    'feature_class',
+    'feature_code',
+    'country_code',
+    'cc2',
+    'admin1_code',
+    'admin2_code',
+    'admin3_code',
+    'admin4_code',
+]
+NUMERIC_FIELDS = [
+    ('geonameid', np.int32),
+    ('latitude', np.float64),
+    ('longitude', np.float64),
+    ('population', np.int64),
+    ('feature_level', np.int8),
+    ('name_count', np.int32),
+]
+# The number of leading bytes of each name that are kept in a fixed width
+# array so the name ranges can be found with a vectorized search.
+NAME_PREFIX_SIZE = 8
+
+
+class MMapGeonameStore(GeonameStore):
+    """
+    Looks geonames up in a directory of memory-mapped NumPy arrays built by
+    mmap_import_geonames. The arrays are opened read-only, so processes
+    using the same store share its pages through the OS page cache.
+
+    The store holds one record per geoname, ordered by geonameid, in
+    columns named after the GEONAME_FIELDS. The lemmatized alternatenames
+    are sorted by their UTF-8 bytes in the alternatenames array and the
+    postings array lists the indices of the records each name refers to.
+    The posting_names array holds the names_used of each posting.
+    The grid_order array lists the record indices ordered by their grid
+    cells and grid_cell_offsets marks where each cell's records begin.
+    The admin_division_paths array holds the sorted admin paths of the
+    countries and administrative divisions and admin_division_geonameids
+    their geonameids.
+    """
+
+    def __init__(self, path=MMAP_GEONAME_STORE_PATH):
+        if not os.path.exists(os.path.join(path, 'alternatenames.npy')):
+            raise Exception(
+                "There is no geoname store at: " + path +
+                "\nRun `python -m annotator.mmap_import_geonames` to build one.")
+        self.path = path
+        self.names = self._load('alternatenames')
+        self.name_offsets = self._load('alternatename_offsets')
+        self.name_prefixes = self._load('alternatename_prefixes')
+        self.postings = self._load('postings')
+        self.posting_offsets = self._load('posting_offsets')
+        # Stores built before the names used were added list the
+        # lemmatized names instead.
+        self.has_posting_names = os.path.exists(
+            os.path.join(path, 'posting_names.npy'))
+        if self.has_posting_names:
+            self.posting_names = self._load('posting_names')
+            self.posting_name_starts = self._load('posting_name_starts')
+            self.posting_name_ends = self._load('posting_name_ends')
+        self.columns = {}
+        for field in VARIABLE_WIDTH_FIELDS:
+            self.columns[field] = self._load(field)
+            self.columns[field + '_offsets'] = self._load(field + '_offsets')
+        for field in FIXED_WIDTH_FIELDS:
+            self.columns[field] = self._load(field)
+        for field, dtype in NUMERIC_FIELDS:
+            self.columns[field] = self._load(field)
+        # Stores built before the spatial index was added do not have it.
+        self.has_spatial_index = os.path.exists(
+            os.path.join(path, 'grid_order.npy'))
+        if self.has_spatial_index:
+            self.grid_order = self._load('grid_order')
+            self.grid_cell_offsets = self._load('grid_cell_offsets')
+            # The coordinates in grid order so the points in a cell are
+            # read from contiguous memory.
+            self.grid_latitudes = self._load('grid_latitudes')
+            self.grid_longitudes = self._load('grid_longitudes')
+        # Stores built before the admin divisions were added do not have
+        # them.
+        self.has_admin_divisions = os.path.exists(
+            os.path.join(path, 'admin_division_paths.npy'))
+        if self.has_admin_divisions:
+            self.admin_division_paths = self._load('admin_division_paths')
+            self.admin_division_geonameids = self._load(
+                'admin_division_geonameids')
+
+    def _load(self, name):
+        # Plain ndarray views of the memory maps are much faster to index.
+        return np.load(
+            os.path.join(self.path, name + '.npy'),
+            mmap_mode='r').view(np.ndarray)
+
+    def __len__(self):
+        return len(self.columns['geonameid'])
+
+    def _name_bytes(self, idx):
+        return self.names[
+            self.name_offsets[idx]:self.name_offsets[idx + 1]].tostring()
+
+    def _find_name(self, key, lo, hi):
+        """Return the index of the name in the range [lo, hi) or None"""
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.name_prefixes) and self._name_bytes(lo) == key:
+            return lo
+        return None
+
+    def records(self, indices, names_used=None):
+        """
+        Return the GeonameRecords at the given indices with the given list
+        of names_used values.
+        """
+        columns = self.columns
+        indices = np.asarray(indices, dtype=np.int64)
+        values = {}
+        for field in VARIABLE_WIDTH_FIELDS:
+            data = columns[field]
+            offsets = columns[field + '_offsets']
+            values[field] = [
+                data[start:end].tostring().decode('utf8')
+                for start, end in zip(offsets[indices].tolist(),
+                                      offsets[indices + 1].tolist())]
+        for field in FIXED_WIDTH_FIELDS:
+            values[field] = [
+                value.decode('utf8')
+                for value in columns[field][indices].tolist()]
+        for field, dtype in NUMERIC_FIELDS:
+            values[field] = columns[field][indices].tolist()
+        values['geonameid'] = [
+            unicode(geonameid) for geonameid in values['geonameid']]
+        if names_used is None:
+            names_used = [None] * len(indices)
+        values['names_used'] = names_used
+        return [
+            GeonameRecord(*record_values)
+            for record_values in zip(*[
+                values[field] for field in RECORD_FIELDS])]
+
+    def _posting_names(self, name, start, end):
+        """Return the names_used of the postings in the range [start, end)"""
+        if not self.has_posting_names:
+            return [name] * (end - start)
+        return [
+            self.posting_names[name_start:name_end].tostring().decode('utf8')
+            for name_start, name_end in zip(
+                self.posting_name_starts[start:end].tolist(),
+                self.posting_name_ends[start:end].tolist())]
+
+    def lookup(self, names):
+        """
+        Return a dict mapping the given lemmatized names that have geonames
+        to lists of their GeonameRecords.
+        """
+        names = list(names)
+        keys = [name.encode('utf8') for name in names]
+        # The prefix search narrows each name down to the few names that
+        # share its prefix, which are then binary searched in Python.
+        prefixes = np.array(
+            [key[:NAME_PREFIX_SIZE] for key in keys],
+            dtype='S%d' % NAME_PREFIX_SIZE)
+        range_starts = np.searchsorted(self.name_prefixes, prefixes, 'left')
+        range_ends = np.searchsorted(self.name_prefixes, prefixes, 'right')
+        found_names = []
+        record_indices = []
+        record_counts = []
+        names_used = []
+        for name, key, lo, hi in zip(
+                names, keys, range_starts.tolist(), range_ends.tolist()):
+            name_idx = self._find_name(key, lo, hi)
+            if name_idx is None:
+                continue
+            start = self.posting_offsets[name_idx]
+            end = self.posting_offsets[name_idx + 1]
+            if end > start:
+                found_names.append(name)
+                record_indices.append(self.postings[start:end])
+                record_counts.append(end - start)
+                names_used += self._posting_names(name, start, end)
+        if len(found_names) == 0:
+            return {}
+        records = self.records(np.concatenate(record_indices), names_used)
+        name_to_records = {}
+        record_idx = 0
+        for name, count in zip(found_names, record_counts):
+            name_to_records[name] = records[record_idx:record_idx + count]
+            record_idx += count
+        return name_to_records
+
+    def get_admin_divisions(self, admin_paths):
+        if not self.has_admin_divisions:
+            return {}
+        admin_paths = list(admin_paths)
+        keys = np.array(
+            [path.encode('utf8') for path in admin_paths], dtype='S')
+        division_idxs = np.searchsorted(self.admin_division_paths, keys)
+        divisions = {}
+        for path, key, idx in zip(admin_paths, keys, division_idxs.tolist()):
+            if (idx < len(self.admin_division_paths) and
+                    self.admin_division_paths[idx] == key):
+                divisions[path] = unicode(self.admin_division_geonameids[idx])
+        return divisions
+
+    def _nearby_geonames(self, latitude, longitude, radius_km):
+        """
+        Return the indices of the records within radius_km of a point and
+        their distances.
+        """
+        if not self.has_spatial_index:
+            raise Exception(
+                "The geoname store at " + self.path + " has no spatial "
+                "index.\nRun `python -m annotator.mmap_import_geonames "
+                "--drop-previous` to rebuild it.")
+        ranges = grid_cell_ranges(latitude, longitude, radius_km)
+        starts = self.grid_cell_offsets[ranges[:, 0]].tolist()
+        ends = self.grid_cell_offsets[ranges[:, 1] + 1].tolist()
+        positions = [
+            np.arange(start, end)
+            for start, end in zip(starts, ends) if end > start]
+        if len(positions) == 0:
+            positions = np.zeros(0, dtype=np.int64)
+        else:
+            positions = np.concatenate(positions)
+        # Records are ordered by geonameid, so ties in distance are broken
+        # by geonameid as they are in the SQLiteGeonameStore.
+        return points_within(
+            latitude, longitude, self.grid_order[positions],
+            self.grid_latitudes[positions], self.grid_longitudes[positions],
+            radius_km)
+
+    def _records_by_key(self, indices):
+        return self.records(indices)
@@ -1,28 +1,121 @@
 #!/usr/bin/env python
 """Annotator to add NLP annotations from REST calls to a webservice"""
 
+import hashlib
+import json
+import random
+import threading
+from multiprocessing.pool import ThreadPool
+
 import dateutil.parser
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 
-from annotator import AnnoDoc, Annotator, AnnoTier, AnnoSpan
+from annotator import AnnoDoc, AnnoTier, AnnoSpan
 from time_expressions import TimePoint, TimeRange, TimeDuration, TimeSet
 
+# The number of connections to the jvm-nlp service kept open for reuse.
+POOL_SIZE = 10
+# Requests are retried after connection errors and these responses, which the
+# service returns while it is restarting or overloaded.
+RETRY_STATUSES = [502, 503, 504]
+MAX_RETRIES = 3
+# The nth retry waits up to BACKOFF_FACTOR * 2 ** (n - 1) seconds.
+BACKOFF_FACTOR = 0.5
+# The (connect, read) timeouts in seconds. Long documents can take the
+# service a while to annotate.
+TIMEOUT = (5, 120)
+# The number of requests annotate_many makes at once. It is less than the
+# pool size so the connections are reused.
+MAX_CONCURRENT_REQUESTS = 8
+
+
+class JitteredRetry(Retry):
+    """
+    A retry policy that waits a random time between zero and the exponential
+    backoff time, so clients that fail together do not retry together.
+    """
+
+    def get_backoff_time(self):
+        return random.uniform(0, super(JitteredRetry, self).get_backoff_time())
+
+
+def create_session(pool_size=POOL_SIZE, max_retries=MAX_RETRIES,
+                   backoff_factor=BACKOFF_FACTOR):
+    """
+    Create a session with a pool of keep-alive connections to the jvm-nlp
+    service. Sessions can be shared by threads.
+    """
+    retry_options = dict(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES)
+    # Annotation requests have no side effects, so they are retried even
+    # though they are POSTs.
+    try:
+        retries = JitteredRetry(allowed_methods=False, **retry_options)
+    except TypeError:
+        # urllib3 versions before 1.26 call it method_whitelist.
+        retries = JitteredRetry(method_whitelist=False, **retry_options)
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_default_session():
+    """
+    Return the session shared by JVMNLPAnnotators that are not given one.
+    """
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = create_session()
+    return _default_session
+
+
+# The classes of the time objects in the spans of the times tier.
+TIME_TYPES = {
+    'timePoint': TimePoint,
+    'timeRange': TimeRange,
+    'timeDuration': TimeDuration,
+    'timeSet': TimeSet,
+}
+
 
 class StanfordSpan(AnnoSpan):
+    """
+    A span from a jvm-nlp response. Its time objects are built from the
+    span_dict when they are first accessed.
+    """
+    __slots__ = ['span_dict', 'type',
+                 'timePoint', 'timeRange', 'timeDuration', 'timeSet']
 
     def __init__(self, span_dict, doc):
         self.start = span_dict['start']
         self.end = span_dict['stop']
         self.doc = doc
         self.span_dict = span_dict
-        if 'label' in span_dict:
-            self.label = span_dict['label']
-        else:
-            self.label = self.text
+        self.label = span_dict.get('label')
         if 'type' in span_dict:
             self.type = span_dict['type']
 
+    def __getattr__(self, name):
+        # Only called when a slot is unset.
+        if name in TIME_TYPES and name in self.span_dict:
+            value = TIME_TYPES[name].from_json(self.span_dict[name])
+            setattr(self, name, value)
+            return value
+        raise AttributeError(name)
+
     def to_dict(self):
         result = super(StanfordSpan, self).to_dict()
         result.update(self.span_dict)
@@ -31,14 +124,56 @@ class StanfordSpan(AnnoSpan):
         return result
 
 
+class StanfordTier(AnnoTier):
+    """
+    An AnnoTier of the spans in a tier of a jvm-nlp response. The
+    StanfordSpans are created when the spans are first accessed, so tiers
+    that are never used are not built.
+    """
+
+    def __init__(self, span_dicts, doc):
+        self.doc = doc
+        self._span_dicts = span_dicts
+        self._spans = None
+        self._index = None
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            self._spans = sorted(
+                StanfordSpan(span_dict, self.doc)
+                for span_dict in self._span_dicts)
+            self._span_dicts = None
+        return self._spans
+
+    @spans.setter
+    def spans(self, spans):
+        self._spans = spans
+        self._span_dicts = None
+        self._index = None
+
+    def __len__(self):
+        if self._spans is None:
+            return len(self._span_dicts)
+        return len(self._spans)
+
+
 class JVMNLPAnnotator():
 
     default_base_url = 'http://localhost:8080'
     annotate_path = '/annotate/getNLPAnnotations'
 
-    def __init__(self, tiers, base_url=None):
+    def __init__(self, tiers, base_url=None, session=None, timeout=TIMEOUT,
+                 response_cache=None):
         """Specify a list of tiers that we want to transfer from the service
         result to the AnnoDoc. Specify base_url if it differs from the default.
+        Requests are made with a session from create_session that is shared
+        with the other annotators unless one is given. timeout is the
+        (connect, read) timeout of each request in seconds.
+        response_cache is an optional cache with get and set methods, like
+        the one returned by response_cache.create_response_cache, that the
+        service's responses are stored in so documents that are annotated
+        again are not sent to the service.
         """
         if base_url is not None:
             self.base_url = base_url
@@ -46,6 +181,44 @@ class JVMNLPAnnotator():
             self.base_url = self.default_base_url
 
         self.tiers = tiers
+        if session is None:
+            session = get_default_session()
+        self.session = session
+        self.timeout = timeout
+        self.response_cache = response_cache
+
+    def response_cache_key(self, request_doc):
+        """
+        Return a hash of the service URL and the text and date sent to it.
+        The service responds with all its tiers, so they are not included.
+        """
+        return hashlib.sha1(json.dumps([
+            self.base_url + self.annotate_path,
+            request_doc.text,
+            request_doc.date.isoformat() if request_doc.date else None
+        ])).hexdigest()
+
+    def request_annotations(self, request_doc):
+        """
+        Return the text of the service's response for the document, from
+        the response cache if it was requested before.
+        """
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache_key(request_doc)
+            response_text = self.response_cache.get(cache_key)
+            if response_text is not None:
+                return response_text
+        headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
+        request = self.session.post(self.base_url + self.annotate_path,
+                                    data=request_doc.to_json(),
+                                    headers=headers,
+                                    timeout=self.timeout)
+        request.raise_for_status()
+        response_text = request.content.decode('utf-8')
+        if cache_key is not None:
+            self.response_cache.set(cache_key, response_text)
+        return response_text
 
     def annotate(self, doc):
         """Annotate a document by taking the text and sending it to the
@@ -56,27 +229,20 @@ class JVMNLPAnnotator():
         # dates like "tomorrow." If we have a doc.date for this document,
         # send it along and the jvm-nlp will not attempt to find a reference
         # date in the beginning of the document.
-        headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
-        request = requests.post(self.base_url + self.annotate_path,
-                                # Create a new annodoc so unnecessary tiers
-                                # are not serialized and parsed.
-                                data=AnnoDoc(
-                                    # Replace brackets with spaces bc they
-                                    # prevent dates like November [2020] from
-                                    # being parsed as a single entity.
-                                    # TODO: It would be better to make
-                                    # an algorithm that associates years with
-                                    # all months mentioned in the same
-                                    # sentence.
-                                    doc.text.replace(
-                                        '[', ' ').replace(']', ' '),
-                                    doc.date).to_json(),
-                                headers=headers)
+        # Create a new annodoc so unnecessary tiers are not serialized and
+        # parsed.
+        request_doc = AnnoDoc(
+            # Replace brackets with spaces bc they prevent dates like
+            # November [2020] from being parsed as a single entity.
+            # TODO: It would be better to make an algorithm that associates
+            # years with all months mentioned in the same sentence.
+            doc.text.replace('[', ' ').replace(']', ' '),
+            doc.date)
 
         # Why aren't we using a swagger-generated client here? Because they
         # don't have Maps very well, so the tiers maps doesn't work out.
 
-        return_json = request.json()
+        return_json = json.loads(self.request_annotations(request_doc))
 
         if len(doc.text) != len(return_json['text']):
             raise Exception(
@@ -94,28 +260,27 @@ class JVMNLPAnnotator():
                 doc.date = return_date
 
         for tier in self.tiers:
-
-            spans = []
-
-            for request_span in return_json['tiers'][tier]['spans']:
-                span = StanfordSpan(request_span, doc)
-                if 'timePoint' in request_span:
-                    span.timePoint = TimePoint.from_json(
-                        request_span['timePoint'])
-                if 'timeRange' in request_span:
-                    span.timeRange = TimeRange.from_json(
-                        request_span['timeRange'])
-                if 'timeDuration' in request_span:
-                    span.timeDuration = TimeDuration.from_json(
-                        request_span['timeDuration'])
-                if 'timeSet' in request_span:
-                    span.timeSet = TimeSet.from_json(request_span['timeSet'])
-
-                spans.append(span)
-
-            doc.tiers['stanford.' + tier] = AnnoTier(spans)
+            doc.tiers['stanford.' + tier] = StanfordTier(
+                return_json['tiers'][tier]['spans'], doc)
             if tier == 'times':
                 # Add alias for times tier
                 doc.tiers['times'] = doc.tiers['stanford.times']
 
         return doc
+
+    def annotate_many(self, docs,
+                      max_concurrent_requests=MAX_CONCURRENT_REQUESTS):
+        """
+        Annotate a list of documents with up to max_concurrent_requests
+        requests to the service at a time, so they are not annotated one
+        network round trip after another.
+        """
+        if len(docs) == 0:
+            return docs
+        pool = ThreadPool(min(max_concurrent_requests, len(docs)))
+        try:
+            pool.map(self.annotate, docs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        return docs
@@ -2,7 +2,8 @@
 """Keyword Annotator"""
 from collections import defaultdict
 from annotator import Annotator, AnnoTier, AnnoSpan
-from ngram_annotator import NgramAnnotator
+from token_annotator import TokenAnnotator
+from dictionary_matcher import DictionaryMatcher
 import os
 import pickle
 
@@ -40,37 +41,35 @@ class KeywordAnnotator(Annotator):
                 keyword_type = self.keyword_type_map[keyword['category']]
                 self.keywords[keyword_type][keyword['keyword'].lower()] = [
                     keyword['keyword'], keyword['case_sensitive']]
+        # All the keyword types are matched in a single pass over the tokens.
+        # The matcher's window is the same as the NgramAnnotator's default.
+        keyword_matches = defaultdict(list)
+        for keyword_type, keywords in self.keywords.items():
+            for keyword, (true_case, case_sensitive) in keywords.items():
+                keyword_matches[keyword].append(
+                    (keyword_type, true_case, case_sensitive))
+        self.matcher = DictionaryMatcher(keyword_matches, max_tokens=7)
 
     def annotate(self, doc):
 
-        if 'ngrams' not in doc.tiers:
-            ngram_annotator = NgramAnnotator()
-            doc.add_tier(ngram_annotator)
+        if 'tokens' not in doc.tiers:
+            doc.add_tier(TokenAnnotator())
 
-        ngram_spans_by_lowercase = defaultdict(list)
+        keyword_spans = defaultdict(list)
 
-        for ngram_span in doc.tiers['ngrams'].spans:
-            ngram_spans_by_lowercase[ngram_span.text.lower()].append(
-                ngram_span)
+        for start, end, keyword, matches in self.matcher.match(
+                doc, doc.tiers['tokens'], lowercase=True):
+            for keyword_type, true_case, case_sensitive in matches:
+                if not case_sensitive or doc.text[start:end] == true_case:
+                    if case_sensitive:
+                        label = true_case
+                    else:
+                        label = keyword
+                    keyword_spans[keyword_type].append(
+                        AnnoSpan(start, end, doc, label=label))
 
-        ngrams = ngram_spans_by_lowercase.keys()
-
-        for keyword_type, keywords in self.keywords.iteritems():
-
-            keyword_spans = []
-            for keyword in set(keywords.keys()).intersection(ngrams):
-                true_case = keywords[keyword][0]
-                case_sensitive = keywords[keyword][1]
-                for ngram_span in ngram_spans_by_lowercase[keyword]:
-                    if not case_sensitive or ngram_span.text == true_case:
-                        if case_sensitive:
-                            label = true_case
-                        else:
-                            label = keyword
-                        keyword_spans.append(
-                            AnnoSpan(ngram_span.start, ngram_span.end, doc, label=label))
-
-            doc.tiers[keyword_type] = AnnoTier(keyword_spans)
+        for keyword_type in self.keywords:
+            doc.tiers[keyword_type] = AnnoTier(keyword_spans[keyword_type])
             doc.tiers[keyword_type].filter_overlapping_spans()
 
         return doc
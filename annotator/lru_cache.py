@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""A bounded, thread-safe least recently used cache"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A mapping that holds at most max_size items. When it is full, setting a
+    new item evicts the least recently used one. The number of lookups that
+    found and did not find their key are counted in hits and misses.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._get(key, default)
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once. Returns a dict of the keys that were
+        found and a list of the keys that were not.
+        """
+        found = {}
+        missing = []
+        marker = object()
+        with self._lock:
+            for key in keys:
+                value = self._get(key, marker)
+                if value is marker:
+                    missing.append(key)
+                else:
+                    found[key] = value
+        return found, missing
+
+    def set(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _get(self, key, default):
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # Reinserting the item marks it as the most recently used.
+        self._items[key] = value
+        self.hits += 1
+        return value
@@ -1,42 +1,63 @@
+import numpy as np
+
+
 class Interval():
     def __init__(self, start, end, weight, corresponding_object):
         self.start = start
         self.end = end
         self.weight = weight
         self.corresponding_object = corresponding_object
-        # The combined weight of the MWIS prior to this interval.
-        self.__value__ = 0.0
-        # The previous inverval in the MWIS prior to this interval.
-        self.__previous__ = None
-
-    def start_endpoint(self):
-        return Endpoint(self, True)
-
-    def end_endpoint(self):
-        return Endpoint(self, False)
-
 
-class Endpoint():
-    def __init__(self, interval, is_start):
-        self.interval = interval
-        self.is_start = is_start
 
-    def get_idx(self):
-        if self.is_start:
-            return self.interval.start
-        else:
-            return self.interval.end
+def find_maximum_weight_interval_set_indices(starts, ends, weights):
+    """
+    Takes arrays of interval start offsets, end offsets and weights and returns
+    the indices of a non-overlapping set of intervals with the maximum possible
+    weight in order of position.
+    If endpoints overlap, the intervals are considered to be overlapping.
+    Intervals must not end before they start.
 
-    def __lt__(self, other):
-        if self.get_idx() == other.get_idx():
-            # This condition is used so the starting endpoints come first
-            # when iterating over the sorted endpoints.
-            # This is necessary for zero length intervals.
-            # However, it also adds the requirement that overlapping endpoints
-            # makes invervals overlap.
-            return self.is_start and not other.is_start
+    When several sets have the maximum weight the one chosen is the same one
+    the endpoint sweep this replaced chose: The best set ending before an
+    interval starts is the last one to reach the maximum weight when the
+    intervals are ordered by their end offsets, and ties between equal end
+    offsets are ordered by index.
+    """
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    if len(starts) == 0:
+        return []
+    end_order = np.argsort(ends, kind='mergesort')
+    sorted_ends = ends[end_order]
+    # The number of intervals that end before each interval starts.
+    # Their positions in end_order are a prefix of the interval's own position.
+    num_preceding = np.searchsorted(
+        sorted_ends, starts[end_order], 'left').tolist()
+    ordered_weights = [weights[idx] for idx in end_order.tolist()]
+    # The value of the best interval set that ends with each interval
+    # and the position of the interval before it in that set.
+    values = [0] * len(ordered_weights)
+    previous = [-1] * len(ordered_weights)
+    # The position of the interval ending the best set among the first
+    # n intervals in end order.
+    best_of_prefix = [-1] * (len(ordered_weights) + 1)
+    best = -1
+    for pos, weight in enumerate(ordered_weights):
+        prior_best = best_of_prefix[num_preceding[pos]]
+        if prior_best >= 0:
+            values[pos] = weight + values[prior_best]
+            previous[pos] = prior_best
         else:
-            return self.get_idx() < other.get_idx()
+            values[pos] = weight
+        if best < 0 or values[pos] >= values[best]:
+            best = pos
+        best_of_prefix[pos + 1] = best
+    result = []
+    while best >= 0:
+        result.append(int(end_order[best]))
+        best = previous[best]
+    result.reverse()
+    return result
 
 
 def find_maximum_weight_interval_set(intervals):
@@ -45,27 +66,11 @@ def find_maximum_weight_interval_set(intervals):
     with the maximum possible weight.
     If endpoints overlap, the intervals are considered to be overlapping.
     """
-    endpoints = []
-    for interval in intervals:
-        endpoints.append(interval.start_endpoint())
-        endpoints.append(interval.end_endpoint())
-    sorted_endpoints = sorted(endpoints)
-    max_interval_sofar = None
-    for endpoint in sorted_endpoints:
-        if endpoint.is_start:
-            endpoint.interval.__value__ = endpoint.interval.weight
-            if max_interval_sofar:
-                endpoint.interval.__value__ += max_interval_sofar.__value__
-                endpoint.interval.__previous__ = max_interval_sofar
-        else:  # endoint.is_end
-            if not max_interval_sofar:
-                max_interval_sofar = endpoint.interval
-            elif endpoint.interval.__value__ >= max_interval_sofar.__value__:
-                max_interval_sofar = endpoint.interval
-    mwis = []
-    while max_interval_sofar:
-        mwis.insert(0, max_interval_sofar)
-        max_interval_sofar = max_interval_sofar.__previous__
+    mwis_indices = find_maximum_weight_interval_set_indices(
+        [interval.start for interval in intervals],
+        [interval.end for interval in intervals],
+        [interval.weight for interval in intervals])
+    mwis = [intervals[idx] for idx in mwis_indices]
     if len(intervals) >= 1:
         assert len(mwis) >= 1
     return mwis
@@ -0,0 +1,230 @@
+"""
+Script for compiling the geonames tables created by sqlite_import_geonames
+into the memory-mapped arrays read by the MMapGeonameStore.
+"""
+import os
+import shutil
+import numpy as np
+from array import array
+from collections import defaultdict
+
+from get_database_connection import get_database_connection
+from geoname_store import (
+    MMAP_GEONAME_STORE_PATH, VARIABLE_WIDTH_FIELDS, FIXED_WIDTH_FIELDS,
+    NUMERIC_FIELDS, NAME_PREFIX_SIZE, join_names_used)
+from geo_utils import (
+    feature_level, admin_path, containment_key, grid_cells, GRID_ROWS,
+    GRID_COLUMNS)
+
+BATCH_SIZE = 100000
+
+
+class StringColumnBuilder(object):
+    """
+    Accumulates strings as a UTF-8 byte array and an array of offsets.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.offsets = array('l', [0])
+
+    def extend(self, values):
+        encoded = [(value or u'').encode('utf8') for value in values]
+        size = self.offsets[-1]
+        for value in encoded:
+            size += len(value)
+            self.offsets.append(size)
+        self.chunks.append(b''.join(encoded))
+
+    def arrays(self):
+        data = np.frombuffer(b''.join(self.chunks) or b'\0', dtype=np.uint8)
+        return (data[:self.offsets[-1]],
+                np.array(self.offsets, dtype=np.int64))
+
+
+def build_mmap_geoname_store(connection, path):
+    """
+    Write the arrays of a geoname store to the directory at path.
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    def save(name, values):
+        np.save(os.path.join(path, name + '.npy'), values)
+    cursor = connection.cursor()
+    print "Writing geonames..."
+    # Records are ordered by their numeric geonameid so the alternatename
+    # postings can be mapped to record indices with a binary search.
+    # The containment keys are computed from the other fields so stores can
+    # be built from databases imported before they were added.
+    field_names = ['geonameid', 'name', 'asciiname'] + FIXED_WIDTH_FIELDS + [
+        'latitude', 'longitude', 'population', 'name_count']
+    cursor.execute('''
+    SELECT
+        CAST(geonameid AS INTEGER) AS id,
+        ''' + ', '.join(field_names[1:-1]) + ''',
+        count AS name_count
+    FROM geonames
+    JOIN alternatename_counts USING ( geonameid )
+    ORDER BY id
+    ''')
+    field_names += ['feature_level', 'admin_path']
+    string_columns = {
+        field: StringColumnBuilder() for field in VARIABLE_WIDTH_FIELDS}
+    column_chunks = defaultdict(list)
+    numeric_types = dict(NUMERIC_FIELDS)
+    feature_code_idx = field_names.index('feature_code')
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if len(rows) == 0:
+            break
+        rows = [row + (
+            feature_level(row[feature_code_idx] or ''),
+            admin_path(dict(zip(field_names, row)))) for row in rows]
+        for field, values in zip(field_names, zip(*rows)):
+            if field in string_columns:
+                string_columns[field].extend(values)
+            elif field in numeric_types:
+                column_chunks[field].append(np.array(
+                    [value or 0 for value in values],
+                    dtype=numeric_types[field]))
+            else:
+                column_chunks[field].append(np.array(
+                    [(value or u'').encode('utf8') for value in values],
+                    dtype='S'))
+    for field, builder in string_columns.items():
+        data, offsets = builder.arrays()
+        save(field, data)
+        save(field + '_offsets', offsets)
+    for field in FIXED_WIDTH_FIELDS:
+        chunks = column_chunks[field] or [np.zeros(0, dtype='S1')]
+        save(field, np.concatenate(chunks))
+    for field, dtype in NUMERIC_FIELDS:
+        chunks = column_chunks[field] or [np.zeros(0, dtype=dtype)]
+        save(field, np.concatenate(chunks))
+    geonameids = np.load(os.path.join(path, 'geonameid.npy'))
+    print len(geonameids), "geonames written"
+    print "Writing spatial index..."
+    latitudes = np.load(os.path.join(path, 'latitude.npy'))
+    longitudes = np.load(os.path.join(path, 'longitude.npy'))
+    cells = grid_cells(latitudes, longitudes)
+    grid_order = np.argsort(cells, kind='mergesort')
+    save('grid_order', grid_order.astype(np.int32))
+    save('grid_cell_offsets', np.searchsorted(
+        cells[grid_order], np.arange(GRID_ROWS * GRID_COLUMNS + 1)))
+    save('grid_latitudes', latitudes[grid_order])
+    save('grid_longitudes', longitudes[grid_order])
+    print "Writing admin divisions..."
+    levels = np.load(os.path.join(path, 'feature_level.npy'))
+    populations = np.load(os.path.join(path, 'population.npy'))
+    path_data = np.load(os.path.join(path, 'admin_path.npy'))
+    path_offsets = np.load(os.path.join(path, 'admin_path_offsets.npy'))
+    # When several geonames are the division for an admin path the most
+    # populous one is used.
+    division_indices = np.flatnonzero(levels > 0)
+    division_indices = division_indices[np.argsort(
+        populations[division_indices], kind='mergesort')]
+    divisions = {}
+    for idx in division_indices.tolist():
+        division_path = containment_key(
+            int(levels[idx]),
+            path_data[path_offsets[idx]:path_offsets[idx + 1]].tostring())
+        if division_path:
+            divisions[division_path] = geonameids[idx]
+    # The paths are sorted so they can be binary searched.
+    division_paths = sorted(divisions.keys())
+    save('admin_division_paths', np.array(division_paths, dtype='S'))
+    save('admin_division_geonameids', np.array(
+        [divisions[prefix] for prefix in division_paths], dtype=np.int32))
+    print "Writing alternatenames..."
+    # The alternatenames are read in the order of the covering index.
+    # SQLite compares text by its UTF-8 bytes, which is the order the
+    # names are binary searched in.
+    cursor.execute('''
+    SELECT
+        alternatename_lemmatized,
+        CAST(geonameid AS INTEGER),
+        group_concat(alternatename, ';')
+    FROM alternatenames
+    GROUP BY alternatename_lemmatized, geonameid
+    ORDER BY alternatename_lemmatized
+    ''')
+    names = StringColumnBuilder()
+    posting_names_used = StringColumnBuilder()
+    posting_geonameids = array('l')
+    posting_counts = array('l')
+    previous_key = None
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if len(rows) == 0:
+            break
+        batch_names = []
+        posting_names_used.extend(
+            join_names_used(row[2].split(';')) for row in rows)
+        for name, geonameid, _ in rows:
+            key = name.encode('utf8')
+            if key != previous_key:
+                if previous_key is not None and key < previous_key:
+                    raise Exception(
+                        "The alternatenames are not in UTF-8 byte order.")
+                previous_key = key
+                batch_names.append(name)
+                posting_counts.append(0)
+            posting_counts[-1] += 1
+            posting_geonameids.append(geonameid)
+        names.extend(batch_names)
+    name_data, name_offsets = names.arrays()
+    save('alternatenames', name_data)
+    save('alternatename_offsets', name_offsets)
+    save('alternatename_prefixes', np.array([
+        name_data[start:min(start + NAME_PREFIX_SIZE, end)].tostring()
+        for start, end in zip(name_offsets[:-1], name_offsets[1:])],
+        dtype='S%d' % NAME_PREFIX_SIZE))
+    # Alternatenames of geonames that are not in the geonames table
+    # are dropped.
+    posting_geonameids = np.array(posting_geonameids, dtype=np.int64)
+    posting_counts = np.array(posting_counts, dtype=np.int64)
+    record_indices = np.searchsorted(geonameids, posting_geonameids)
+    record_indices[record_indices == len(geonameids)] = 0
+    if len(geonameids) > 0:
+        valid = geonameids[record_indices] == posting_geonameids
+    else:
+        valid = np.zeros(len(record_indices), dtype=bool)
+    posting_names = np.repeat(np.arange(len(posting_counts)), posting_counts)
+    posting_counts = np.bincount(
+        posting_names[valid], minlength=len(posting_counts))
+    save('postings', record_indices[valid].astype(np.int32))
+    posting_name_data, posting_name_offsets = posting_names_used.arrays()
+    save('posting_names', posting_name_data)
+    # The names of the dropped postings are left in the data array, so the
+    # start and end of each posting's names are saved.
+    save('posting_name_starts', posting_name_offsets[:-1][valid])
+    save('posting_name_ends', posting_name_offsets[1:][valid])
+    save('posting_offsets', np.concatenate([[0], np.cumsum(posting_counts)]))
+    print len(posting_counts), "alternatenames written"
+
+
+def import_geonames(path=MMAP_GEONAME_STORE_PATH, drop_previous=False):
+    if os.path.exists(path):
+        if drop_previous:
+            print "Dropping previous geoname store..."
+            shutil.rmtree(path)
+        else:
+            print "The geoname store already exists. Run this again with --drop-previous to recreate it."
+            return
+    connection = get_database_connection()
+    build_mmap_geoname_store(connection, path)
+    connection.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--path", default=MMAP_GEONAME_STORE_PATH,
+        help="The directory to write the geoname store to.")
+    parser.add_argument(
+        "--drop-previous", dest='drop_previous', action='store_true')
+    parser.set_defaults(drop_previous=False)
+    args = parser.parse_args()
+    import_geonames(args.path, args.drop_previous)
@@ -1,10 +1,61 @@
 #!/usr/bin/env python
 """Ngram Annotator"""
+import numpy as np
 
-from annotator import Annotator, AnnoDoc, AnnoTier, AnnoSpan
+from annotator import Annotator, ColumnarAnnoTier
 from token_annotator import TokenAnnotator
 
 
+class NgramTier(ColumnarAnnoTier):
+    """
+    A tier with a span for every sequence of n_min to n_max tokens.
+    The ngrams are defined by the token offsets, so AnnoSpans are only
+    created for the ngrams that are accessed. Annotators that look ngrams up
+    in a dictionary should use iter_ngrams and create spans for the matches.
+    """
+
+    def __init__(self, doc, token_tier, n_min=1, n_max=7):
+        self.n_min = n_min
+        self.n_max = n_max
+        if isinstance(token_tier, ColumnarAnnoTier):
+            token_starts = token_tier.starts
+            token_ends = token_tier.ends
+        else:
+            token_starts = np.array(
+                [span.start for span in token_tier.spans], dtype=np.int32)
+            token_ends = np.array(
+                [span.end for span in token_tier.spans], dtype=np.int32)
+        num_tokens = len(token_starts)
+        lengths = np.arange(n_min, n_max + 1)
+        # Ngrams are ordered by their first token then by their length.
+        first_tokens = np.repeat(np.arange(num_tokens), len(lengths))
+        last_tokens = first_tokens + np.tile(lengths, num_tokens) - 1
+        in_bounds = last_tokens < num_tokens
+        super(NgramTier, self).__init__(
+            doc,
+            token_starts[first_tokens[in_bounds]],
+            token_ends[last_tokens[in_bounds]])
+
+    def iter_ngrams(self, lowercase=False):
+        """
+        Yield the start offset, end offset and text of every ngram without
+        creating spans for them.
+        """
+        text = self.doc.text
+        if lowercase:
+            lowercase_text = text.lower()
+            # Lowercasing the whole document only preserves offsets when no
+            # character lowercases to multiple characters.
+            if len(lowercase_text) == len(text):
+                text = lowercase_text
+            else:
+                for start, end, ngram in self.iter_ngrams():
+                    yield start, end, ngram.lower()
+                return
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            yield start, end, text[start:end]
+
+
 class NgramAnnotator(Annotator):
 
     def annotate(self, doc, n_min=1, n_max=7):
@@ -13,19 +64,7 @@ class NgramAnnotator(Annotator):
             token_annotator = TokenAnnotator()
             doc.add_tier(token_annotator)
 
-        ngram_spans = []
-
-        token_spans = doc.tiers['tokens'].spans
-
-        for n in range(n_min, n_max + 1):
-            for i in range(len(token_spans)):
-                if i + n > len(token_spans):
-                    break
-                span = AnnoSpan(token_spans[i].start,
-                                token_spans[i + n - 1].end,
-                                doc)
-                ngram_spans.append(span)
-
-        doc.tiers['ngrams'] = AnnoTier(ngram_spans)
+        doc.tiers['ngrams'] = NgramTier(
+            doc, doc.tiers['tokens'], n_min, n_max)
 
         return doc
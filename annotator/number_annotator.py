@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Annotates numbers, like the NUMBER named entities from the jvm-nlp service,
+using the spaCy tokens.
+"""
+import re
+from annotator import Annotator, AnnoTier, AnnoSpan
+from spacy_annotator import SpacyAnnotator
+import utils
+
+# Numbers in spaCy entities of these types are not annotated. Stanford NER
+# labels them DATE, TIME, PERCENT, MONEY and ORDINAL rather than NUMBER.
+EXCLUDED_ENTITY_TYPES = set(['DATE', 'TIME', 'PERCENT', 'MONEY', 'ORDINAL'])
+# Ex: 12, 1,200, 2.5
+NUMERAL_RE = re.compile(r"^\d([\d,]*\d)?(\.\d+)?$")
+
+
+def number_token_type(text):
+    """
+    Return the kind of number the token text is part of or None if it is not
+    part of a number:
+    numeral: 12, 1,200, 2.5
+    order: hundred, million
+    tens: twenty, ninety
+    digit: one, nine
+    word: other spelled out numbers, like twelve or ninety-nine
+    """
+    lower = text.lower()
+    if lower in utils.ORDERS:
+        return 'order'
+    elif lower in utils.NUMBERS:
+        value = utils.NUMBERS[lower]
+        if value >= 20:
+            return 'tens'
+        elif 1 <= value <= 9:
+            return 'digit'
+        return 'word'
+    elif all(part in utils.NUMBERS for part in lower.split('-')):
+        return 'word'
+    elif NUMERAL_RE.match(text):
+        return 'numeral'
+    return None
+
+
+def continues_number(previous_type, next_type):
+    """
+    Whether a token of next_type extends a number ending with a token of
+    previous_type.
+    Ex: 1.5 million, twenty one, five hundred three
+    """
+    if next_type == 'order':
+        return True
+    elif previous_type == 'tens':
+        return next_type == 'digit'
+    elif previous_type == 'order':
+        return next_type in ['tens', 'digit', 'word']
+    return False
+
+
+def is_conjunction(token_spans, idx, previous_type):
+    """
+    Whether the token at idx joins the parts of a spelled out number.
+    Ex: ninety-nine, one hundred and five
+    """
+    token_span = token_spans[idx]
+    if token_span.text == '-':
+        return (token_spans[idx - 1].end == token_span.start and
+                token_span.end == token_spans[idx + 1].start)
+    return token_span.text.lower() == 'and' and previous_type == 'order'
+
+
+class NumberAnnotator(Annotator):
+    """
+    Annotates numerals and spelled out numbers, including numbers written
+    with both, like "2 million", in the numbers tier.
+    """
+
+    def annotate(self, doc):
+        if 'spacy.tokens' not in doc.tiers:
+            doc.add_tier(SpacyAnnotator())
+        token_spans = doc.tiers['spacy.tokens'].spans
+        types = [
+            None if span.token.ent_type_ in EXCLUDED_ENTITY_TYPES
+            else number_token_type(span.text)
+            for span in token_spans]
+        number_spans = []
+        idx = 0
+        while idx < len(token_spans):
+            if types[idx] is None:
+                idx += 1
+                continue
+            start = token_spans[idx].start
+            end = token_spans[idx].end
+            last_type = types[idx]
+            idx += 1
+            while idx < len(token_spans):
+                if continues_number(last_type, types[idx]):
+                    next_idx = idx
+                elif (idx + 1 < len(token_spans) and
+                      continues_number(last_type, types[idx + 1]) and
+                      is_conjunction(token_spans, idx, last_type)):
+                    next_idx = idx + 1
+                else:
+                    break
+                end = token_spans[next_idx].end
+                last_type = types[next_idx]
+                idx = next_idx + 1
+            number_spans.append(AnnoSpan(start, end, doc))
+        doc.tiers['numbers'] = AnnoTier(number_spans)
+        return doc
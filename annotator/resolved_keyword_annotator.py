@@ -2,7 +2,8 @@
 """Keyword Annotator"""
 from collections import defaultdict
 from annotator import Annotator, AnnoSpan, AnnoTier
-from ngram_annotator import NgramAnnotator
+from token_annotator import TokenAnnotator
+from dictionary_matcher import DictionaryMatcher
 from get_database_connection import get_database_connection
 import sqlite3
 import logging
@@ -11,8 +12,11 @@ logger = logging.getLogger(__name__)
 
 
 class ResolvedKeywordSpan(AnnoSpan):
+    __slots__ = ['resolutions', 'uris']
+
     def __init__(self, span, resolved_keywords, uris_to_labels):
-        self.__dict__ = dict(span.__dict__)
+        super(ResolvedKeywordSpan, self).__init__(
+            span.start, span.end, span.doc, span._label)
         self.resolutions = []
         self.uris = []
         for keyword in sorted(resolved_keywords, key=lambda k: k['weight']):
@@ -37,52 +41,55 @@ class ResolvedKeywordAnnotator(Annotator):
     def __init__(self):
         self.connection = get_database_connection()
         self.connection.row_factory = sqlite3.Row
+        # The synonyms and entity labels are loaded into memory once so
+        # the cost of annotating a document does not depend on the size of
+        # the ontology.
+        cursor = self.connection.cursor()
+        synonyms = defaultdict(list)
+        for result in cursor.execute('SELECT * FROM synonyms ORDER BY synonym'):
+            synonyms[result['synonym']].append(result)
+        self.synonym_matcher = DictionaryMatcher(synonyms, max_tokens=7)
+        self.uris_to_labels = {}
+        for result in cursor.execute('SELECT * FROM entity_labels'):
+            self.uris_to_labels[result['uri']] = result['label']
+        logger.info('%s synonyms loaded' % len(self.synonym_matcher))
 
     def annotate(self, doc):
-        if 'ngrams' not in doc.tiers:
-            ngram_annotator = NgramAnnotator()
-            doc.add_tier(ngram_annotator)
-            logger.info('ngrams')
-        span_text_to_spans = defaultdict(list)
-        for ngram_span in doc.tiers['ngrams'].spans:
-            span_text = ngram_span.text
-            span_text_to_spans[ngram_span.text].append(ngram_span)
-            if span_text != span_text.lower():
-                span_text_to_spans[span_text.lower()].append(ngram_span)
+        if 'tokens' not in doc.tiers:
+            doc.add_tier(TokenAnnotator())
+        # Spans are only created for ngrams that match a synonym.
+        # They are cached so an ngram that matches several synonyms
+        # is represented by a single span.
+        offsets_to_spans = {}
 
-        ngrams = list(set(span_text_to_spans.keys()))
-        cursor = self.connection.cursor()
+        def get_span(offsets):
+            if offsets not in offsets_to_spans:
+                offsets_to_spans[offsets] = AnnoSpan(
+                    offsets[0], offsets[1], doc)
+            return offsets_to_spans[offsets]
 
         spans_to_resolved_keywords = defaultdict(list)
         uris = set()
-        ordered_ngram_iter = iter(sorted(ngrams))
-        try:
-            ngram = next(ordered_ngram_iter)
-            for result in cursor.execute('SELECT * FROM synonyms ORDER BY synonym'):
-                while ngram < result['synonym']:
-                    ngram = next(ordered_ngram_iter)
-                if ngram == result['synonym']:
-                    for span in span_text_to_spans[ngram]:
-                        spans_to_resolved_keywords[span].append(result)
-                        uris.add(result['uri'])
-        except StopIteration:
-            pass
+        # Ngrams are resolved using their text and their lowercased text.
+        # Matches of the text are added first because uppercase characters
+        # sort before lowercase ones in the synonym table.
+        for lowercase in [False, True]:
+            for start, end, ngram, results in self.synonym_matcher.match(
+                    doc, doc.tiers['tokens'], lowercase=lowercase):
+                if lowercase and doc.text[start:end] == ngram:
+                    continue
+                span = get_span((start, end))
+                for result in results:
+                    spans_to_resolved_keywords[span].append(result)
+                    uris.add(result['uri'])
 
         logger.info('%s uris resolved' % len(uris))
 
-        results = cursor.execute('''
-                                 SELECT *
-                                 FROM entity_labels
-                                 WHERE uri IN (''' +
-                                 ','.join('?' for x in uris) +
-                                 ')', list(uris))
-        uris_to_labels = {}
-        for result in results:
-            uris_to_labels[result['uri']] = result['label']
-
         doc.tiers['resolved_keywords'] = AnnoTier([
-            ResolvedKeywordSpan(span, resolved_keywords, uris_to_labels)
-            for span, resolved_keywords in spans_to_resolved_keywords.items()])
+            ResolvedKeywordSpan(
+                keyword_span, resolved_keywords, self.uris_to_labels)
+            for keyword_span, resolved_keywords
+            in spans_to_resolved_keywords.items()])
         doc.tiers['resolved_keywords'].filter_overlapping_spans()
 
         return doc
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Caches for the responses of annotation services"""
+import os
+import sqlite3
+import threading
+from lru_cache import LRUCache
+
+# Responses are cached in this database by default.
+RESPONSE_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), '.annie_cache', 'responses.sqlitedb')
+# The number of responses kept in memory in front of the database.
+MEMORY_CACHE_SIZE = 1000
+
+
+class SQLiteCache(object):
+    """
+    A persistent mapping of string keys to string values in a SQLite
+    database. It can be shared by threads and by processes that use the
+    same database.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            # Processes reading the cache do not block the one writing to it.
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS cache
+                (key text primary key, value text)""")
+            self.connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return list(self.connection.execute(
+                "SELECT count(*) FROM cache"))[0][0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            rows = list(self.connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)))
+        if len(rows) == 0:
+            return default
+        return rows[0][0]
+
+    def set(self, key, value):
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?)", (key, value))
+            self.connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM cache")
+            self.connection.commit()
+
+
+class TwoLevelCache(object):
+    """
+    A cache that looks keys up in a fast cache, like an LRUCache, before
+    looking them up in a slower one, like a SQLiteCache. Items found in the
+    slower cache are added to the faster one.
+    """
+
+    def __init__(self, front, back):
+        self.front = front
+        self.back = back
+
+    def get(self, key, default=None):
+        marker = object()
+        value = self.front.get(key, marker)
+        if value is marker:
+            value = self.back.get(key, marker)
+            if value is marker:
+                return default
+            self.front.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.front.set(key, value)
+        self.back.set(key, value)
+
+    def clear(self):
+        self.front.clear()
+        self.back.clear()
+
+
+def create_response_cache(path=RESPONSE_CACHE_PATH,
+                          memory_cache_size=MEMORY_CACHE_SIZE):
+    """
+    Create a cache of responses in the database at the given path with the
+    most recently used ones kept in memory.
+    """
+    return TwoLevelCache(LRUCache(memory_cache_size), SQLiteCache(path))
@@ -5,6 +5,8 @@ from annotator import AnnoSpan
 
 
 class MatchSpan(AnnoSpan):
+    __slots__ = ['base_spans', 'match_name']
+
     def __init__(self, base_spans, match_name=None):
         if isinstance(base_spans, AnnoSpan):
             base_spans = [base_spans]
@@ -13,7 +15,7 @@ class MatchSpan(AnnoSpan):
         self.start = min([s.start for s in base_spans])
         self.end = max([s.end for s in base_spans])
         self.doc = base_spans[0].doc
-        self.label = self.text
+        self.label = None
         self.match_name = match_name
 
     def __repr__(self):
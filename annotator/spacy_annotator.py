@@ -7,20 +7,25 @@ spacy_nlp = spacy_model.load()
 
 
 class TokenSpan(AnnoSpan):
+    __slots__ = ['token']
+
     def __init__(self, token, doc):
         self.doc = doc
         self.start = token.idx
         self.end = token.idx + len(token)
-        self.label = token.text
+        # The token text is the span's text so it is not stored as the label.
+        self.label = None
         self.token = token
 
 
 class SentSpan(AnnoSpan):
+    __slots__ = ['span']
+
     def __init__(self, span, doc):
         self.doc = doc
         self.start = span.start_char
         self.end = span.end_char
-        self.label = span.text
+        self.label = None
         self.span = span
 
 
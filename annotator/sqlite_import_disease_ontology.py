@@ -2,24 +2,178 @@
 Script for importing disease names from the disease ontology (http://disease-ontology.org/)
 into the slite synonym table so they can be resolved by the resolved keyword annotator.
 """
-import rdflib
+import gzip
+import hashlib
+import json
+import os
 import re
+import shutil
+import tempfile
+from collections import defaultdict, deque
+from urllib import urlopen
+from xml.etree import cElementTree as ElementTree
 from get_database_connection import get_database_connection
 
+DISEASE_ONTOLOGY_URL = "http://purl.obolibrary.org/obo/doid.owl"
+# Only diseases by infectious agent are imported.
+INFECTIOUS_DISEASE_URI = "http://purl.obolibrary.org/obo/DOID_0050117"
+# Parsed ontologies are cached in this directory by the hash of their file,
+# so the ontology is only parsed again when it changes.
+CACHE_DIRECTORY = os.path.expanduser("~") + '/.annie_cache'
 
-def batched(array):
-    batch_size = 100
-    batch = []
-    for idx, item in enumerate(array):
-        batch.append(item)
-        batch_idx = idx % batch_size
-        if batch_idx == batch_size - 1:
-            yield batch
-            batch = []
-    yield batch
+RDF_NAMESPACE = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+RDFS_NAMESPACE = '{http://www.w3.org/2000/01/rdf-schema#}'
+OBO_IN_OWL_NAMESPACE = '{http://www.geneontology.org/formats/oboInOwl#}'
 
+# The weights of synonyms by the property they are from.
+SYNONYM_TYPE_WEIGHTS = {
+    'label': 3,
+    'hasExactSynonym': 2,
+    'hasNarrowSynonym': 1,
+    'hasRelatedSynonym': 0,
+}
+SYNONYM_TYPES = {
+    RDFS_NAMESPACE + 'label': 'label',
+    OBO_IN_OWL_NAMESPACE + 'hasExactSynonym': 'hasExactSynonym',
+    OBO_IN_OWL_NAMESPACE + 'hasNarrowSynonym': 'hasNarrowSynonym',
+    OBO_IN_OWL_NAMESPACE + 'hasRelatedSynonym': 'hasRelatedSynonym',
+}
 
-def import_disease_ontology(drop_previous=False):
+
+def open_ontology_file(source=DISEASE_ONTOLOGY_URL):
+    """
+    Return the path of the disease ontology OWL file at the given URL or path.
+    Downloaded files are written to a temporary file the caller removes.
+    """
+    if source.startswith('http://') or source.startswith('https://'):
+        print "Downloading the disease ontology from: " + source
+        handle, path = tempfile.mkstemp(suffix='.owl')
+        with os.fdopen(handle, 'wb') as f:
+            shutil.copyfileobj(urlopen(source), f, 1 << 20)
+        return path
+    return source
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def parse_disease_ontology(path):
+    """
+    Parse the classes of an OWL file with their superclasses and synonyms.
+    The file is parsed incrementally and each class is discarded once it is
+    read. Returns a dict mapping class URIs to lists of the URIs of their
+    superclasses and a dict mapping them to lists of
+    [synonym type, synonym] pairs.
+    """
+    superclasses = defaultdict(list)
+    synonyms = defaultdict(list)
+    depth = 0
+    root = None
+    for event, element in ElementTree.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        # Classes are described by the children of the rdf:RDF element.
+        if depth != 1:
+            continue
+        uri = element.get(RDF_NAMESPACE + 'about')
+        if uri:
+            for child in element:
+                if child.tag == RDFS_NAMESPACE + 'subClassOf':
+                    # Superclasses that are restrictions rather than named
+                    # classes are not followed.
+                    parent = child.get(RDF_NAMESPACE + 'resource')
+                    if parent and parent not in superclasses[uri]:
+                        superclasses[uri].append(parent)
+                elif child.tag in SYNONYM_TYPES and child.text:
+                    synonym = [SYNONYM_TYPES[child.tag], child.text]
+                    if synonym not in synonyms[uri]:
+                        synonyms[uri].append(synonym)
+        root.clear()
+    return dict(superclasses), dict(synonyms)
+
+
+def load_parsed_ontology(path, cache_directory=CACHE_DIRECTORY):
+    """
+    Return the parsed classes of the OWL file at the given path like
+    parse_disease_ontology. They are read from the cache directory when the
+    file was parsed before and written to it otherwise.
+    """
+    if cache_directory is None:
+        return parse_disease_ontology(path)
+    cache_path = os.path.join(
+        cache_directory, 'disease_ontology-' + file_hash(path) + '.json.gz')
+    if os.path.exists(cache_path):
+        print "Loading the parsed disease ontology from: " + cache_path
+        with gzip.open(cache_path, 'rb') as f:
+            parsed_ontology = json.load(f)
+        return parsed_ontology['superclasses'], parsed_ontology['synonyms']
+    print "Parsing the disease ontology..."
+    superclasses, synonyms = parse_disease_ontology(path)
+    if not os.path.exists(cache_directory):
+        os.makedirs(cache_directory)
+    # The cache file is renamed into place once it is complete so
+    # interrupted imports do not leave partial cache files.
+    handle, temp_path = tempfile.mkstemp(dir=cache_directory)
+    os.close(handle)
+    with gzip.open(temp_path, 'wb') as f:
+        json.dump({'superclasses': superclasses, 'synonyms': synonyms}, f)
+    os.rename(temp_path, cache_path)
+    return superclasses, synonyms
+
+
+def get_subclasses(superclasses, root_uri):
+    """
+    Return the set of URIs of the root class and all the classes descended
+    from it.
+    """
+    children = defaultdict(list)
+    for uri, parents in superclasses.items():
+        for parent in parents:
+            children[parent].append(uri)
+    subclasses = set([root_uri])
+    queue = deque([root_uri])
+    while len(queue) > 0:
+        for child in children[queue.popleft()]:
+            if child not in subclasses:
+                subclasses.add(child)
+                queue.append(child)
+    return subclasses
+
+
+def synonym_tuples(synonym, uri, weight):
+    """
+    Return (synonym, uri, weight) tuples for the variations of the synonym
+    that are imported.
+    """
+    # Remove text that starts with a bracket
+    if re.match(re.compile(r"^(\[|\()", re.I), synonym):
+        return []
+    synonym = re.sub(r"\s*\(.*?\)\s*", " ", synonym)
+    synonym = re.sub(r"\s*\[.*?\]\s*", " ", synonym)
+    synonym = synonym.strip()
+    if re.match(re.compile(r"^(or|and)\b", re.I), synonym):
+        return []
+    if len(synonym) == 0:
+        return []
+    elif len(synonym) > 6:
+        return [(synonym.lower(), uri, weight), (synonym, uri, weight)]
+    else:
+        # Short synonyms are likely to be acronyms so
+        # capitalization is preserved.
+        return [(synonym, uri, weight)]
+
+
+def import_disease_ontology(drop_previous=False, source=DISEASE_ONTOLOGY_URL,
+                            cache_directory=CACHE_DIRECTORY):
     connection = get_database_connection(create_database=True)
     cur = connection.cursor()
     if drop_previous:
@@ -32,6 +186,17 @@ def import_disease_ontology(drop_previous=False):
     if table_exists:
         print "The table already exists. Run this again with --drop-previous to recreate it."
         return
+    load_disease_ontology(connection, source, cache_directory)
+    connection.close()
+
+
+def load_disease_ontology(connection, source=DISEASE_ONTOLOGY_URL,
+                          cache_directory=CACHE_DIRECTORY):
+    """
+    Import the synonyms and labels of the infectious diseases in the disease
+    ontology OWL file at the given URL or path into the database.
+    """
+    cur = connection.cursor()
     # synonyms_init is a temporary tables that is aggregated to generate the
     # final synonyms table.
     cur.execute("""
@@ -42,73 +207,22 @@ def import_disease_ontology(drop_previous=False):
     CREATE TABLE synonyms (
         synonym text, uri text, weight integer
     )""")
-    i = 0
     insert_command = 'INSERT OR IGNORE INTO synonyms_init VALUES (?, ?, ?)'
     print("Loading disease ontology...")
-    disease_ontology = rdflib.Graph()
-    disease_ontology.parse(
-        "http://purl.obolibrary.org/obo/doid.owl",
-        format="xml")
+    path = open_ontology_file(source)
+    try:
+        superclasses, synonyms = load_parsed_ontology(path, cache_directory)
+    finally:
+        if path != source:
+            os.remove(path)
     print("Importing synonyms from disease ontology...")
-    disease_query = disease_ontology.query("""
-    SELECT ?entity ?synonym ?synonymType (count(?child) AS ?children)
-    WHERE {
-        VALUES ?synonymType {
-            rdfs:label
-            oboInOwl:hasExactSynonym
-            oboInOwl:hasRelatedSynonym
-            oboInOwl:hasNarrowSynonym
-        }
-        # only include diseases by infectious agent
-        ?entity rdfs:subClassOf* obo:DOID_0050117
-        ; ?synonymType ?synonym .
-        OPTIONAL {
-            ?child rdfs:subClassOf ?entity
-        }
-    } GROUP BY ?entity ?synonym ?synonymType
-    """)
-    for batch in batched(disease_query):
-        tuples = []
-        for result in batch:
-            rdict = result.asdict()
-            synonymType = rdict['synonymType'].split("#")[1]
-            weight = 0
-            if synonymType == 'label':
-                weight += 3
-            elif synonymType == 'hasExactSynonym':
-                weight += 2
-            elif synonymType == 'hasNarrowSynonym':
-                weight += 1
-            elif synonymType == 'hasRelatedSynonym':
-                weight += 0
-            else:
-                print "Unknown synonymType:", synonymType
-                continue
-            if rdict['children'] == 0:
-                # Sometimes parents diseases have as synonyms child disease
-                # names. The weight of diseases with no children is boosted
-                # so that the most specific entity is used.
-                weight += 1
-            syn_string = str(rdict['synonym'])
-            uri = str(rdict['entity'])
-            # Remove text that starts with a bracket
-            if re.match(re.compile(r"^(\[|\()", re.I), syn_string):
-                continue
-            syn_string = re.sub(r"\s*\(.*?\)\s*", " ", syn_string)
-            syn_string = re.sub(r"\s*\[.*?\]\s*", " ", syn_string)
-            syn_string = syn_string.strip()
-            if re.match(re.compile(r"^(or|and)\b", re.I), syn_string):
-                continue
-            if len(syn_string) == 0:
-                continue
-            elif len(syn_string) > 6:
-                tuples.append((syn_string.lower(), uri, weight))
-                tuples.append((syn_string, uri, weight))
-            else:
-                # Short syn_strings are likely to be acronyms so
-                # capitalization is preserved.
-                tuples.append((syn_string, uri, weight))
-        cur.executemany(insert_command, tuples)
+    subclasses = get_subclasses(superclasses, INFECTIOUS_DISEASE_URI)
+    tuples = []
+    for uri in subclasses:
+        for synonym_type, synonym in synonyms.get(uri, []):
+            tuples += synonym_tuples(
+                synonym, uri, SYNONYM_TYPE_WEIGHTS[synonym_type])
+    cur.executemany(insert_command, tuples)
     # Extra synonyms not in the disease ontology
     cur.executemany(insert_command, [
         ('HIV', 'http://purl.obolibrary.org/obo/DOID_526', 3),
@@ -121,21 +235,15 @@ def import_disease_ontology(drop_previous=False):
     FROM synonyms_init
     GROUP BY synonym, uri
     ''')
-    disease_labels = disease_ontology.query("""
-    SELECT ?entity ?label
-    WHERE {
-        # only include diseases by infectious agent
-        ?entity rdfs:subClassOf* obo:DOID_0050117
-        ; rdfs:label ?label
-    }
-    """)
     cur.execute("""
     CREATE TABLE entity_labels (
         uri text, label text
     )""")
     cur.executemany("INSERT INTO entity_labels VALUES (?, ?)", [
-        (str(result[0]), str(result[1]))
-        for result in disease_labels])
+        (uri, synonym)
+        for uri in subclasses
+        for synonym_type, synonym in synonyms.get(uri, [])
+        if synonym_type == 'label'])
     cur.execute("DROP TABLE IF EXISTS 'synonyms_init'")
     print "Creating indexes..."
     cur.execute('''
@@ -143,7 +251,6 @@ def import_disease_ontology(drop_previous=False):
     ON synonyms (synonym);
     ''')
     connection.commit()
-    connection.close()
 
 
 if __name__ == '__main__':
@@ -151,6 +258,13 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--drop-previous", dest='drop_previous', action='store_true')
+    parser.add_argument(
+        "--source", default=DISEASE_ONTOLOGY_URL,
+        help="The URL or path of the disease ontology OWL file.")
+    parser.add_argument(
+        "--cache-dir", dest='cache_directory', default=CACHE_DIRECTORY,
+        help="The directory parsed ontologies are cached in.")
     parser.set_defaults(drop_previous=False)
     args = parser.parse_args()
-    import_disease_ontology(args.drop_previous)
+    import_disease_ontology(
+        args.drop_previous, args.source, args.cache_directory)
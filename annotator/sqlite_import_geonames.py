@@ -1,11 +1,21 @@
+import os
+import re
 import sys
-import csv
-import unicodecsv
-from StringIO import StringIO
-from zipfile import ZipFile
+import itertools
+import json
+import multiprocessing
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
 from urllib import urlopen
 from get_database_connection import get_database_connection
 from utils import parse_number
+from geo_utils import (
+    ADMIN_CODE_FIELDS, feature_level, admin_path, containment_key, grid_cells)
 
 GEONAMES_ZIP_URL = "http://download.geonames.org/export/dump/allCountries.zip"
 
@@ -31,45 +41,432 @@ geonames_field_mappings = [
     ('modification_date', None)
 ]
 
+# Columns computed from the geonames.org fields when they are imported.
+derived_field_mappings = [
+    ('feature_level', 'integer'),
+    ('admin_path', 'text'),
+    ('grid_cell', 'integer'),
+]
 
-def read_geonames_csv():
-    print "Downloading geoname data from: " + GEONAMES_ZIP_URL
-    url = urlopen(GEONAMES_ZIP_URL)
-    zipfile = ZipFile(StringIO(url.read()))
-    print "done"
-    # Loading geonames data may cause errors without this line:
-    csv.field_size_limit(sys.maxint)
-    with zipfile.open('allCountries.txt') as f:
-        reader = unicodecsv.DictReader(f,
-                                       fieldnames=[
-                                           k for k, v in geonames_field_mappings],
-                                       encoding='utf-8',
-                                       delimiter='\t',
-                                       quoting=csv.QUOTE_NONE)
-        for d in reader:
-            d['population'] = parse_number(d['population'], 0)
-            d['latitude'] = parse_number(d['latitude'], 0)
-            d['longitude'] = parse_number(d['longitude'], 0)
-            if len(d['alternatenames']) > 0:
-                d['alternatenames'] = d['alternatenames'].split(',')
-            else:
-                d['alternatenames'] = []
-            yield d
+# The number of geonames parsed and inserted together. The import is
+# committed after each batch along with the number of geonames imported so
+# far, so an interrupted import can be resumed.
+BATCH_SIZE = 50000
+# The number of processes that parse the table while it is written to the
+# database by the main process.
+PARSE_WORKERS = max(1, multiprocessing.cpu_count() - 1)
+# The number of geonames imported between progress messages.
+PROGRESS_INTERVAL = 1000000
+# The rules that restrict pruned imports to the geonames they are used for.
+PRUNING_RULES = [
+    'feature_classes', 'feature_codes', 'min_population', 'countries']
+# These make the bulk inserts faster. The rollback journal is kept so
+# interrupted imports are rolled back to their last checkpoint, but it is
+# truncated rather than deleted after each commit and is not synced to disk.
+# An OS crash during the import can corrupt the database.
+IMPORT_PRAGMAS = [
+    "PRAGMA synchronous = OFF",
+    "PRAGMA journal_mode = TRUNCATE",
+    # The cache size is in KiB when it is negative.
+    "PRAGMA cache_size = -1000000",
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+def open_geonames_file(source=GEONAMES_ZIP_URL):
+    """
+    Open the allCountries.txt geonames table given a URL or path of the zip
+    file geonames.org distributes it in or a path to the extracted table.
+    A file object for the table, like sys.stdin, is returned as it is.
+    """
+    if not isinstance(source, basestring):
+        return source
+    elif source == '-':
+        return sys.stdin
+    elif source.startswith('http://') or source.startswith('https://'):
+        print "Downloading geoname data from: " + source
+        # The zip file is streamed to disk rather than held in memory.
+        # Its directory is at its end, so it cannot be read as it downloads.
+        zip_file = tempfile.TemporaryFile()
+        shutil.copyfileobj(urlopen(source), zip_file, 1 << 20)
+        print "done"
+        return zipfile.ZipFile(zip_file).open('allCountries.txt')
+    elif zipfile.is_zipfile(source):
+        return zipfile.ZipFile(source).open('allCountries.txt')
+    else:
+        return open(source, 'rb')
+
+
+def read_lines(f, chunk_size=1 << 20):
+    """
+    Yield the non-empty lines of a file without their line breaks. The file
+    is read in large chunks because reading the lines of zip files one by
+    one is slow.
+    """
+    remainder = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if len(chunk) == 0:
+            break
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            if len(line) > 0:
+                yield line
+    if len(remainder) > 0:
+        yield remainder
+
+
+def parse_coordinate(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0
+
+
+def geoname_filter(pruning_rules):
+    """
+    Return a function of the values of a line of the geonames table that
+    determines whether its geoname is kept by the given pruning rules.
+
+    Geonames are kept when their feature class is in feature_classes or
+    their feature code is in feature_codes and their country is in countries.
+    Populated places (feature class P) are also required to have a
+    population of at least min_population. Missing rules keep all geonames.
+    """
+    feature_classes = pruning_rules.get('feature_classes')
+    feature_codes = pruning_rules.get('feature_codes')
+    if feature_classes is None and feature_codes is None:
+        features = None
+    else:
+        features = set(feature_classes or []) | set(feature_codes or [])
+    countries = pruning_rules.get('countries')
+    if countries is not None:
+        countries = set(countries)
+    min_population = pruning_rules.get('min_population') or 0
+
+    def keep_geoname(values):
+        if features is not None and (
+                values[6] not in features and values[7] not in features):
+            return False
+        if countries is not None and values[8] not in countries:
+            return False
+        if min_population > 0 and values[6] == u'P':
+            return parse_number(values[14], 0) >= min_population
+        return True
+    return keep_geoname
+
+
+def parse_geonames(lines, pruning_rules=None):
+    """
+    Parse lines of the tab separated geonames table into lists of the
+    geonames table rows and alternatenames table rows. The geonames rows
+    include the derived fields. Geonames that are not kept by the given
+    pruning rules are left out.
+    """
+    keep_geoname = geoname_filter(pruning_rules) if pruning_rules else None
+    geoname_tuples = []
+    alternatename_tuples = []
+    latitudes = []
+    longitudes = []
+    for line in lines:
+        values = line.split(u'\t')
+        if keep_geoname and not keep_geoname(values):
+            continue
+        geonameid = values[0]
+        name = values[1]
+        latitude = parse_coordinate(values[4])
+        longitude = parse_coordinate(values[5])
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+        geoname_tuples.append((
+            geonameid,
+            name,
+            values[2],
+            latitude,
+            longitude
+        ) + tuple(values[6:14]) + (
+            parse_number(values[14], 0),
+            feature_level(values[7]),
+            # The country code is followed by cc2 and the admin codes.
+            admin_path(dict(zip(
+                ADMIN_CODE_FIELDS, values[8:9] + values[10:14])))
+        ))
+        if len(values[3]) > 0:
+            alternatenames = set(values[3].split(u','))
+            alternatenames.add(name)
+        else:
+            alternatenames = [name]
+        for alternatename in alternatenames:
+            alternatename_tuples.append((
+                geonameid,
+                alternatename,
+                alternatename.lower().strip()))
+    geoname_tuples = [
+        geoname + (cell,) for geoname, cell in zip(
+            geoname_tuples, grid_cells(latitudes, longitudes).tolist())]
+    return geoname_tuples, alternatename_tuples
+
+
+def parse_geonames_chunk(chunk, pruning_rules=None):
+    """
+    Parse a UTF-8 encoded chunk of lines of the geonames table like
+    parse_geonames. Chunks are decoded at once rather than line by line.
+    """
+    return parse_geonames(chunk.decode('utf-8').split(u'\n'), pruning_rules)
+
+
+def chunk_line_count(chunk):
+    return chunk.count(b'\n') + 1
+
+
+def read_chunks(source=GEONAMES_ZIP_URL, skip_rows=0, batch_size=BATCH_SIZE):
+    """
+    Yield chunks of batch_size lines of the geonames table at the given
+    source. The first skip_rows lines are skipped.
+    """
+    f = open_geonames_file(source)
+    try:
+        lines = itertools.islice(read_lines(f), skip_rows, None)
+        while True:
+            batch = list(itertools.islice(lines, batch_size))
+            if len(batch) == 0:
+                break
+            yield b'\n'.join(batch)
+    finally:
+        # Files passed in are left open for the caller to close.
+        if f is not source and f is not sys.stdin:
+            f.close()
+
+
+def read_geonames_csv(source=GEONAMES_ZIP_URL, skip_rows=0,
+                      batch_size=BATCH_SIZE, pruning_rules=None):
+    """
+    Yield batches of geonames table rows and alternatenames table rows from
+    the geonames table at the given source along with the number of lines
+    they were parsed from. The first skip_rows lines are skipped.
+    """
+    for chunk in read_chunks(source, skip_rows, batch_size):
+        geoname_tuples, alternatename_tuples = parse_geonames_chunk(
+            chunk, pruning_rules)
+        yield geoname_tuples, alternatename_tuples, chunk_line_count(chunk)
+
+
+def create_geonames_tables(cur):
+    """
+    Create the tables the geonames table is imported into. The geonameid
+    index is created after the geonames are inserted, so the geonames table
+    is created without its primary key.
+    """
+    cur.execute("CREATE TABLE geonames (" + ",".join([
+        '"' + k + '" ' + sqltype.replace(' primary key', '')
+        for k, sqltype in geonames_field_mappings + derived_field_mappings
+        if sqltype]) + ")")
+    cur.execute('''CREATE TABLE alternatenames
+                 (geonameid text, alternatename text, alternatename_lemmatized text)''')
+
+
+def insert_geonames(cur, geoname_tuples, alternatename_tuples):
+    cur.executemany('INSERT INTO geonames VALUES (' + ','.join([
+        '?' for x, sqltype in geonames_field_mappings + derived_field_mappings
+        if sqltype]) + ')', geoname_tuples)
+    cur.executemany(
+        'INSERT INTO alternatenames VALUES (?, ?, ?)', alternatename_tuples)
+
+
+def stage_geonames_chunk(chunk, path, pruning_rules=None):
+    """
+    Parse a chunk of lines of the geonames table into a new database at the
+    given path and return the number of lines in the chunk.
+    """
+    geoname_tuples, alternatename_tuples = parse_geonames_chunk(
+        chunk, pruning_rules)
+    connection = sqlite3.connect(path)
+    cur = connection.cursor()
+    # Staging databases are deleted once they are copied, so they are
+    # written without a journal.
+    cur.execute("PRAGMA synchronous = OFF")
+    cur.execute("PRAGMA journal_mode = OFF")
+    create_geonames_tables(cur)
+    insert_geonames(cur, geoname_tuples, alternatename_tuples)
+    connection.commit()
+    connection.close()
+    return chunk_line_count(chunk)
+
+
+def stage_geonames(source=GEONAMES_ZIP_URL, skip_rows=0,
+                   batch_size=BATCH_SIZE, workers=PARSE_WORKERS,
+                   pruning_rules=None):
+    """
+    Parse batches of lines of the geonames table at the given source into
+    staging databases in a pool of worker processes. Yield the paths of the
+    staging databases and their numbers of lines in the order of the
+    table. Each database is deleted when the next one is requested.
+
+    The parsed geonames are passed to the main process in databases
+    because unpickling them there takes about as long as parsing them.
+    """
+    directory = tempfile.mkdtemp()
+    pool = multiprocessing.Pool(workers)
+    staged_chunks = deque()
+
+    def next_staged_chunk():
+        path, result = staged_chunks.popleft()
+        return path, result.get()
+    try:
+        for idx, chunk in enumerate(
+                read_chunks(source, skip_rows, batch_size)):
+            path = os.path.join(directory, '%d.sqlitedb' % idx)
+            staged_chunks.append((path, pool.apply_async(
+                stage_geonames_chunk, (chunk, path, pruning_rules))))
+            # Only a few chunks are parsed ahead of the one being written
+            # so the table is not read faster than it is written.
+            if len(staged_chunks) > 2 * workers:
+                path, count = next_staged_chunk()
+                yield path, count
+                os.remove(path)
+        while len(staged_chunks) > 0:
+            path, count = next_staged_chunk()
+            yield path, count
+            os.remove(path)
+    finally:
+        pool.terminate()
+        shutil.rmtree(directory)
+
+
+def add_containment_keys(connection):
+    """
+    Add the feature_level and admin_path columns that are used to determine
+    which geonames contain each other to the geonames table and create the
+    admin_divisions table mapping admin paths to the countries and
+    administrative divisions they belong to.
+    This can be used to update databases imported without them.
+    """
+    cur = connection.cursor()
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(geonames)")]
+    if 'feature_level' not in columns:
+        cur.execute("ALTER TABLE geonames ADD COLUMN feature_level integer")
+    if 'admin_path' not in columns:
+        cur.execute("ALTER TABLE geonames ADD COLUMN admin_path text")
+    # The rows are read in batches by rowid so they are not updated while
+    # they are being read.
+    last_rowid = -1
+    while True:
+        batch = list(cur.execute(
+            "SELECT rowid, feature_code, " + ", ".join(ADMIN_CODE_FIELDS) +
+            " FROM geonames WHERE rowid > ? ORDER BY rowid LIMIT 10000",
+            (last_rowid,)))
+        if len(batch) == 0:
+            break
+        last_rowid = batch[-1][0]
+        cur.executemany(
+            "UPDATE geonames SET feature_level = ?, admin_path = ? "
+            "WHERE rowid = ?", [(
+                feature_level(row[1] or ""),
+                admin_path(dict(zip(ADMIN_CODE_FIELDS, row[2:]))),
+                row[0]) for row in batch])
+    connection.commit()
+    create_admin_divisions(connection)
+
+
+def create_admin_divisions(connection):
+    """
+    Create the admin_divisions table from the containment keys.
+    """
+    cur = connection.cursor()
+    # When several geonames are the division for an admin path the most
+    # populous one is used.
+    divisions = {}
+    for geonameid, level, path, population in cur.execute("""
+            SELECT geonameid, feature_level, admin_path, population
+            FROM geonames WHERE feature_level > 0
+            ORDER BY population"""):
+        key = containment_key(level, path)
+        if key:
+            divisions[key] = geonameid
+    cur.execute("DROP TABLE IF EXISTS admin_divisions")
+    cur.execute("""CREATE TABLE admin_divisions
+        (admin_path text primary key, geonameid text)""")
+    cur.executemany(
+        "INSERT INTO admin_divisions VALUES (?, ?)", divisions.items())
+    connection.commit()
+
+
+def add_spatial_index(connection):
+    """
+    Add the grid_cell column used to find the geonames near a point to the
+    geonames table and index it.
+    This can be used to update databases imported without it.
+    """
+    cur = connection.cursor()
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(geonames)")]
+    if 'grid_cell' not in columns:
+        cur.execute("ALTER TABLE geonames ADD COLUMN grid_cell integer")
+    last_rowid = -1
+    while True:
+        batch = list(cur.execute(
+            "SELECT rowid, latitude, longitude FROM geonames "
+            "WHERE rowid > ? ORDER BY rowid LIMIT 10000", (last_rowid,)))
+        if len(batch) == 0:
+            break
+        last_rowid = batch[-1][0]
+        rowids, latitudes, longitudes = zip(*batch)
+        cells = grid_cells(
+            [latitude or 0 for latitude in latitudes],
+            [longitude or 0 for longitude in longitudes])
+        cur.executemany(
+            "UPDATE geonames SET grid_cell = ? WHERE rowid = ?",
+            zip(cells.tolist(), rowids))
+    connection.commit()
+    create_grid_cell_index(connection)
 
 
-def batched(array):
-    batch_size = 100
-    batch = []
-    for idx, item in enumerate(array):
-        batch.append(item)
-        batch_idx = idx % batch_size
-        if batch_idx == batch_size - 1:
-            yield batch
-            batch = []
-    yield batch
+def create_grid_cell_index(connection):
+    connection.execute('''CREATE INDEX IF NOT EXISTS geoname_grid_cell_index
+        ON geonames (grid_cell, latitude, longitude, geonameid)''')
+    connection.commit()
+
+
+def get_checkpoint(cur):
+    """
+    Return the number of lines of the geonames table imported by an
+    unfinished import or None if there is no unfinished import.
+    """
+    table_exists = len(list(cur.execute("""SELECT name FROM sqlite_master
+        WHERE type='table' AND name='geonames_import_checkpoint'"""))) > 0
+    if not table_exists:
+        return None
+    return list(cur.execute(
+        "SELECT rows_imported FROM geonames_import_checkpoint"))[0][0]
+
+
+def get_import_metadata(connection):
+    """
+    Return a dict of the metadata recorded by the import of the database,
+    like the pruning rules it was imported with. Databases imported before
+    the metadata was recorded have none.
+    """
+    table_exists = len(list(connection.execute("""SELECT name
+        FROM sqlite_master
+        WHERE type='table' AND name='import_metadata'"""))) > 0
+    if not table_exists:
+        return {}
+    return {
+        key: json.loads(value) for key, value in connection.execute(
+            "SELECT key, value FROM import_metadata")}
+
 
+def set_import_metadata(cur, **metadata):
+    cur.execute("""CREATE TABLE IF NOT EXISTS import_metadata
+        (key text primary key, value text)""")
+    cur.executemany(
+        "INSERT OR REPLACE INTO import_metadata VALUES (?, ?)",
+        [(key, json.dumps(value)) for key, value in metadata.items()])
 
-def import_geonames(drop_previous=False):
+
+def import_geonames(drop_previous=False, source=GEONAMES_ZIP_URL,
+                    batch_size=BATCH_SIZE, workers=PARSE_WORKERS,
+                    pruning_rules=None):
     connection = get_database_connection(create_database=True)
     cur = connection.cursor()
     if drop_previous:
@@ -77,48 +474,118 @@ def import_geonames(drop_previous=False):
         cur.execute("""DROP TABLE IF EXISTS 'geonames'""")
         cur.execute("""DROP TABLE IF EXISTS 'alternatenames'""")
         cur.execute("""DROP TABLE IF EXISTS 'alternatename_counts'""")
+        cur.execute("""DROP TABLE IF EXISTS 'admin_divisions'""")
+        cur.execute("""DROP TABLE IF EXISTS 'geonames_import_checkpoint'""")
+        cur.execute("""DROP TABLE IF EXISTS 'import_metadata'""")
         cur.execute("""DROP INDEX IF EXISTS 'alternatename_index'""")
+        cur.execute("""DROP INDEX IF EXISTS 'alternatename_covering_index'""")
+        cur.execute("""DROP INDEX IF EXISTS 'geoname_grid_cell_index'""")
+        cur.execute(
+            """DROP INDEX IF EXISTS 'alternatename_geonameid_index'""")
     table_exists = len(list(cur.execute("""SELECT name FROM sqlite_master
         WHERE type='table' AND name='geonames'"""))) > 0
-    if table_exists:
+    rows_imported = get_checkpoint(cur)
+    if table_exists and rows_imported is None:
         print "The geonames table already exists. Run this again with --drop-previous to recreate it."
         return
-    # Create table
-    cur.execute("CREATE TABLE geonames (" + ",".join([
-        '"' + k + '" ' + sqltype
-        for k, sqltype in geonames_field_mappings if sqltype]) + ")")
-    cur.execute('''CREATE TABLE alternatenames
-                 (geonameid text, alternatename text, alternatename_lemmatized text)''')
-    i = 0
-    geonames_insert_command = 'INSERT INTO geonames VALUES (' + ','.join([
-        '?' for x, sqltype in geonames_field_mappings if sqltype]) + ')'
-    alternatenames_insert_command = 'INSERT INTO alternatenames VALUES (?, ?, ?)'
-    for batch in batched(read_geonames_csv()):
-        geoname_tuples = []
-        alternatename_tuples = []
-        for geoname in batch:
-            i += 1
-            total_row_estimate = 11000000
-            if i % (total_row_estimate / 40) == 0:
-                print i, '/', total_row_estimate, '+ geonames imported'
-                connection.commit()
-            geoname_tuples.append(
-                tuple(geoname[field]
-                      for field, sqltype in geonames_field_mappings
-                      if sqltype))
-            for alternatename in set(geoname['alternatenames'] + [geoname['name']]):
-                alternatename_tuples.append((
-                    geoname['geonameid'],
-                    alternatename,
-                    alternatename.lower().strip()))
-        cur.executemany(geonames_insert_command, geoname_tuples)
-        cur.executemany(alternatenames_insert_command, alternatename_tuples)
+    load_geonames(connection, source, batch_size, workers, pruning_rules)
+    connection.close()
+
+
+def load_geonames(connection, source=GEONAMES_ZIP_URL, batch_size=BATCH_SIZE,
+                  workers=PARSE_WORKERS, pruning_rules=None):
+    """
+    Import the geonames table at the given source into the database or
+    resume an unfinished import of it. The table is parsed in batches of
+    batch_size lines by the given number of worker processes.
+    pruning_rules is a dict of the PRUNING_RULES the geonames are filtered
+    by (see geoname_filter). They are recorded in the import_metadata table.
+    """
+    cur = connection.cursor()
+    rows_imported = get_checkpoint(cur)
+    for pragma in IMPORT_PRAGMAS:
+        cur.execute(pragma)
+    pruning_rules = {
+        rule: value for rule, value in (pruning_rules or {}).items()
+        if value is not None}
+    if rows_imported is None:
+        rows_imported = 0
+        create_geonames_tables(cur)
+        cur.execute('''CREATE TABLE geonames_import_checkpoint
+                     (rows_imported integer)''')
+        cur.execute("INSERT INTO geonames_import_checkpoint VALUES (0)")
+        set_import_metadata(
+            cur, pruning_rules=pruning_rules,
+            imported=datetime.utcnow().isoformat(),
+            source=source if isinstance(source, basestring) else None)
+        connection.commit()
+    else:
+        if get_import_metadata(connection).get('pruning_rules', {}) != (
+                pruning_rules):
+            raise Exception(
+                "The unfinished import was started with different pruning "
+                "rules. Run this again with --drop-previous to start a new "
+                "import.")
+        print "Resuming the import after", rows_imported, "geonames..."
+    if pruning_rules:
+        print "Pruning rules:", json.dumps(pruning_rules, sort_keys=True)
+
+    def insert_batches():
+        """
+        Insert batches of geonames and yield the numbers of lines they
+        were parsed from. The batches are committed when the next one is
+        requested.
+        """
+        if workers > 1:
+            for path, count in stage_geonames(
+                    source, rows_imported, batch_size, workers,
+                    pruning_rules):
+                cur.execute("ATTACH DATABASE ? AS staged_geonames", (path,))
+                cur.execute(
+                    "INSERT INTO geonames "
+                    "SELECT * FROM staged_geonames.geonames")
+                cur.execute(
+                    "INSERT INTO alternatenames "
+                    "SELECT * FROM staged_geonames.alternatenames")
+                yield count
+                # Databases cannot be detached within a transaction.
+                cur.execute("DETACH DATABASE staged_geonames")
+        else:
+            for geoname_tuples, alternatename_tuples, count in (
+                    read_geonames_csv(
+                        source, rows_imported, batch_size, pruning_rules)):
+                insert_geonames(cur, geoname_tuples, alternatename_tuples)
+                yield count
+    start_time = time.time()
+    rows_since_start = 0
+    for count in insert_batches():
+        rows_imported += count
+        rows_since_start += count
+        cur.execute(
+            "UPDATE geonames_import_checkpoint SET rows_imported = ?",
+            (rows_imported,))
+        connection.commit()
+        if (rows_imported - count) // PROGRESS_INTERVAL < (
+                rows_imported // PROGRESS_INTERVAL):
+            print rows_imported, "geonames imported (%.0f rows/second)" % (
+                rows_since_start / (time.time() - start_time))
+    print rows_imported, "geonames imported"
+    if pruning_rules:
+        print list(cur.execute("SELECT count(*) FROM geonames"))[0][0], (
+            "geonames kept by the pruning rules")
+    # The remaining steps can be repeated if they are interrupted.
     print "Creating indexes..."
     cur.execute('''
-    CREATE INDEX alternatename_index
-    ON alternatenames (alternatename_lemmatized);
+    CREATE UNIQUE INDEX IF NOT EXISTS geonameid_index ON geonames (geonameid)
+    ''')
+    # The index includes all the alternatenames columns used by the
+    # geoname annotator's candidate query so they can be read from the index.
+    cur.execute('''
+    CREATE INDEX IF NOT EXISTS alternatename_covering_index
+    ON alternatenames (alternatename_lemmatized, geonameid, alternatename);
     ''')
     connection.commit()
+    cur.execute("""DROP TABLE IF EXISTS 'alternatename_counts'""")
     cur.execute('''CREATE TABLE alternatename_counts
                  (geonameid text primary key, count integer)''')
     cur.execute('''
@@ -128,7 +595,240 @@ def import_geonames(drop_previous=False):
     GROUP BY geonameid
     ''')
     connection.commit()
-    connection.close()
+    print "Creating admin divisions..."
+    create_admin_divisions(connection)
+    print "Creating spatial index..."
+    create_grid_cell_index(connection)
+    cur.execute("DROP TABLE geonames_import_checkpoint")
+    connection.commit()
+
+
+# The daily update files geonames.org publishes, in the order the files for
+# a day are applied. Geoname modifications reset the alternatenames of the
+# modified geonames from their alternatenames column, so the alternate
+# name changes are applied after them.
+UPDATE_FILE_TYPES = [
+    'modifications',
+    'deletes',
+    'alternateNamesModifications',
+    'alternateNamesDeletes',
+]
+# Alternate names in these pseudo-languages are links, codes and identifiers
+# that are not included in the alternatenames column of the geonames table.
+NON_NAME_LANGUAGES = set([
+    u'link', u'post', u'iata', u'icao', u'faac', u'tcid', u'unlc', u'wkdt'])
+
+
+def update_file_order(path):
+    """
+    Return the date and type index of a geonames.org update file that is
+    used to apply the files in order.
+    """
+    match = re.match(
+        r'(\w+)-(\d{4}-\d{2}-\d{2})\.txt$', os.path.basename(path))
+    if not match or match.group(1) not in UPDATE_FILE_TYPES:
+        raise ValueError("Unrecognized geonames update file: " + path)
+    return match.group(2), UPDATE_FILE_TYPES.index(match.group(1))
+
+
+def read_update_rows(path):
+    """
+    Yield the tab separated values of each line of an update file.
+    """
+    with open(path, 'rb') as f:
+        for line in read_lines(f):
+            yield line.decode('utf-8').split(u'\t')
+
+
+def apply_modifications(cur, path, columns, pruning_rules):
+    """
+    Insert or replace the modified geonames and replace their
+    alternatenames with the ones in their alternatenames column.
+    Modified geonames that are no longer kept by the pruning rules the
+    database was imported with are deleted.
+    """
+    field_names = [
+        k for k, sqltype in geonames_field_mappings + derived_field_mappings
+        if sqltype]
+    # Databases imported without some of the derived columns are updated
+    # without them.
+    field_indices = [field_names.index(column) for column in columns]
+    insert_geonames_sql = (
+        'INSERT OR REPLACE INTO geonames (' +
+        ','.join('"' + column + '"' for column in columns) + ') VALUES (' +
+        ','.join('?' for column in columns) + ')')
+    cur.execute("DELETE FROM modified_alternatenames")
+    cur.execute("DELETE FROM deleted_geonameids")
+    for chunk in read_chunks(path):
+        geoname_tuples, alternatename_tuples = parse_geonames_chunk(
+            chunk, pruning_rules)
+        if pruning_rules:
+            kept_geonameids = set(geoname[0] for geoname in geoname_tuples)
+            cur.executemany(
+                "INSERT OR IGNORE INTO deleted_geonameids VALUES (?)", [
+                    (geonameid,) for geonameid in (
+                        line.split(b'\t', 1)[0].decode('utf-8')
+                        for line in chunk.split(b'\n'))
+                    if geonameid not in kept_geonameids])
+        cur.executemany(insert_geonames_sql, [
+            [geoname[idx] for idx in field_indices]
+            for geoname in geoname_tuples])
+        cur.executemany(
+            "INSERT INTO modified_alternatenames VALUES (?, ?, ?)",
+            alternatename_tuples)
+    cur.execute("""DELETE FROM alternatenames WHERE geonameid IN
+        (SELECT DISTINCT geonameid FROM modified_alternatenames)""")
+    cur.execute("""INSERT INTO alternatenames
+        SELECT * FROM modified_alternatenames""")
+    cur.execute("""INSERT OR IGNORE INTO affected_geonameids
+        SELECT DISTINCT geonameid FROM modified_alternatenames""")
+    if len(list(cur.execute("SELECT 1 FROM deleted_geonameids LIMIT 1"))):
+        delete_geonames(cur)
+
+
+def apply_deletes(cur, path):
+    cur.execute("DELETE FROM deleted_geonameids")
+    cur.executemany(
+        "INSERT OR IGNORE INTO deleted_geonameids VALUES (?)",
+        ((values[0],) for values in read_update_rows(path)))
+    delete_geonames(cur)
+
+
+def delete_geonames(cur):
+    """
+    Delete the geonames in the deleted_geonameids table.
+    """
+    cur.execute("""DELETE FROM geonames WHERE geonameid IN
+        (SELECT geonameid FROM deleted_geonameids)""")
+    cur.execute("""DELETE FROM alternatenames WHERE geonameid IN
+        (SELECT geonameid FROM deleted_geonameids)""")
+    cur.execute("""INSERT OR IGNORE INTO affected_geonameids
+        SELECT geonameid FROM deleted_geonameids""")
+
+
+def apply_alternatename_modifications(cur, path):
+    """
+    Add modified alternate names to the geonames they belong to.
+    Alternate names are not stored with their geonames.org ids, so the
+    previous value of a modified alternate name is not removed.
+    """
+    for values in read_update_rows(path):
+        geonameid, language, alternatename = values[1:4]
+        if language in NON_NAME_LANGUAGES:
+            continue
+        lemmatized = alternatename.lower().strip()
+        cur.execute("""INSERT INTO alternatenames
+            SELECT ?, ?, ?
+            WHERE EXISTS (SELECT 1 FROM geonames WHERE geonameid = ?)
+            AND NOT EXISTS (SELECT 1 FROM alternatenames
+                WHERE alternatename_lemmatized = ? AND geonameid = ?
+                AND alternatename = ?)""", (
+            geonameid, alternatename, lemmatized, geonameid,
+            lemmatized, geonameid, alternatename))
+        if cur.rowcount > 0:
+            cur.execute(
+                "INSERT OR IGNORE INTO affected_geonameids VALUES (?)",
+                (geonameid,))
+
+
+def apply_alternatename_deletes(cur, path):
+    """
+    Remove deleted alternate names from the geonames they belong to.
+    A geoname's own name is kept in its alternatenames like it is when the
+    table is imported.
+    """
+    for values in read_update_rows(path):
+        geonameid, alternatename = values[1:3]
+        cur.execute("""DELETE FROM alternatenames
+            WHERE alternatename_lemmatized = ? AND geonameid = ?
+            AND alternatename = ?
+            AND alternatename NOT IN
+                (SELECT name FROM geonames WHERE geonameid = ?)""", (
+            alternatename.lower().strip(), geonameid, alternatename,
+            geonameid))
+        if cur.rowcount > 0:
+            cur.execute(
+                "INSERT OR IGNORE INTO affected_geonameids VALUES (?)",
+                (geonameid,))
+
+
+def update_geonames(connection, paths):
+    """
+    Apply the daily modifications-*.txt, deletes-*.txt,
+    alternateNamesModifications-*.txt and alternateNamesDeletes-*.txt
+    files geonames.org publishes to an imported database. The files are
+    applied in the order of their dates and the alternatename counts and
+    admin divisions are only recomputed for the geonames they affect.
+    Pruned databases stay pruned by the rules they were imported with.
+    The update is committed at once, so an interrupted update can be rerun.
+    """
+    cur = connection.cursor()
+    if get_checkpoint(cur) is not None:
+        raise Exception(
+            "The geonames import is unfinished. Run "
+            "`python -m annotator.sqlite_import_geonames` to finish it "
+            "before updating it.")
+    for pragma in IMPORT_PRAGMAS:
+        cur.execute(pragma)
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(geonames)")]
+    pruning_rules = get_import_metadata(connection).get('pruning_rules')
+    # The alternatenames of modified and deleted geonames are removed and
+    # recounted by geonameid. The index is created by the first update
+    # rather than the import, which does not need it.
+    cur.execute("""CREATE INDEX IF NOT EXISTS alternatename_geonameid_index
+        ON alternatenames (geonameid)""")
+    cur.execute("""CREATE TEMP TABLE affected_geonameids
+        (geonameid text primary key)""")
+    cur.execute("""CREATE TEMP TABLE deleted_geonameids
+        (geonameid text primary key)""")
+    cur.execute("""CREATE TEMP TABLE modified_alternatenames
+        (geonameid text, alternatename text, alternatename_lemmatized text)""")
+    try:
+        for path in sorted(paths, key=update_file_order):
+            print "Applying " + path + "..."
+            file_type = UPDATE_FILE_TYPES[update_file_order(path)[1]]
+            if file_type == 'modifications':
+                apply_modifications(cur, path, columns, pruning_rules)
+            elif file_type == 'deletes':
+                apply_deletes(cur, path)
+            elif file_type == 'alternateNamesModifications':
+                apply_alternatename_modifications(cur, path)
+            else:
+                apply_alternatename_deletes(cur, path)
+        print "Updating alternatename counts..."
+        cur.execute("""DELETE FROM alternatename_counts WHERE geonameid IN
+            (SELECT geonameid FROM affected_geonameids)""")
+        cur.execute("""INSERT INTO alternatename_counts
+            SELECT geonameid, count(alternatename) FROM alternatenames
+            WHERE geonameid IN (SELECT geonameid FROM affected_geonameids)
+            AND EXISTS (SELECT 1 FROM geonames
+                WHERE geonames.geonameid = alternatenames.geonameid)
+            GROUP BY geonameid""")
+        set_import_metadata(cur, updated=datetime.utcnow().isoformat())
+        connection.commit()
+        has_admin_divisions = len(list(cur.execute("""SELECT name
+            FROM sqlite_master
+            WHERE type='table' AND name='admin_divisions'"""))) > 0
+        if has_admin_divisions:
+            # The admin divisions only change when a division is modified or
+            # deleted.
+            affected_divisions = list(cur.execute("""SELECT 1
+                FROM affected_geonameids
+                WHERE geonameid IN (SELECT geonameid FROM admin_divisions)
+                OR EXISTS (SELECT 1 FROM geonames
+                    WHERE geonames.geonameid = affected_geonameids.geonameid
+                    AND feature_level > 0)
+                LIMIT 1"""))
+            if len(affected_divisions) > 0:
+                print "Updating admin divisions..."
+                create_admin_divisions(connection)
+        print len(list(cur.execute(
+            "SELECT geonameid FROM affected_geonameids"))), "geonames updated"
+    finally:
+        connection.rollback()
+        cur.execute("DROP TABLE affected_geonameids")
+        cur.execute("DROP TABLE deleted_geonameids")
+        cur.execute("DROP TABLE modified_alternatenames")
 
 
 if __name__ == '__main__':
@@ -136,6 +836,66 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--drop-previous", dest='drop_previous', action='store_true')
-    parser.set_defaults(drop_previous=False)
+    parser.add_argument(
+        "--source", default=GEONAMES_ZIP_URL,
+        help="The URL or path of allCountries.zip or a path to the "
+             "allCountries.txt table it contains. Use - to read the table "
+             "from stdin. "
+             "Interrupted imports resume where they left off when this "
+             "is run again with the same source.")
+    parser.add_argument(
+        "--batch-size", dest='batch_size', type=int, default=BATCH_SIZE,
+        help="The number of lines of the table parsed and inserted at once.")
+    parser.add_argument(
+        "--workers", type=int, default=PARSE_WORKERS,
+        help="The number of processes that parse the table.")
+    parser.add_argument(
+        "--feature-classes", dest='feature_classes', default=None,
+        help="Only import geonames with these comma separated feature "
+             "classes, e.g. A,P, or the given --feature-codes.")
+    parser.add_argument(
+        "--feature-codes", dest='feature_codes', default=None,
+        help="Only import geonames with these comma separated feature "
+             "codes, e.g. ISL,LK, or the given --feature-classes.")
+    parser.add_argument(
+        "--min-population", dest='min_population', type=int, default=None,
+        help="Only import populated places (feature class P) with at least "
+             "this population.")
+    parser.add_argument(
+        "--countries", default=None,
+        help="Only import geonames in these comma separated countries, "
+             "e.g. US,CA.")
+    parser.add_argument(
+        "--add-containment-keys", dest='add_containment_keys',
+        action='store_true',
+        help="Add the containment keys to a previously imported database.")
+    parser.add_argument(
+        "--add-spatial-index", dest='add_spatial_index',
+        action='store_true',
+        help="Add the spatial index to a previously imported database.")
+    parser.add_argument(
+        "--update", nargs='+', default=[], metavar='PATH',
+        help="Apply the modifications-*.txt, deletes-*.txt, "
+             "alternateNamesModifications-*.txt and "
+             "alternateNamesDeletes-*.txt daily update files from "
+             "geonames.org at the given paths to the database.")
+    parser.set_defaults(
+        drop_previous=False, add_containment_keys=False,
+        add_spatial_index=False)
     args = parser.parse_args()
-    import_geonames(args.drop_previous)
+    if args.update:
+        update_geonames(get_database_connection(), args.update)
+    elif args.add_containment_keys or args.add_spatial_index:
+        if args.add_containment_keys:
+            add_containment_keys(get_database_connection())
+        if args.add_spatial_index:
+            add_spatial_index(get_database_connection())
+    else:
+        pruning_rules = {
+            rule: getattr(args, rule) for rule in PRUNING_RULES}
+        for rule in ['feature_classes', 'feature_codes', 'countries']:
+            if pruning_rules[rule] is not None:
+                pruning_rules[rule] = pruning_rules[rule].split(',')
+        import_geonames(
+            args.drop_previous, args.source, args.batch_size, args.workers,
+            pruning_rules)
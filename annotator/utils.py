@@ -69,6 +69,12 @@ def parse_spelled_number(num_str):
         cleaned_tokens.append(t.lower())
     if len(cleaned_tokens) == 0:
         return None
+    if cleaned_tokens[0] in ['a', 'an'] and len(cleaned_tokens) > 1:
+        cleaned_tokens = cleaned_tokens[1:]
+    if cleaned_tokens[0] in ORDERS:
+        # An order without a leading number is one of that order.
+        # Ex: a thousand
+        cleaned_tokens = ['1'] + cleaned_tokens
     totals = [0]
     for t in cleaned_tokens:
         number = parse_number(t)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Compare the AnnoTier range queries with the linear scans they replaced.
+
+Usage: python eval/benchmark_anno_tier.py
+"""
+import sys
+import random
+import timeit
+
+sys.path = ['./'] + sys.path
+
+from annotator.annotator import AnnoDoc, AnnoTier, AnnoSpan
+
+
+def linear_spans_over(tier, start, end):
+    return filter(lambda span: len(set(range(span.start, span.end)).
+                                   intersection(range(start, end))) > 0,
+                  tier.spans)
+
+
+def linear_spans_in(tier, start, end):
+    return filter(lambda span: span.start >= start and span.end <= end,
+                  tier.spans)
+
+
+def make_tier(size):
+    doc = AnnoDoc(u'x' * (size * 6))
+    spans = []
+    for i in range(size):
+        start = i * 6 + random.randint(0, 3)
+        spans.append(AnnoSpan(start, start + random.randint(1, 20), doc,
+                              label=''))
+    return AnnoTier(spans)
+
+
+def benchmark(size, queries=20):
+    tier = make_tier(size)
+    positions = [random.randint(0, size * 6) for i in range(queries)]
+    # Build the index outside of the timed section.
+    tier.spans_over(0, 1)
+    results = []
+    for name, old, new in [
+            ('spans_over', linear_spans_over, tier.spans_over),
+            ('spans_in', linear_spans_in, tier.spans_in)]:
+        old_time = timeit.timeit(
+            lambda: [old(tier, p, p + 30) for p in positions], number=1)
+        new_time = timeit.timeit(
+            lambda: [new(p, p + 30) for p in positions], number=1)
+        results.append((name, old_time / queries, new_time / queries))
+    return results
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    print "%8s %12s %14s %14s %10s" % (
+        'spans', 'query', 'linear (ms)', 'indexed (ms)', 'speedup')
+    for size in [1000, 10000, 100000]:
+        for name, old_time, new_time in benchmark(size):
+            print "%8d %12s %14.3f %14.3f %9.0fx" % (
+                size, name, old_time * 1000, new_time * 1000,
+                old_time / new_time)
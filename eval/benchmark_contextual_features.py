@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Compare the vectorized contextual geoname features with the per-pair
+computation they replaced on documents with many candidate geonames.
+
+Usage: python eval/benchmark_contextual_features.py
+"""
+import sys
+import random
+import time
+
+sys.path = ['./'] + sys.path
+
+from geopy.distance import great_circle
+from annotator.geoname_annotator import (
+    GeonameCandidate, GeonameFeatureMatrix, location_contains,
+    set_contextual_features)
+from annotator.geoname_store import GeonameRecord
+from annotator.geo_utils import feature_level, admin_path
+
+FEATURE_CODES = ['PCLI', 'ADM1', 'ADM2', 'ADM3', 'PPL', 'PPLA', 'PPLC', 'LK']
+CONTEXTUAL_FEATURES = [
+    'close_locations',
+    'very_close_locations',
+    'containing_locations',
+    'max_containment_level']
+
+
+def make_feature_matrix(size):
+    candidates = []
+    for idx in range(size):
+        record = GeonameRecord(
+            unicode(idx), u'name', u'name',
+            random.uniform(20, 60), random.uniform(-130, -70),
+            u'P', random.choice(FEATURE_CODES),
+            random.choice([u'US', u'CA', u'MX']), u'',
+            random.choice([u'', u'01', u'02', u'03']),
+            random.choice([u'', u'001', u'002']), u'', u'', 1000, 0, u'', 5,
+            None)
+        candidates.append(GeonameCandidate(record._replace(
+            feature_level=feature_level(record.feature_code),
+            admin_path=admin_path(record))))
+    feature_matrix = GeonameFeatureMatrix(candidates)
+    # Each geoname is mentioned near up to 10 high confidence geonames, as
+    # in the ring buffer used by add_contextual_features.
+    for mention_indices in feature_matrix.nearby_mentions:
+        mention_indices.update(random.sample(range(size), 10))
+    return feature_matrix
+
+
+def reference_contextual_features(feature_matrix):
+    """The per pair computation used prior to vectorization"""
+    geonames = feature_matrix.geonames
+    values = []
+    for idx, geoname in enumerate(geonames):
+        close_locations = 0
+        very_close_locations = 0
+        containing_locations = 0
+        max_containment_level = 0
+        for mention_idx in feature_matrix.nearby_mentions[idx]:
+            recently_mentioned_geoname = geonames[mention_idx]
+            if recently_mentioned_geoname == geoname:
+                continue
+            containment_level = max(
+                location_contains(geoname, recently_mentioned_geoname),
+                location_contains(recently_mentioned_geoname, geoname))
+            if containment_level > 0:
+                containing_locations += 1
+            if containment_level > max_containment_level:
+                max_containment_level = containment_level
+            distance = great_circle(
+                recently_mentioned_geoname.lat_long, geoname.lat_long
+            ).kilometers
+            if distance < 400:
+                close_locations += 1
+            if distance < 100:
+                very_close_locations += 1
+        values.append([
+            close_locations, very_close_locations,
+            containing_locations, max_containment_level])
+    return values
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    print "%10s %15s %16s" % ('candidates', 'per pair (ms)', 'vectorized (ms)')
+    for size in [10, 100, 500, 1000, 5000]:
+        feature_matrix = make_feature_matrix(size)
+        start = time.time()
+        expected_values = reference_contextual_features(feature_matrix)
+        reference_time = time.time() - start
+        start = time.time()
+        set_contextual_features(feature_matrix)
+        vectorized_time = time.time() - start
+        assert expected_values == [
+            [feature_matrix.to_dict(idx)[name] for name in CONTEXTUAL_FEATURES]
+            for idx in range(size)]
+        print "%10d %15.1f %16.1f" % (
+            size, reference_time * 1000, vectorized_time * 1000)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Time the import of a synthetic geonames.org allCountries table into a
+temporary database.
+
+The CPU time of the main process, which writes the parsed table to the
+database, is reported separately from the CPU time of the parse workers.
+On a host with a core per worker the import takes roughly the longer of
+the two.
+
+Usage: python eval/benchmark_geonames_import.py [--rows 1000000] [--zip]
+    [--workers 3] [--batch-size 50000]
+"""
+import os
+import sys
+import random
+import resource
+import shutil
+import tempfile
+import time
+from zipfile import ZipFile, ZIP_DEFLATED
+
+sys.path = ['./'] + sys.path
+
+FEATURE_CODES = [
+    ('P', 'PPL'), ('P', 'PPLA'), ('A', 'ADM1'), ('A', 'ADM2'), ('H', 'STM'),
+    ('T', 'MT'), ('S', 'SCH'), ('L', 'PRK')]
+SYLLABLES = [
+    'ba', 'ri', 'ko', 'sen', 'ta', 'mar', 'lo', 'vi', 'ng', 'sk', 'ville',
+    'burg', u'\xe9', u'\u0441\u0442', u'\u6771']
+
+
+def random_name():
+    return u''.join(
+        random.choice(SYLLABLES)
+        for _ in range(random.randint(2, 5))).capitalize()
+
+
+def write_synthetic_geonames(path, rows):
+    """
+    Write a table with the columns of allCountries.txt. Like the real table,
+    most geonames have few alternatenames and some have many.
+    """
+    random.seed(0)
+    with open(path, 'wb') as f:
+        for geonameid in range(1, rows + 1):
+            name = random_name()
+            alternatenames = [
+                random_name()
+                for _ in range(int(random.paretovariate(1.2)) - 1)][:200]
+            feature_class, feature_code = random.choice(FEATURE_CODES)
+            f.write(u'\t'.join([
+                unicode(geonameid), name, name, u','.join(alternatenames),
+                u'%.5f' % random.uniform(-90, 90),
+                u'%.5f' % random.uniform(-180, 180),
+                feature_class, feature_code, random.choice([u'US', u'FR']),
+                u'', u'%02d' % random.randint(1, 50),
+                u'%03d' % random.randint(1, 200), u'', u'',
+                unicode(random.choice([0, 0, 0, random.randint(1, 10 ** 6)])),
+                u'', u'100', u'America/New_York', u'2017-01-01'
+            ]).encode('utf8') + b'\n')
+
+
+def cpu_times():
+    """Return the CPU times of this process and its finished children"""
+    return [
+        usage.ru_utime + usage.ru_stime
+        for usage in [resource.getrusage(resource.RUSAGE_SELF),
+                      resource.getrusage(resource.RUSAGE_CHILDREN)]]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument(
+        "--zip", action='store_true',
+        help="Import the table from a zip file like the one geonames.org "
+             "distributes.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", dest='batch_size', type=int,
+                        default=None)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        # The database path is read when the importer is imported.
+        os.environ['ANNOTATOR_DB_PATH'] = os.path.join(directory, 'annie.db')
+        from annotator.sqlite_import_geonames import (
+            import_geonames, BATCH_SIZE, PARSE_WORKERS)
+        source = os.path.join(directory, 'allCountries.txt')
+        write_synthetic_geonames(source, args.rows)
+        if args.zip:
+            with ZipFile(source + '.zip', 'w', ZIP_DEFLATED) as zip_file:
+                zip_file.write(source, 'allCountries.txt')
+            os.remove(source)
+            source += '.zip'
+        workers = args.workers or PARSE_WORKERS
+        start_usage = cpu_times()
+        start = time.time()
+        import_geonames(
+            source=source, batch_size=args.batch_size or BATCH_SIZE,
+            workers=workers)
+        import_time = time.time() - start
+        print "%d geonames imported in %.1f s (%.0f rows/second)" % (
+            args.rows, import_time, args.rows / import_time)
+        main_time, workers_time = [
+            after - before for after, before in zip(cpu_times(), start_usage)]
+        print "main process CPU time: %.1f s" % main_time
+        if workers > 1:
+            print "%d parse workers' CPU time: %.1f s" % (
+                workers, workers_time)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Compare the throughput of annotating documents one request after another
+with the jvm-nlp service to annotating them with concurrent requests using
+JVMNLPAnnotator.annotate_many.
+
+The documents are annotated by the stand-in server used by the tests, which
+takes --delay seconds to annotate each document, unless the --base-url of a
+jvm-nlp server is given.
+
+Usage: python eval/benchmark_jvm_nlp_annotator.py [--docs 200] [--delay 0.02]
+    [--base-url http://localhost:8080]
+"""
+import sys
+import time
+
+sys.path = ['./', './tests/annotator'] + sys.path
+
+from annotator.annotator import AnnoDoc
+from annotator.jvm_nlp_annotator import JVMNLPAnnotator
+from jvm_nlp_server import JVMNLPServer
+
+TIERS = ['times', 'nes', 'sentences', 'tokens']
+CONCURRENCY_LEVELS = [2, 4, 8]
+
+
+def make_docs(count):
+    return [
+        AnnoDoc(u"On March %d there were %d new cases of cholera in the "
+                u"district, bringing the total to %d." % (
+                    idx % 28 + 1, idx, idx * 10))
+        for idx in range(count)]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument(
+        "--delay", type=float, default=0.02,
+        help="The time the stand-in server takes to annotate a document.")
+    parser.add_argument("--base-url", dest='base_url', default=None)
+    args = parser.parse_args()
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = JVMNLPServer(delay=args.delay).start()
+        base_url = server.base_url
+    try:
+        annotator = JVMNLPAnnotator(TIERS, base_url=base_url)
+        # The first request opens a connection.
+        annotator.annotate(AnnoDoc(u"Hi Joe."))
+        print "%25s %10s %10s" % ('', 'docs/s', 'speedup')
+        docs = make_docs(args.docs)
+        start = time.time()
+        for doc in docs:
+            annotator.annotate(doc)
+        sequential_time = time.time() - start
+        print "%25s %10.1f %10s" % (
+            'annotate', args.docs / sequential_time, '')
+        for level in CONCURRENCY_LEVELS:
+            docs = make_docs(args.docs)
+            start = time.time()
+            annotator.annotate_many(docs, max_concurrent_requests=level)
+            concurrent_time = time.time() - start
+            print "%25s %10.1f %9.1fx" % (
+                'annotate_many (%d at once)' % level,
+                args.docs / concurrent_time,
+                sequential_time / concurrent_time)
+    finally:
+        if server:
+            server.stop()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Compare the array based maximum weight interval set solver with the endpoint
+sweep it replaced.
+
+Usage: python eval/benchmark_mwis.py [--max-reference-size N]
+"""
+import sys
+import random
+import time
+import argparse
+
+sys.path = ['./', './tests/annotator'] + sys.path
+
+from annotator import maximum_weight_interval_set as mwis
+from test_maximum_weight_interval_set import reference_maximum_weight_interval_set
+
+
+def make_intervals(size):
+    intervals = []
+    for idx in range(size):
+        start = random.randint(0, size * 4)
+        end = start + random.randint(1, 40)
+        intervals.append(mwis.Interval(start, end, end - start, idx))
+    return intervals
+
+
+def time_call(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-reference-size", type=int, default=100000)
+    args = parser.parse_args()
+    random.seed(0)
+    print "%9s %15s %15s %15s" % (
+        'intervals', 'reference (s)', 'intervals (s)', 'arrays (s)')
+    for size in [1000, 10000, 100000, 1000000]:
+        intervals = make_intervals(size)
+        starts = [interval.start for interval in intervals]
+        ends = [interval.end for interval in intervals]
+        weights = [interval.weight for interval in intervals]
+        if size <= args.max_reference_size:
+            reference_time = "%15.3f" % time_call(
+                reference_maximum_weight_interval_set, intervals)
+        else:
+            reference_time = "%15s" % '-'
+        print "%9d %s %15.3f %15.3f" % (
+            size,
+            reference_time,
+            time_call(mwis.find_maximum_weight_interval_set, intervals),
+            time_call(mwis.find_maximum_weight_interval_set_indices,
+                      starts, ends, weights))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Measure the per-document latency of the ResolvedKeywordAnnotator and compare
+it with the full synonyms table scan it replaced.
+This requires a database with the disease ontology imported by
+`python -m annotator.sqlite_import_disease_ontology`.
+
+Usage: python eval/benchmark_resolved_keyword_annotator.py
+"""
+import os
+import sys
+import time
+
+sys.path = ['./'] + sys.path
+
+from annotator.annotator import AnnoDoc
+from annotator.ngram_annotator import NgramAnnotator
+from annotator.resolved_keyword_annotator import ResolvedKeywordAnnotator
+
+RESOURCE_DIR = os.path.join('tests', 'annotator', 'resources')
+
+
+def full_table_scan(connection, doc):
+    """The synonym merge join used prior to preloading the synonyms"""
+    span_text_to_offsets = {}
+    for start, end, text in doc.tiers['ngrams'].iter_ngrams():
+        span_text_to_offsets.setdefault(text, []).append((start, end))
+        span_text_to_offsets.setdefault(text.lower(), []).append((start, end))
+    matches = 0
+    ordered_ngram_iter = iter(sorted(span_text_to_offsets))
+    try:
+        ngram = next(ordered_ngram_iter)
+        for result in connection.execute(
+                'SELECT * FROM synonyms ORDER BY synonym'):
+            while ngram < result['synonym']:
+                ngram = next(ordered_ngram_iter)
+            if ngram == result['synonym']:
+                matches += 1
+    except StopIteration:
+        pass
+    return matches
+
+
+if __name__ == '__main__':
+    start = time.time()
+    annotator = ResolvedKeywordAnnotator()
+    print "Synonyms loaded in %.3fs" % (time.time() - start)
+    print "%24s %8s %16s %16s" % (
+        'document', 'chars', 'table scan (ms)', 'preloaded (ms)')
+    for filename in sorted(os.listdir(RESOURCE_DIR)):
+        if not filename.endswith('.txt'):
+            continue
+        with open(os.path.join(RESOURCE_DIR, filename)) as f:
+            doc = AnnoDoc(f.read())
+        doc.add_tier(NgramAnnotator())
+        start = time.time()
+        full_table_scan(annotator.connection, doc)
+        scan_time = time.time() - start
+        start = time.time()
+        doc.add_tier(annotator)
+        preloaded_time = time.time() - start
+        print "%24s %8d %16.1f %16.1f" % (
+            filename, len(doc.text), scan_time * 1000, preloaded_time * 1000)
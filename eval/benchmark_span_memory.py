@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Compare the memory used by slotted, offsets-only AnnoSpans with the
+previous layout, which stored attributes in a __dict__ and cached a copy of
+the span's text that was also used as its label.
+
+Usage: python eval/benchmark_span_memory.py
+"""
+import sys
+import random
+
+sys.path = ['./'] + sys.path
+
+from annotator.annotator import AnnoDoc, AnnoSpan
+
+WORDS = ['outbreak', 'of', 'cholera', 'in', 'the', 'province', 'cases',
+         'were', 'reported', 'by', 'ministry', 'health', '12', ',', '.']
+
+
+class DictSpan(object):
+    """The AnnoSpan layout prior to the use of __slots__"""
+
+    def __init__(self, start, end, doc, label=None):
+        self.start = start
+        self.end = end
+        self.doc = doc
+        # The text was a lazy attribute, which was cached in the __dict__
+        # when it was first used as the label.
+        self.text = doc.text[start:end]
+        if label is None:
+            self.label = self.text
+        else:
+            self.label = label
+
+
+def deep_size(spans):
+    """
+    Sum the sizes of the spans, their attribute dicts and attribute values
+    excluding the shared document.
+    """
+    seen = set()
+    total = 0
+    for span in spans:
+        objects = [span]
+        if hasattr(span, '__dict__'):
+            objects.append(span.__dict__)
+            objects.extend(
+                value for key, value in span.__dict__.items() if key != 'doc')
+        else:
+            objects.extend([span.start, span.end, span._label])
+        for obj in objects:
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += sys.getsizeof(obj)
+    return total
+
+
+def make_doc(num_tokens):
+    words = [random.choice(WORDS) for i in range(num_tokens)]
+    text = u' '.join(words)
+    offsets = []
+    offset = 0
+    for word in words:
+        offsets.append((offset, offset + len(word)))
+        offset += len(word) + 1
+    return AnnoDoc(text), offsets
+
+
+def make_spans(span_class, doc, token_offsets, n_max=7):
+    spans = []
+    for n in range(1, n_max + 1):
+        for i in range(len(token_offsets) - n + 1):
+            spans.append(span_class(
+                token_offsets[i][0], token_offsets[i + n - 1][1], doc))
+    return spans
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    doc, token_offsets = make_doc(50000)
+    for name, n_max in [('tokens', 1), ('tokens + 1-7 grams', 7)]:
+        old_spans = make_spans(DictSpan, doc, token_offsets, n_max)
+        old_size = deep_size(old_spans)
+        new_spans = make_spans(AnnoSpan, doc, token_offsets, n_max)
+        new_size = deep_size(new_spans)
+        print "%s (%d spans)" % (name, len(new_spans))
+        print "  dict spans:    %6.1f MB, %4d bytes/span" % (
+            old_size / 1e6, old_size / len(old_spans))
+        print "  slotted spans: %6.1f MB, %4d bytes/span" % (
+            new_size / 1e6, new_size / len(new_spans))
+        print "  savings:       %6.1f MB, %4d bytes/span" % (
+            (old_size - new_size) / 1e6,
+            (old_size - new_size) / len(new_spans))
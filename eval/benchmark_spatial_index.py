@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Time radius and nearest neighbor queries on the spatial index of the
+memory-mapped geoname store and compare their results with a scan of all
+the geonames.
+
+The queries are run on the store at MMAP_GEONAME_STORE_PATH, or on a store
+of synthetic geonames clustered like populated places when --synthetic
+is given.
+
+Usage: python eval/benchmark_spatial_index.py [--synthetic 1000000]
+"""
+import sys
+import shutil
+import sqlite3
+import tempfile
+import time
+import numpy as np
+
+sys.path = ['./'] + sys.path
+
+from annotator.geoname_store import MMapGeonameStore, MMAP_GEONAME_STORE_PATH
+from annotator.mmap_import_geonames import build_mmap_geoname_store
+from annotator.sqlite_import_geonames import geonames_field_mappings
+from annotator.geo_utils import great_circle_distances
+
+RADII_KM = [10, 50, 100, 500]
+NEAREST_COUNTS = [1, 10, 100]
+NUM_QUERIES = 200
+
+
+def build_synthetic_store(size, path):
+    random_state = np.random.RandomState(0)
+    # Points are scattered around cluster centers with a few dense ones.
+    num_clusters = 2000
+    cluster_lats = random_state.uniform(-60, 70, num_clusters)
+    cluster_longs = random_state.uniform(-180, 180, num_clusters)
+    cluster_sizes = random_state.pareto(1.5, num_clusters) + 1
+    clusters = random_state.choice(
+        num_clusters, size, p=cluster_sizes / cluster_sizes.sum())
+    lats = np.clip(
+        cluster_lats[clusters] + random_state.normal(0, 1, size), -90, 90)
+    longs = (cluster_longs[clusters] + random_state.normal(0, 1.5, size) +
+             180) % 360 - 180
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE geonames (" + ",".join([
+        '"' + k + '" ' + sqltype
+        for k, sqltype in geonames_field_mappings if sqltype]) + ")")
+    connection.execute('''CREATE TABLE alternatenames
+        (geonameid text, alternatename text, alternatename_lemmatized text)''')
+    connection.executemany(
+        "INSERT INTO geonames VALUES (?, ?, ?, ?, ?, 'P', 'PPL', 'US', '', "
+        "'', '', '', '', 0)", ((
+            unicode(idx), u'place', u'place', lat, lon)
+            for idx, lat, lon in zip(
+                range(size), lats.tolist(), longs.tolist())))
+    connection.executemany(
+        "INSERT INTO alternatenames VALUES (?, 'place', 'place')",
+        ((unicode(idx),) for idx in range(size)))
+    connection.execute('''CREATE TABLE alternatename_counts
+        (geonameid text primary key, count integer)''')
+    connection.execute('''INSERT INTO alternatename_counts
+        SELECT geonameid, 1 FROM geonames''')
+    build_mmap_geoname_store(connection, path)
+    return lats, longs
+
+
+def time_queries(query, points):
+    start = time.time()
+    results = [query(lat, lon) for lat, lon in points]
+    return results, (time.time() - start) * 1000 / len(points)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="The number of synthetic geonames to query.")
+    args = parser.parse_args()
+    store_path = MMAP_GEONAME_STORE_PATH
+    if args.synthetic:
+        store_path = tempfile.mkdtemp()
+        build_synthetic_store(args.synthetic, store_path)
+    try:
+        store = MMapGeonameStore(store_path)
+        lats = store.columns['latitude']
+        longs = store.columns['longitude']
+        random_state = np.random.RandomState(1)
+        # Queries are made near geonames, where the index is most dense.
+        points = [
+            (lats[idx] + random_state.normal(0, 0.1),
+             longs[idx] + random_state.normal(0, 0.1))
+            for idx in random_state.choice(len(store), NUM_QUERIES).tolist()]
+        print len(store), "geonames"
+        # The index search time excludes the creation of the records.
+        print "%25s %10s %18s %12s" % (
+            'query', 'ms/query', 'index ms/query', 'results')
+        for radius in RADII_KM:
+            results, query_time = time_queries(
+                lambda lat, lon: store.geonames_within(lat, lon, radius),
+                points)
+            index_results, index_time = time_queries(
+                lambda lat, lon: store._nearby_geonames(lat, lon, radius),
+                points)
+            for (lat, lon), result in zip(points[:10], results):
+                distances = great_circle_distances(lat, lon, lats, longs)
+                assert len(result) == (distances <= radius).sum()
+            print "%25s %10.3f %18.3f %12.1f" % (
+                'within %d km' % radius, query_time, index_time,
+                np.mean([len(result) for result in results]))
+        for count in NEAREST_COUNTS:
+            results, query_time = time_queries(
+                lambda lat, lon: store.nearest_geonames(lat, lon, count),
+                points)
+            for (lat, lon), result in zip(points[:10], results):
+                distances = great_circle_distances(lat, lon, lats, longs)
+                assert np.allclose(
+                    [distance for record, distance in result],
+                    np.sort(distances)[:count])
+            print "%25s %10.3f %18s %12.1f" % (
+                'nearest %d' % count, query_time, '',
+                np.mean([len(result) for result in results]))
+    finally:
+        if args.synthetic:
+            shutil.rmtree(store_path)
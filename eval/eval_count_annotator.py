@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Compare the counts the CountAnnotator finds with numbers from the jvm-nlp
+service to the counts it finds with the NumberAnnotator's spaCy numbers.
+
+The counts found with the jvm-nlp service are the reference. The precision
+and recall of the spaCy counts, the counts that only one of them finds and
+the time each takes to annotate are reported.
+
+Usage: python eval/eval_count_annotator.py [--texts a.txt b.txt]
+    [--base-url http://localhost:8080]
+"""
+import sys
+import time
+
+sys.path = ['./', './eval'] + sys.path
+
+from annotator.annotator import AnnoDoc
+from annotator.count_annotator import CountAnnotator
+from annotator.jvm_nlp_annotator import JVMNLPAnnotator
+from annotator.spacy_annotator import SpacyAnnotator
+from eval_utils import DEFAULT_TEXT_PATHS, load_texts
+
+
+def annotate_counts(annotator, texts, base_url=None):
+    """
+    Return the set of (document index, start, end, count, attributes)
+    tuples for the counts found in the texts and the time spent annotating
+    numbers and counts in seconds. The spaCy tiers are created beforehand
+    so their time is not included.
+    """
+    counts = set()
+    total_time = 0
+    for idx, text in enumerate(texts):
+        doc = AnnoDoc(text)
+        doc.add_tier(SpacyAnnotator())
+        start = time.time()
+        if annotator.number_source == 'stanford':
+            doc.add_tier(JVMNLPAnnotator(
+                ['times', 'nes', 'sentences', 'tokens'], base_url=base_url))
+        doc.add_tier(annotator)
+        total_time += time.time() - start
+        for span in doc.tiers['counts'].spans:
+            counts.add((
+                idx, span.start, span.end, span.metadata['count'],
+                tuple(span.metadata['attributes'])))
+    return counts, total_time
+
+
+def print_counts(title, counts, texts):
+    print title
+    for idx, start, end, count, attributes in sorted(counts):
+        print "  %d: %s (%s %s)" % (
+            idx, texts[idx][start:end].replace('\n', ' '), count,
+            ', '.join(attributes))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--texts", nargs='+', default=DEFAULT_TEXT_PATHS,
+        help="The text files to annotate.")
+    parser.add_argument("--base-url", dest='base_url', default=None)
+    args = parser.parse_args()
+    texts = load_texts(args.texts)
+    stanford_counts, stanford_time = annotate_counts(
+        CountAnnotator(number_source='stanford'), texts, args.base_url)
+    spacy_counts, spacy_time = annotate_counts(
+        CountAnnotator(number_source='spacy'), texts)
+    matches = len(stanford_counts & spacy_counts)
+    print "%d documents" % len(texts)
+    print "%-10s %8s %8s %10s %7s" % (
+        'numbers', 'counts', 'ms/doc', 'precision', 'recall')
+    print "%-10s %8d %8.1f" % (
+        'stanford', len(stanford_counts),
+        stanford_time * 1000 / len(texts))
+    print "%-10s %8d %8.1f %10.3f %7.3f" % (
+        'spacy', len(spacy_counts), spacy_time * 1000 / len(texts),
+        float(matches) / max(len(spacy_counts), 1),
+        float(matches) / max(len(stanford_counts), 1))
+    print_counts("Only found with stanford numbers:",
+                 stanford_counts - spacy_counts, texts)
+    print_counts("Only found with spacy numbers:",
+                 spacy_counts - stanford_counts, texts)
@@ -1,20 +1,38 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """Tests for the GeonameAnnotator that annotates a sentence with locations from
-the Geonames dataset."""
+the Geonames dataset.
+
+When it is given --databases, the geonames found using each database are
+compared with the ones found using the first database, which should be a full
+import, and the size of each database and the time it takes to annotate
+with it are reported. The times do not include the tokenization and named
+entity tagging the annotator depends on. This is used to evaluate pruned
+imports, e.g.
+
+python eval/eval_geoname_annotator.py --databases ~/.annie.sqlitedb pruned.sqlitedb
+"""
 
 import sys
 import os
+import json
+import sqlite3
+import time
 import unittest
 
-sys.path = ['./'] + sys.path
+sys.path = ['./', './eval'] + sys.path
 
 from annotator.annotator import AnnoDoc
 from annotator.geoname_annotator import GeonameAnnotator
-from annotator.loader import HealthMapFileLoader
+from annotator.ngram_annotator import NgramAnnotator
+from annotator.ne_annotator import NEAnnotator
+from annotator.geoname_store import SQLiteGeonameStore
+from annotator.sqlite_import_geonames import get_import_metadata
+from eval_utils import DEFAULT_TEXT_PATHS, load_texts
 import logging
 logging.getLogger('annotator.geoname_annotator').setLevel(logging.ERROR)
 
+
 class GeonameAnnotatorTest(unittest.TestCase):
 
     def test_mulipart_names2(self):
@@ -47,5 +65,83 @@ class GeonameAnnotatorTest(unittest.TestCase):
             "The article took too long to process."
         )
 
+
+def create_docs(texts):
+    """
+    Create documents with the ngram and named entity tiers the
+    GeonameAnnotator uses, so the time spent tokenizing and tagging them is
+    not included in its annotation time.
+    """
+    docs = []
+    for text in texts:
+        doc = AnnoDoc(text)
+        doc.add_tier(NgramAnnotator())
+        doc.add_tier(NEAnnotator())
+        docs.append(doc)
+    return docs
+
+
+def annotate_docs(annotator, docs):
+    """
+    Return the set of (document index, start, end, geonameid) tuples for the
+    geonames found in the documents and the time the annotator took in
+    seconds.
+    """
+    geonames = set()
+    total_time = 0
+    for idx, doc in enumerate(docs):
+        start = time.time()
+        doc.add_tier(annotator)
+        total_time += time.time() - start
+        for span in doc.tiers['geonames'].spans:
+            geonames.add(
+                (idx, span.start, span.end, span.geoname['geonameid']))
+    return geonames, total_time
+
+
+def compare_databases(paths, texts):
+    docs = create_docs(texts)
+    print "%d documents" % len(texts)
+    print "%-30s %9s %10s %12s %12s %10s %7s" % (
+        'database', 'size (MB)', 'geonames', 'first ms/doc', 'cached ms/doc',
+        'precision', 'recall')
+    reference_geonames = None
+    for path in paths:
+        connection = sqlite3.connect(path)
+        geoname_count = list(
+            connection.execute("SELECT count(*) FROM geonames"))[0][0]
+        pruning_rules = get_import_metadata(connection).get('pruning_rules')
+        annotator = GeonameAnnotator(
+            geoname_store=SQLiteGeonameStore(connection))
+        # The first pass looks geonames up in the database and the second
+        # finds them in the annotator's candidate cache.
+        geonames, first_time = annotate_docs(annotator, docs)
+        _, cached_time = annotate_docs(annotator, docs)
+        if reference_geonames is None:
+            reference_geonames = geonames
+        matches = len(geonames & reference_geonames)
+        print "%-30s %9.1f %10d %12.1f %12.1f %10.3f %7.3f" % (
+            os.path.basename(path), os.path.getsize(path) / 1e6, geoname_count,
+            first_time * 1000 / len(texts), cached_time * 1000 / len(texts),
+            float(matches) / max(len(geonames), 1),
+            float(matches) / max(len(reference_geonames), 1))
+        if pruning_rules:
+            print "    pruning rules:", json.dumps(pruning_rules, sort_keys=True)
+        connection.close()
+
+
 if __name__ == '__main__':
-    unittest.main()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--databases", nargs='+', default=None,
+        help="Compare the geonames found using these databases with the "
+             "ones found using the first one instead of running the tests.")
+    parser.add_argument(
+        "--texts", nargs='+', default=DEFAULT_TEXT_PATHS,
+        help="The text files to annotate when comparing databases.")
+    args, unittest_args = parser.parse_known_args()
+    if args.databases:
+        compare_databases(args.databases, load_texts(args.texts))
+    else:
+        unittest.main(argv=sys.argv[:1] + unittest_args)
@@ -0,0 +1,23 @@
+"""Helpers shared by the eval scripts"""
+import os
+import glob
+
+# The articles in the test resources are annotated by default.
+DEFAULT_TEXT_PATHS = glob.glob(os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'annotator', 'resources',
+    '*.txt'))
+
+
+def load_texts(paths):
+    """
+    Split the given text files into paragraphs, which are annotated as
+    separate documents.
+    """
+    texts = []
+    for path in paths:
+        with open(path) as f:
+            texts += [
+                paragraph.decode('utf-8')
+                for paragraph in f.read().split('\n\n')
+                if paragraph.strip()]
+    return texts
@@ -11,6 +11,6 @@ setup(
     name='annie',
     version=__version__,
     packages=['annotator', ],
-    install_requires=['lazy', 'geopy', 'unicodecsv', 'spacy', 'numpy',
-        'rdflib', 'python-dateutil', 'requests'],
+    install_requires=['geopy', 'spacy', 'numpy',
+        'python-dateutil', 'requests'],
 )
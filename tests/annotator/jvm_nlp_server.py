@@ -0,0 +1,107 @@
+"""
+A stand-in for the jvm-nlp service that the JVMNLPAnnotator is tested with
+when the service is not running. Tokens are split on word boundaries, each
+text is one sentence and numbers are NUMBER named entities.
+"""
+import json
+import re
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+
+def annotate_text(text):
+    tokens = [{
+        'start': match.start(),
+        'stop': match.end(),
+        'label': match.group()
+    } for match in re.finditer(r'\w+|[^\w\s]', text, re.UNICODE)]
+    return {
+        'tokens': {'spans': tokens},
+        'sentences': {'spans': [{
+            'start': 0, 'stop': len(text), 'label': text}] if text else []},
+        'nes': {'spans': [
+            dict(token, type='NUMBER') for token in tokens
+            if token['label'].isdigit()]},
+        'times': {'spans': []},
+    }
+
+
+class JVMNLPRequestHandler(BaseHTTPRequestHandler):
+    # Connections are kept alive between requests.
+    protocol_version = 'HTTP/1.1'
+    # Responses are buffered and sent at once so small writes are not
+    # delayed on kept-alive connections.
+    wbufsize = -1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with self.server.lock:
+            self.server.request_count += 1
+            fail = self.server.failures > 0
+            if fail:
+                self.server.failures -= 1
+        if fail:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with self.server.lock:
+            self.server.active_requests += 1
+            self.server.max_active_requests = max(
+                self.server.max_active_requests, self.server.active_requests)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.active_requests -= 1
+        doc = json.loads(body)
+        result = {'text': doc['text'], 'tiers': annotate_text(doc['text'])}
+        if 'date' in doc:
+            result['date'] = doc['date']
+        response = json.dumps(result)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class JVMNLPServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves annotations on a free local port in a background thread.
+    Each request takes at least delay seconds and the first failures
+    requests fail with 503 responses.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0, failures=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), JVMNLPRequestHandler)
+        self.delay = delay
+        self.failures = failures
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.connection_count = 0
+        self.active_requests = 0
+        self.max_active_requests = 0
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connection_count += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
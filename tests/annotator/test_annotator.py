@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""Tests for AnnoTier and ColumnarAnnoTier"""
+import json
+import random
+import unittest
+from annotator.annotator import AnnoDoc, AnnoTier, AnnoSpan, ColumnarAnnoTier
+
+
+class AnnoTierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = AnnoDoc("The quick brown fox jumps over the lazy dog.")
+        random.seed(1)
+        self.spans = []
+        for i in range(300):
+            start = random.randint(0, len(self.doc.text))
+            end = min(start + random.randint(0, 12), len(self.doc.text))
+            self.spans.append(AnnoSpan(start, end, self.doc, label=str(i)))
+        self.tier = AnnoTier(self.spans)
+
+    def test_spans_over(self):
+        for start in range(-2, len(self.doc.text) + 2):
+            for end in [None, start, start + 1, start + 5]:
+                expected_end = end or start + 1
+                expected = [
+                    span for span in self.tier.spans
+                    if len(set(range(span.start, span.end)).intersection(
+                        range(start, expected_end))) > 0]
+                self.assertEqual(self.tier.spans_over(start, end), expected)
+
+    def test_spans_in(self):
+        for start in range(0, len(self.doc.text), 3):
+            for end in [start, start + 4, start + 10]:
+                expected = [
+                    span for span in self.tier.spans
+                    if span.start >= start and span.end <= end]
+                self.assertEqual(self.tier.spans_in(start, end), expected)
+
+    def test_spans_at(self):
+        for span in self.spans:
+            expected = [
+                other for other in self.tier.spans
+                if other.start == span.start and other.end == span.end]
+            self.assertEqual(self.tier.spans_at_span(span), expected)
+
+    def test_index_invalidation(self):
+        tier = AnnoTier([AnnoSpan(0, 3, self.doc)])
+        self.assertEqual(len(tier.spans_over(4, 9)), 0)
+        tier.spans = [AnnoSpan(4, 9, self.doc)]
+        self.assertEqual(tier.spans_over(4, 9)[0].text, "quick")
+        tier.spans.append(AnnoSpan(10, 15, self.doc))
+        self.assertEqual(tier.spans_in(4, 15)[1].text, "brown")
+        tier.spans[1] = AnnoSpan(16, 19, self.doc)
+        tier.invalidate_index()
+        self.assertEqual(tier.spans_at(16, 19)[0].text, "fox")
+        tier._spans = [AnnoSpan(20, 25, self.doc), AnnoSpan(26, 30, self.doc)]
+        self.assertEqual(tier.spans_over(21)[0].text, "jumps")
+
+    def test_spans_over_long_span(self):
+        tier = AnnoTier(self.spans + [
+            AnnoSpan(0, len(self.doc.text), self.doc, label='all')])
+        for start in range(0, len(self.doc.text), 4):
+            expected = [
+                span for span in tier.spans
+                if span.start < start + 2 and span.end > start and
+                span.end > span.start]
+            self.assertEqual(tier.spans_over(start, start + 2), expected)
+
+    def test_to_json(self):
+        tier = AnnoTier([AnnoSpan(4, 9, self.doc),
+                         AnnoSpan(10, 15, self.doc, label='color')])
+        self.assertEqual(json.loads(tier.to_json()), [
+            dict(start=4, end=9, label='quick'),
+            dict(start=10, end=15, label='color')])
+
+    def test_spans_are_offsets_only(self):
+        span = AnnoSpan(4, 9, self.doc)
+        self.assertFalse(hasattr(span, '__dict__'))
+        self.assertEqual(span.label, 'quick')
+        self.assertEqual(len(span), 5)
+        self.assertEqual(span.to_dict(), dict(
+            label='quick', textOffsets=[[4, 9]]))
+
+    def test_doc_filter_overlapping_spans(self):
+        tier_a = AnnoTier([AnnoSpan(0, 9, self.doc), AnnoSpan(20, 25, self.doc)])
+        tier_b = AnnoTier([AnnoSpan(4, 15, self.doc)])
+        self.doc.tiers = {'a': tier_a, 'b': tier_b}
+        self.doc.filter_overlapping_spans()
+        self.assertEqual(tier_a.labels(), ['jumps'])
+        self.assertEqual(tier_b.labels(), ['quick brown'])
+        self.assertEqual(tier_a.spans_over(22)[0].text, 'jumps')
+
+
+class ColumnarAnnoTierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = AnnoDoc("The quick brown fox jumps over the lazy dog.")
+        random.seed(2)
+        spans = []
+        for i in range(200):
+            start = random.randint(0, len(self.doc.text))
+            end = min(start + random.randint(0, 12), len(self.doc.text))
+            spans.append(AnnoSpan(start, end, self.doc,
+                                  label=random.choice(['a', 'b', None])))
+        self.tier = AnnoTier(spans)
+        self.columnar_tier = ColumnarAnnoTier(
+            self.doc,
+            [span.start for span in spans],
+            [span.end for span in spans],
+            [span.label for span in spans])
+
+    def assertSpansEqual(self, spans_a, spans_b):
+        self.assertEqual(
+            [(span.start, span.end, span.label) for span in spans_a],
+            [(span.start, span.end, span.label) for span in spans_b])
+
+    def test_spans(self):
+        self.assertEqual(len(self.columnar_tier), len(self.tier))
+        self.assertSpansEqual(self.columnar_tier, self.tier.spans)
+        self.assertEqual(self.columnar_tier.labels(), self.tier.labels())
+        self.assertSpansEqual(self.columnar_tier.spans_with_label('quick'),
+                              self.tier.spans_with_label('quick'))
+        self.assertSpansEqual(self.columnar_tier.spans_with_label('a'),
+                              self.tier.spans_with_label('a'))
+
+    def test_queries(self):
+        for start in range(-2, len(self.doc.text) + 2):
+            for end in [None, start + 1, start + 6]:
+                self.assertSpansEqual(self.columnar_tier.spans_over(start, end),
+                                      self.tier.spans_over(start, end))
+                if end:
+                    self.assertSpansEqual(
+                        self.columnar_tier.spans_in(start, end),
+                        self.tier.spans_in(start, end))
+                    self.assertSpansEqual(
+                        self.columnar_tier.spans_at(start, end),
+                        self.tier.spans_at(start, end))
+
+    def test_group_spans_by_containing_span(self):
+        containing_spans = [
+            AnnoSpan(0, 9, self.doc), AnnoSpan(4, 19, self.doc),
+            AnnoSpan(20, 20, self.doc), AnnoSpan(26, 44, self.doc)]
+        containing_tier = AnnoTier(containing_spans)
+        columnar_containing_tier = ColumnarAnnoTier.from_spans(
+            containing_spans)
+        for other_tier in [self.tier, self.columnar_tier]:
+            for partial in [True, False]:
+                expected = list(containing_tier.group_spans_by_containing_span(
+                    self.tier, allow_partial_containment=partial))
+                result = list(
+                    columnar_containing_tier.group_spans_by_containing_span(
+                        other_tier, allow_partial_containment=partial))
+                self.assertEqual(len(result), len(expected))
+                for (span, group), (expected_span, expected_group) in zip(
+                        result, expected):
+                    self.assertIs(span, expected_span)
+                    self.assertSpansEqual(group, expected_group)
+
+    def test_filter_overlapping_spans(self):
+        self.tier.filter_overlapping_spans()
+        self.columnar_tier.filter_overlapping_spans()
+        self.assertSpansEqual(self.columnar_tier, self.tier.spans)
+
+
+if __name__ == '__main__':
+    unittest.main()
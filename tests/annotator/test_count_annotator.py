@@ -135,6 +135,12 @@ class TestCountAnnotator(unittest.TestCase):
         )
         self.assertEqual(len(doc.tiers['counts'].spans), 1)
 
+    def test_lone_order(self):
+        doc = AnnoDoc("A thousand cases were reported.")
+        doc.add_tier(self.annotator)
+        self.assertEqual(len(doc.tiers['counts']), 1)
+        self.assertEqual(doc.tiers['counts'].spans[0].metadata['count'], 1000)
+
     def test_complex(self):
         examples = [
             ("These 2 new cases bring to 4 the number stricken in California this year [2012].", [
@@ -306,5 +312,45 @@ Concerned citizens have said, "50,012, 412, 73, 200 and 16"
     #         })
 
 
+class TestSpacyNumberCountAnnotator(unittest.TestCase):
+
+    def setUp(self):
+        self.annotator = CountAnnotator(number_source='spacy')
+
+    def test_counts(self):
+        examples = [
+            ("There have been nine hundred ninety-nine reported cases.", [
+                {'count': 999, 'attributes': ['case']}
+            ]),
+            ("Two patients died out of four patients.", [
+                {'count': 2, 'attributes': ['case', 'death']},
+                {'count': 4, 'attributes': ['case']},
+            ]),
+        ]
+        for sent, counts in examples:
+            doc = AnnoDoc(sent)
+            doc.add_tier(self.annotator)
+            self.assertNotIn('stanford.nes', doc.tiers)
+            self.assertEqual(len(doc.tiers['counts'].spans), len(counts))
+            for actual, expected in zip(doc.tiers['counts'].spans, counts):
+                test_utils.assertHasProps(actual.metadata, expected)
+
+    def test_false_positive_counts(self):
+        doc = AnnoDoc(
+            "Measles - Democratic Republic of the Congo (Katanga) 2007.1775")
+        doc.add_tier(self.annotator)
+        self.assertEqual(len(doc.tiers['counts']), 0)
+
+    def test_lone_order(self):
+        doc = AnnoDoc("A thousand cases were reported.")
+        doc.add_tier(self.annotator)
+        self.assertEqual(len(doc.tiers['counts']), 1)
+        self.assertEqual(doc.tiers['counts'].spans[0].metadata['count'], 1000)
+
+    def test_unknown_number_source(self):
+        with self.assertRaises(ValueError):
+            CountAnnotator(number_source='regex')
+
+
 if __name__ == '__main__':
     unittest.main()
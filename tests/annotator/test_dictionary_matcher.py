@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""Tests for the DictionaryMatcher"""
+import re
+import unittest
+from annotator.annotator import AnnoDoc, AnnoTier, AnnoSpan
+from annotator.dictionary_matcher import DictionaryMatcher
+
+
+def whitespace_token_tier(doc):
+    return AnnoTier([
+        AnnoSpan(match.start(), match.end(), doc)
+        for match in re.finditer(r"\w+|[^\w\s]", doc.text)])
+
+
+class DictionaryMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = DictionaryMatcher({
+            'hepatitis': 'h',
+            'hepatitis e virus': 'hev',
+            'e': 'letter',
+            'virus': 'v',
+            'AS': 'acronym',
+        }, max_tokens=3)
+
+    def match(self, text, lowercase=False):
+        doc = AnnoDoc(text)
+        return [
+            (doc.text[start:end], value)
+            for start, end, ngram, value in self.matcher.match(
+                doc, whitespace_token_tier(doc), lowercase)]
+
+    def test_overlapping_matches(self):
+        self.assertEqual(self.match('the hepatitis e virus.'), [
+            ('hepatitis', 'h'),
+            ('hepatitis e virus', 'hev'),
+            ('e', 'letter'),
+            ('virus', 'v')])
+
+    def test_token_boundaries(self):
+        self.assertEqual(self.match('hepatitisE viruses'), [])
+
+    def test_whitespace_must_match(self):
+        self.assertEqual(self.match('hepatitis  e virus'), [
+            ('hepatitis', 'h'), ('e', 'letter'), ('virus', 'v')])
+
+    def test_max_tokens(self):
+        matcher = DictionaryMatcher({'hepatitis e virus': 'hev'}, max_tokens=2)
+        doc = AnnoDoc('hepatitis e virus')
+        self.assertEqual(
+            list(matcher.match(doc, whitespace_token_tier(doc))), [])
+
+    def test_lowercase(self):
+        self.assertEqual(self.match('Hepatitis E AS', lowercase=True), [
+            ('Hepatitis', 'h'), ('E', 'letter')])
+        self.assertEqual(self.match('Hepatitis E AS'), [('AS', 'acronym')])
+
+
+if __name__ == '__main__':
+    unittest.main()
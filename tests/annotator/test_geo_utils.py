@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Tests for the vectorized geoname distance and containment functions"""
+import unittest
+import numpy as np
+from annotator.geo_utils import (
+    great_circle_distances, feature_level, admin_path, admin_path_prefix,
+    admin_path_prefix_matrix, containment_levels, grid_cells,
+    grid_cell_ranges, GRID_COLUMNS)
+
+US = {'country_code': 'US', 'admin1_code': '', 'admin2_code': '',
+      'admin3_code': '', 'admin4_code': '', 'feature_code': 'PCLI'}
+WASHINGTON = dict(US, admin1_code='WA', feature_code='ADM1')
+KING_COUNTY = dict(WASHINGTON, admin2_code='033', feature_code='ADM2')
+SEATTLE = dict(KING_COUNTY, feature_code='PPLA2')
+OREGON = dict(US, admin1_code='OR', feature_code='ADM1')
+FRANCE = dict(US, country_code='FR')
+
+
+class GeoUtilsTest(unittest.TestCase):
+
+    def test_great_circle_distances(self):
+        distances = great_circle_distances(
+            np.array([47.60621, 47.60621, 0.0]),
+            np.array([-122.33207, -122.33207, 0.0]),
+            np.array([48.85341, 47.50012, 0.0]),
+            np.array([2.3488, -120.50147, 0.0]))
+        self.assertAlmostEqual(distances[0], 8041.596382456838)
+        self.assertAlmostEqual(distances[1], 137.88188170395145)
+        self.assertEqual(distances[2], 0)
+
+    def test_feature_level(self):
+        self.assertEqual(feature_level('PCLI'), 1)
+        self.assertEqual(feature_level('PCL'), 0)
+        self.assertEqual(feature_level('ADM1'), 2)
+        self.assertEqual(feature_level('ADM4'), 5)
+        self.assertEqual(feature_level('ADMD'), 0)
+        self.assertEqual(feature_level('PPL'), 0)
+
+    def test_admin_path(self):
+        self.assertEqual(admin_path(US), 'US')
+        self.assertEqual(admin_path(SEATTLE), 'US.WA.033')
+        self.assertEqual(admin_path(dict(US, admin2_code='033')), 'US')
+        self.assertEqual(admin_path_prefix('US.WA.033', 2), 'US.WA')
+        self.assertEqual(admin_path_prefix('US.WA.033', 4), None)
+        self.assertEqual(admin_path_prefix('', 1), None)
+
+    def test_containment_levels(self):
+        geonames = [US, WASHINGTON, KING_COUNTY, SEATTLE, OREGON, FRANCE]
+        levels = np.array([
+            feature_level(geoname['feature_code']) for geoname in geonames])
+        prefix_ids = admin_path_prefix_matrix([
+            admin_path(geoname) for geoname in geonames])
+        self.assertEqual(prefix_ids[0].tolist(), [0, -1, -1, -1, -1])
+        self.assertEqual(prefix_ids[3].tolist(), [0, 1, 2, -1, -1])
+        pairs = [
+            (0, 3, 1), (1, 3, 2), (2, 3, 3), (3, 2, 0), (4, 3, 0),
+            (5, 3, 0), (1, 1, 0), (0, 4, 1), (3, 3, 0)]
+        outer, inner, expected = zip(*pairs)
+        self.assertEqual(
+            containment_levels(
+                levels, prefix_ids, np.array(outer), np.array(inner)).tolist(),
+            list(expected))
+
+    def test_grid_cells(self):
+        self.assertEqual(
+            grid_cells([-90, -89.9, 0, 90], [-180, -179.4, 0, 180]).tolist(),
+            [0, 1, 180 * GRID_COLUMNS + GRID_COLUMNS / 2,
+             360 * GRID_COLUMNS - 1])
+
+    def test_grid_cell_ranges(self):
+        def cells_in_ranges(ranges):
+            return set(
+                cell for first, last in ranges.tolist()
+                for cell in range(first, last + 1))
+        # Random points within the radius are in the ranges, including
+        # around the antimeridian and the poles.
+        random_state = np.random.RandomState(0)
+        for lat, lon in [(47.6, -122.3), (-16.5, 179.9), (65, -179.5),
+                         (89.8, 40), (-89.9, 0)]:
+            for radius in [10, 100, 1000]:
+                cells = cells_in_ranges(grid_cell_ranges(lat, lon, radius))
+                lats = random_state.uniform(-90, 90, 100000)
+                lons = random_state.uniform(-180, 180, 100000)
+                distances = great_circle_distances(lat, lon, lats, lons)
+                near = distances <= radius
+                # Points close to the center are always tested.
+                lats = np.concatenate([lats[near], lat + random_state.uniform(
+                    -radius / 111.0, radius / 111.0, 1000)])
+                lons = np.concatenate([lons[near], lon + random_state.uniform(
+                    -1, 1, 1000)])
+                lats = np.clip(lats, -90, 90)
+                lons = (lons + 180) % 360 - 180
+                near = great_circle_distances(lat, lon, lats, lons) <= radius
+                self.assertTrue(near.sum() > 0)
+                self.assertTrue(set(
+                    grid_cells(lats[near], lons[near]).tolist()) <= cells)
+                self.assertTrue(len(cells) < 360 * GRID_COLUMNS)
+
+
+if __name__ == '__main__':
+    unittest.main()
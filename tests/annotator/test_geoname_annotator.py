@@ -3,9 +3,11 @@
 """Tests for the GeonameAnnotator that annotates a sentence with locations from
 the Geonames dataset."""
 import os
+import re
 import unittest
 from annotator.annotator import AnnoDoc
 from annotator.geoname_annotator import GeonameAnnotator
+from annotator.geoname_store import CANDIDATE_GEONAMES_QUERY
 import logging
 logging.getLogger('annotator.geoname_annotator').setLevel(logging.ERROR)
 
@@ -15,6 +17,35 @@ class GeonameAnnotatorTest(unittest.TestCase):
     def setUp(self):
         self.annotator = GeonameAnnotator()
 
+    def test_candidate_query_plan(self):
+        # Create the temporary table of names used by the query.
+        geoname_store = self.annotator.geoname_store
+        geoname_store.query_geonames([])
+        plan = [row[3] for row in geoname_store.connection.execute(
+            'EXPLAIN QUERY PLAN ' + CANDIDATE_GEONAMES_QUERY)]
+        # Older versions of SQLite include the word TABLE in the details.
+        self.assertTrue(
+            re.match(r'SCAN( TABLE)? candidate_names\b', plan[0]), plan)
+        # The other tables are looked up with indexes rather than scanned.
+        for table in ['alternatenames', 'geonames', 'alternatename_counts']:
+            self.assertTrue(any(
+                re.match(r'SEARCH( TABLE)? %s\b.* USING .*'
+                         r'(INDEX|PRIMARY KEY)' % table, detail)
+                for detail in plan), plan)
+
+    def test_candidate_cache(self):
+        text = 'I went to Chicago.'
+        doc = AnnoDoc(text)
+        doc.add_tier(self.annotator)
+        misses = self.annotator.cache_misses
+        self.assertTrue(misses > 0)
+        doc = AnnoDoc(text)
+        doc.add_tier(self.annotator)
+        self.assertEqual(self.annotator.cache_misses, misses)
+        self.assertEqual(self.annotator.cache_hits, misses)
+        self.assertEqual(doc.tiers['geonames'].spans[0].geoname['name'],
+                         'Chicago')
+
     def test_chicago(self):
         text = 'I went to Chicago.'
         doc = AnnoDoc(text)
@@ -26,6 +57,10 @@ class GeonameAnnotatorTest(unittest.TestCase):
         self.assertEqual(doc.tiers['geonames'].spans[0].label, "Chicago")
         self.assertEqual(doc.tiers['geonames'].spans[0].start, 10)
         self.assertEqual(doc.tiers['geonames'].spans[0].end, 17)
+        # The original alternatenames are listed rather than lemmatized ones.
+        self.assertEqual(
+            doc.tiers['geonames'].spans[0].geoname.to_dict()['names_used'],
+            'Chicago')
 
     def test_mulipart_names(self):
         text = 'I used to live in Seattle, WA'
@@ -131,6 +166,25 @@ class GeonameAnnotatorTest(unittest.TestCase):
                 self.assertEqual(
                     next(iter(span.geoname.parents))['name'], 'Nevada')
 
+    def test_annotate_many(self):
+        texts = [
+            "I went to Chicago.",
+            "ebola influenza glanders dermatitis",
+            "Seattle, WA and Paris, France"]
+        docs = [AnnoDoc(text) for text in texts]
+        self.annotator.annotate_many(docs)
+        for text, doc in zip(texts, docs):
+            expected_doc = AnnoDoc(text)
+            expected_doc.add_tier(GeonameAnnotator())
+            self.assertEqual(
+                [(span.start, span.end, span.geoname['geonameid'],
+                  round(span.geoname.score, 6))
+                 for span in doc.tiers['geonames'].spans],
+                [(span.start, span.end, span.geoname['geonameid'],
+                  round(span.geoname.score, 6))
+                 for span in expected_doc.tiers['geonames'].spans])
+        self.assertEqual(len(docs[1].tiers['geonames'].spans), 0)
+
     def test_no_geonames(self):
         doc = AnnoDoc("ebola influenza glanders dermatitis")
         doc.add_tier(self.annotator)
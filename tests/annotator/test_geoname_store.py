@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the stores the GeonameAnnotator looks geonames up in"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+from annotator.geoname_store import SQLiteGeonameStore, MMapGeonameStore
+from annotator.mmap_import_geonames import build_mmap_geoname_store
+from annotator.sqlite_import_geonames import (
+    geonames_field_mappings, add_containment_keys, add_spatial_index)
+from annotator.geo_utils import great_circle_distances
+
+GEONAMES = [
+    (u'5809844', u'Seattle', u'Seattle', 47.60621, -122.33207, u'P', u'PPLA2',
+     u'US', u'', u'WA', u'033', u'', u'', 684451,
+     [u'Seattle', u'Sietl', u'Сиэтл']),
+    (u'5815135', u'Washington', u'Washington', 47.50012, -120.50147, u'A',
+     u'ADM1', u'US', u'', u'WA', u'', u'', u'', 7170351,
+     [u'Washington', u'WA', u'State of Washington']),
+    (u'4140963', u'Washington', u'Washington', 38.89511, -77.03637, u'P',
+     u'PPLC', u'US', u'', u'DC', u'001', u'', u'', 601723,
+     [u'Washington', u'Washington D.C.', u'Washington, D.C.']),
+    (u'2988507', u'Paris', u'Paris', 48.85341, 2.3488, u'P', u'PPLC', u'FR',
+     u'', u'11', u'75', u'751', u'75056', 2138551,
+     [u'Paris', u'París', u'Parigi', u'Paríž']),
+]
+
+
+def create_geoname_database(geonames, containment_keys=True,
+                            spatial_index=True):
+    """Create an in-memory database with sqlite_import_geonames' tables"""
+    connection = sqlite3.connect(':memory:')
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE geonames (" + ",".join([
+        '"' + k + '" ' + sqltype
+        for k, sqltype in geonames_field_mappings if sqltype]) + ")")
+    cursor.execute('''CREATE TABLE alternatenames
+        (geonameid text, alternatename text, alternatename_lemmatized text)''')
+    for geoname in geonames:
+        cursor.execute('INSERT INTO geonames VALUES (' + ','.join(
+            '?' for field in geoname[:-1]) + ')', geoname[:-1])
+        cursor.executemany('INSERT INTO alternatenames VALUES (?, ?, ?)', [
+            (geoname[0], name, name.lower().strip())
+            for name in geoname[-1]])
+    cursor.execute('''CREATE INDEX alternatename_covering_index
+        ON alternatenames (alternatename_lemmatized, geonameid, alternatename)''')
+    cursor.execute('''CREATE TABLE alternatename_counts
+        (geonameid text primary key, count integer)''')
+    cursor.execute('''INSERT INTO alternatename_counts
+        SELECT geonameid, count(alternatename)
+        FROM geonames INNER JOIN alternatenames USING ( geonameid )
+        GROUP BY geonameid''')
+    connection.commit()
+    if containment_keys:
+        add_containment_keys(connection)
+    if spatial_index:
+        add_spatial_index(connection)
+    return connection
+
+
+class GeonameStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.store_path = tempfile.mkdtemp()
+        connection = create_geoname_database(GEONAMES)
+        build_mmap_geoname_store(connection, cls.store_path)
+        cls.sqlite_store = SQLiteGeonameStore(connection)
+        cls.mmap_store = MMapGeonameStore(cls.store_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.store_path)
+
+    def lookup(self, store, names):
+        return {
+            name: sorted(records)
+            for name, records in store.lookup(names).items()}
+
+    def test_lookup(self):
+        result = self.lookup(self.mmap_store, [u'seattle', u'washington'])
+        self.assertEqual(sorted(result.keys()), [u'seattle', u'washington'])
+        self.assertEqual(
+            [record['geonameid'] for record in result[u'washington']],
+            [u'4140963', u'5815135'])
+        seattle = result[u'seattle'][0]
+        self.assertEqual(seattle['name'], u'Seattle')
+        self.assertEqual(seattle['admin2_code'], u'033')
+        self.assertEqual(seattle['population'], 684451)
+        self.assertEqual(seattle.lat_long, (47.60621, -122.33207))
+        self.assertEqual(seattle['name_count'], 3)
+        self.assertEqual(seattle['feature_level'], 0)
+        self.assertEqual(seattle['admin_path'], 'US.WA.033')
+        self.assertEqual(seattle['names_used'], u'Seattle')
+        washington_state = result[u'washington'][1]
+        self.assertEqual(washington_state['feature_level'], 2)
+        self.assertEqual(washington_state['admin_path'], 'US.WA')
+
+    def test_legacy_names_used(self):
+        # Stores built before the names used were added return the
+        # lemmatized names instead.
+        legacy_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, legacy_path)
+        for file_name in os.listdir(self.store_path):
+            if not file_name.startswith('posting_name'):
+                shutil.copy(
+                    os.path.join(self.store_path, file_name), legacy_path)
+        legacy_store = MMapGeonameStore(legacy_path)
+        self.assertFalse(legacy_store.has_posting_names)
+        self.assertEqual(
+            [record['names_used']
+             for record in legacy_store.lookup([u'sietl'])[u'sietl']],
+            [u'sietl'])
+
+    def test_missing_names(self):
+        self.assertEqual(
+            self.mmap_store.lookup([u'', u'seattl', u'seattle2', u'zzz']), {})
+
+    def test_stores_match(self):
+        names = set()
+        for geoname in GEONAMES:
+            for name in geoname[-1]:
+                names.add(name.lower())
+                names.add(name.lower()[:-1])
+        names = list(names)
+        self.assertEqual(
+            self.lookup(self.mmap_store, names),
+            self.lookup(self.sqlite_store, names))
+        # Databases imported without the containment keys
+        # have them computed when geonames are looked up.
+        legacy_store = SQLiteGeonameStore(
+            create_geoname_database(GEONAMES, containment_keys=False))
+        self.assertFalse(legacy_store.has_containment_keys)
+        self.assertEqual(
+            self.lookup(legacy_store, names),
+            self.lookup(self.sqlite_store, names))
+
+    def test_admin_divisions(self):
+        for store in [self.sqlite_store, self.mmap_store]:
+            self.assertEqual(
+                store.get_admin_divisions(['US.WA', 'US.DC', 'US']),
+                {'US.WA': '5815135'})
+        self.assertEqual(self.mmap_store.get_admin_divisions([]), {})
+
+    def test_geonames_within(self):
+        for store in [self.sqlite_store, self.mmap_store]:
+            results = store.geonames_within(47.6, -122.3, 200)
+            self.assertEqual(
+                [record['geonameid'] for record, distance in results],
+                [u'5809844', u'5815135'])
+            self.assertTrue(results[0][1] < 5)
+            self.assertEqual(store.geonames_within(0, 0, 1000), [])
+            self.assertEqual(len(store.geonames_within(0, 0, 20000)), 4)
+
+    def test_nearest_geonames(self):
+        paris_lat_long = (48.85341, 2.3488)
+        distances = great_circle_distances(
+            paris_lat_long[0], paris_lat_long[1],
+            np.array([geoname[3] for geoname in GEONAMES]),
+            np.array([geoname[4] for geoname in GEONAMES]))
+        expected = [GEONAMES[idx][0] for idx in np.argsort(distances)]
+        for store in [self.sqlite_store, self.mmap_store]:
+            for count in range(1, 6):
+                results = store.nearest_geonames(
+                    paris_lat_long[0], paris_lat_long[1], count)
+                self.assertEqual(
+                    [record['geonameid'] for record, distance in results],
+                    expected[:count])
+                self.assertEqual(
+                    [distance for record, distance in results],
+                    sorted(distances.tolist())[:count])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""Tests for the connections the JVMNLPAnnotator makes to the jvm-nlp service"""
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+import requests
+from annotator.annotator import AnnoDoc
+from annotator.jvm_nlp_annotator import (
+    JVMNLPAnnotator, JitteredRetry, StanfordSpan, StanfordTier,
+    create_session)
+from annotator.response_cache import create_response_cache
+from jvm_nlp_server import JVMNLPServer
+
+
+class JVMNLPAnnotatorTest(unittest.TestCase):
+
+    def start_server(self, **kwargs):
+        server = JVMNLPServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_connection_reuse(self):
+        server = self.start_server()
+        annotator = JVMNLPAnnotator(
+            ['tokens'], base_url=server.base_url, session=create_session())
+        docs = [AnnoDoc(text) for text in ["Hi Joe.", "5 cases.", ""]]
+        for doc in docs:
+            annotator.annotate(doc)
+        self.assertEqual(
+            [span.text for span in docs[1].tiers['stanford.tokens'].spans],
+            ['5', 'cases', '.'])
+        self.assertEqual(server.request_count, 3)
+        self.assertEqual(server.connection_count, 1)
+
+    def test_retries(self):
+        server = self.start_server(failures=2)
+        annotator = JVMNLPAnnotator(
+            ['tokens', 'nes'], base_url=server.base_url,
+            session=create_session(backoff_factor=0.01))
+        doc = AnnoDoc("There were 5 cases.")
+        annotator.annotate(doc)
+        self.assertEqual(
+            [span.text for span in doc.tiers['stanford.nes'].spans], ['5'])
+        self.assertEqual(server.request_count, 3)
+        server.failures = 3
+        with self.assertRaises(requests.exceptions.RetryError):
+            JVMNLPAnnotator(
+                ['tokens'], base_url=server.base_url,
+                session=create_session(max_retries=2, backoff_factor=0.01)
+            ).annotate(doc)
+
+    def test_timeout(self):
+        server = self.start_server(delay=1)
+        annotator = JVMNLPAnnotator(
+            ['tokens'], base_url=server.base_url,
+            session=create_session(max_retries=0), timeout=(1, 0.1))
+        with self.assertRaises(requests.exceptions.RequestException):
+            annotator.annotate(AnnoDoc("Hi Joe."))
+
+    def test_annotate_many(self):
+        server = self.start_server(delay=0.1)
+        annotator = JVMNLPAnnotator(
+            ['tokens', 'nes'], base_url=server.base_url,
+            session=create_session())
+        docs = [AnnoDoc("There were %d cases." % idx) for idx in range(12)]
+        self.assertEqual(
+            annotator.annotate_many(docs, max_concurrent_requests=4), docs)
+        self.assertEqual(
+            [doc.tiers['stanford.nes'].spans[0].text for doc in docs],
+            [str(idx) for idx in range(12)])
+        self.assertTrue(1 < server.max_active_requests <= 4)
+        self.assertTrue(server.connection_count <= 4)
+        self.assertEqual(annotator.annotate_many([]), [])
+        # Failed requests raise their errors.
+        server.failures = 1
+        with self.assertRaises(requests.exceptions.RetryError):
+            JVMNLPAnnotator(
+                ['tokens'], base_url=server.base_url,
+                session=create_session(max_retries=0)
+            ).annotate_many([AnnoDoc("Hi Joe."), AnnoDoc("Hi Bob.")])
+
+    def test_response_cache(self):
+        server = self.start_server()
+        cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_directory)
+        cache_path = os.path.join(cache_directory, 'responses.sqlitedb')
+        annotator = JVMNLPAnnotator(
+            ['tokens', 'nes'], base_url=server.base_url,
+            session=create_session(),
+            response_cache=create_response_cache(cache_path))
+        date = datetime.datetime(2018, 3, 1)
+        doc = annotator.annotate(
+            AnnoDoc(u"There were 5 cases [in 2018].", date))
+        self.assertEqual(server.request_count, 1)
+        # Documents that only differ in their brackets are cached together.
+        cached_doc = annotator.annotate(
+            AnnoDoc(u"There were 5 cases  in 2018 .", date))
+        self.assertEqual(server.request_count, 1)
+        self.assertEqual(
+            [(span.start, span.end, span.type)
+             for span in cached_doc.tiers['stanford.nes'].spans],
+            [(span.start, span.end, span.type)
+             for span in doc.tiers['stanford.nes'].spans])
+        # Responses persist across annotators.
+        annotator = JVMNLPAnnotator(
+            ['tokens'], base_url=server.base_url,
+            response_cache=create_response_cache(cache_path))
+        annotator.annotate(AnnoDoc(u"There were 5 cases [in 2018].", date))
+        self.assertEqual(server.request_count, 1)
+        annotator.annotate(AnnoDoc(u"There were 5 cases [in 2018]."))
+        annotator.annotate(AnnoDoc(u"There were 6 cases [in 2018].", date))
+        self.assertEqual(server.request_count, 3)
+
+    def test_lazy_tiers(self):
+        server = self.start_server()
+        annotator = JVMNLPAnnotator(
+            ['tokens', 'nes'], base_url=server.base_url,
+            session=create_session())
+        doc = annotator.annotate(AnnoDoc(u"There were 5 cases."))
+        tokens = doc.tiers['stanford.tokens']
+        self.assertIsInstance(tokens, StanfordTier)
+        self.assertEqual(len(tokens), 5)
+        self.assertIsNone(tokens._spans)
+        self.assertEqual(
+            [span.text for span in tokens.spans_in(0, 13)],
+            ['There', 'were', '5'])
+        self.assertEqual(doc.tiers['stanford.nes'].spans[0].type, 'NUMBER')
+        tokens.spans = tokens.spans[:2]
+        self.assertEqual(len(tokens), 2)
+
+    def test_lazy_times(self):
+        doc = AnnoDoc(u"In 2014 and in the 1990s")
+        span = StanfordSpan({
+            'start': 3, 'stop': 7, 'label': '2014', 'type': 'DATE',
+            'timePoint': {'year': 2014}}, doc)
+        self.assertEqual(span.timePoint.year, 2014)
+        self.assertIs(span.timePoint, span.timePoint)
+        self.assertFalse(hasattr(span, 'timeRange'))
+        span = StanfordSpan({
+            'start': 15, 'stop': 24, 'label': '1990s', 'type': 'DATE',
+            'timeRange': {
+                'begin': {'year': 1990}, 'end': {'year': 1999},
+                'mod': 'LATE'}}, doc)
+        self.assertEqual(span.timeRange.end.year, 1999)
+        self.assertEqual(span.timeRange.mod, 'LATE')
+        self.assertFalse(hasattr(span, 'timePoint'))
+        self.assertEqual(set(span.attribute_dict().keys()), set([
+            'start', 'end', 'label', 'span_dict', 'type', 'timeRange']))
+
+    def test_jittered_backoff(self):
+        retry = JitteredRetry(total=10, backoff_factor=1)
+        for attempt in range(4):
+            retry = retry.increment(method='POST', url='/')
+        backoff_times = [retry.get_backoff_time() for _ in range(100)]
+        self.assertTrue(all(0 <= t <= 8 for t in backoff_times))
+        self.assertTrue(len(set(backoff_times)) > 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Tests for the LRUCache"""
+import threading
+import unittest
+from annotator.lru_cache import LRUCache
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('b', 2), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_eviction(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # Accessing a makes b the least recently used item.
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertTrue('c' in cache)
+
+    def test_get_many(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.set('b', ())
+        found, missing = cache.get_many(['a', 'b', 'c'])
+        self.assertEqual(found, {'a': 1, 'b': ()})
+        self.assertEqual(missing, ['c'])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_clear(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.get('a')
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_threads(self):
+        cache = LRUCache(max_size=50)
+
+        def worker(offset):
+            for i in range(1000):
+                key = (i + offset) % 100
+                if cache.get(key) is None:
+                    cache.set(key, key)
+        threads = [
+            threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 50)
+        self.assertEqual(cache.hits + cache.misses, 8000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Tests for the maximum weight interval set solver"""
+import random
+import unittest
+from annotator import maximum_weight_interval_set as mwis
+
+
+class Endpoint():
+    """Endpoint of the reference solver the array based solver replaced"""
+
+    def __init__(self, interval, is_start):
+        self.interval = interval
+        self.is_start = is_start
+
+    def get_idx(self):
+        if self.is_start:
+            return self.interval.start
+        else:
+            return self.interval.end
+
+    def __lt__(self, other):
+        if self.get_idx() == other.get_idx():
+            return self.is_start and not other.is_start
+        else:
+            return self.get_idx() < other.get_idx()
+
+
+def reference_maximum_weight_interval_set(intervals):
+    endpoints = []
+    for interval in intervals:
+        interval.value = 0.0
+        interval.previous = None
+        endpoints.append(Endpoint(interval, True))
+        endpoints.append(Endpoint(interval, False))
+    max_interval_sofar = None
+    for endpoint in sorted(endpoints):
+        if endpoint.is_start:
+            endpoint.interval.value = endpoint.interval.weight
+            if max_interval_sofar:
+                endpoint.interval.value += max_interval_sofar.value
+                endpoint.interval.previous = max_interval_sofar
+        else:
+            if not max_interval_sofar:
+                max_interval_sofar = endpoint.interval
+            elif endpoint.interval.value >= max_interval_sofar.value:
+                max_interval_sofar = endpoint.interval
+    result = []
+    while max_interval_sofar:
+        result.insert(0, max_interval_sofar)
+        max_interval_sofar = max_interval_sofar.previous
+    return result
+
+
+class MaximumWeightIntervalSetTest(unittest.TestCase):
+
+    def random_intervals(self, size, max_position, max_length, weights):
+        intervals = []
+        for idx in range(size):
+            start = random.randint(0, max_position)
+            intervals.append(mwis.Interval(
+                start=start,
+                end=start + random.randint(0, max_length),
+                weight=random.choice(weights),
+                corresponding_object=idx))
+        return intervals
+
+    def assertSolutionsMatch(self, intervals):
+        expected = [
+            interval.corresponding_object
+            for interval in reference_maximum_weight_interval_set(intervals)]
+        result = [
+            interval.corresponding_object
+            for interval in mwis.find_maximum_weight_interval_set(intervals)]
+        self.assertEqual(result, expected)
+
+    def test_empty(self):
+        self.assertEqual(mwis.find_maximum_weight_interval_set([]), [])
+
+    def test_touching_endpoints_overlap(self):
+        intervals = [
+            mwis.Interval(0, 5, 1, 'a'),
+            mwis.Interval(5, 9, 1, 'b'),
+            mwis.Interval(6, 9, 1, 'c')]
+        self.assertEqual([
+            interval.corresponding_object
+            for interval in mwis.find_maximum_weight_interval_set(intervals)
+        ], ['a', 'c'])
+
+    def test_equivalence_with_ties(self):
+        # Few distinct positions and weights produce many ties and
+        # zero length intervals.
+        random.seed(0)
+        for trial in range(500):
+            self.assertSolutionsMatch(self.random_intervals(
+                random.randint(1, 20), 10, 4, [0, 1, 2, 3]))
+
+    def test_equivalence_with_negative_weights(self):
+        random.seed(1)
+        for trial in range(300):
+            self.assertSolutionsMatch(self.random_intervals(
+                random.randint(1, 20), 30, 8, [-2, -1, 0.5, 1, 2.5]))
+
+    def test_equivalence_large(self):
+        random.seed(2)
+        for trial in range(20):
+            self.assertSolutionsMatch(self.random_intervals(
+                1000, 5000, 40, range(10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
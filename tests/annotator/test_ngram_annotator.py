@@ -49,6 +49,18 @@ class NgramAnnotatorTest(unittest.TestCase):
         self.assertEqual(next(span_iter).text, 'tacos.')
         self.assertEqual(next(span_iter).text, '.')
 
+    def test_iter_ngrams(self):
+
+        doc = AnnoDoc("Bears eat TACOS.")
+        doc.add_tier(self.annotator)
+
+        ngrams = list(doc.tiers['ngrams'].iter_ngrams(lowercase=True))
+        self.assertEqual(len(ngrams), 10)
+        self.assertEqual(ngrams[2], (0, 15, 'bears eat tacos'))
+        self.assertEqual(
+            [(start, end) for start, end, text in ngrams],
+            [(span.start, span.end) for span in doc.tiers['ngrams'].spans])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Tests for the NumberAnnotator that annotates numbers in the spaCy tokens"""
+import unittest
+from annotator.annotator import AnnoDoc
+from annotator.number_annotator import NumberAnnotator, number_token_type
+
+
+class NumberAnnotatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.annotator = NumberAnnotator()
+
+    def annotate_numbers(self, text):
+        doc = AnnoDoc(text)
+        doc.add_tier(self.annotator)
+        return [span.text for span in doc.tiers['numbers'].spans]
+
+    def test_numerals(self):
+        self.assertEqual(
+            self.annotate_numbers(
+                "There were 1,200 cases, 33 deaths and 2.5 hospitalizations."),
+            ['1,200', '33', '2.5'])
+
+    def test_spelled_numbers(self):
+        self.assertEqual(
+            self.annotate_numbers(
+                "Two hundred and twenty two patients were admitted. "
+                "There were five million three hundred and forty eight "
+                "thousand new cases and ninety-nine deaths."),
+            ['Two hundred and twenty two',
+             'five million three hundred and forty eight thousand',
+             'ninety-nine'])
+        self.assertEqual(
+            self.annotate_numbers("About 1.5 million people are at risk."),
+            ['1.5 million'])
+
+    def test_separate_numbers(self):
+        self.assertEqual(
+            self.annotate_numbers("Two patients died out of four patients."),
+            ['Two', 'four'])
+
+    def test_lone_orders(self):
+        self.assertEqual(
+            self.annotate_numbers(
+                "A thousand cases and one hundred deaths were reported."),
+            ['thousand', 'one hundred'])
+
+    def test_dates(self):
+        self.assertEqual(
+            self.annotate_numbers(
+                "28 cases were reported in Jeddah since 27 Mar 2014."),
+            ['28'])
+
+    def test_number_token_type(self):
+        self.assertEqual(
+            [number_token_type(text) for text in [
+                '1,200', 'hundred', 'Twenty', 'nine', 'twelve', 'forty-two',
+                'cases', '-', 'nan']],
+            ['numeral', 'order', 'tens', 'digit', 'word', 'word',
+             None, None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
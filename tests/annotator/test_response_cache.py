@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Tests for the caches of annotation service responses"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from annotator.lru_cache import LRUCache
+from annotator.response_cache import (
+    SQLiteCache, TwoLevelCache, create_response_cache)
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache', 'responses.sqlitedb')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sqlite_cache(self):
+        cache = SQLiteCache(self.path)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 0), 0)
+        cache.set('a', u'{"text": "\u00e9"}')
+        cache.set('b', u'1')
+        cache.set('b', u'2')
+        self.assertEqual(len(cache), 2)
+        # The cache persists across instances.
+        cache = SQLiteCache(self.path)
+        self.assertEqual(cache.get('a'), u'{"text": "\u00e9"}')
+        self.assertEqual(cache.get('b'), u'2')
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_two_level_cache(self):
+        back = SQLiteCache(self.path)
+        back.set('a', u'1')
+        cache = TwoLevelCache(LRUCache(1), back)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(len(cache.front), 0)
+        self.assertEqual(cache.get('a'), u'1')
+        self.assertEqual(cache.front.get('a'), u'1')
+        cache.set('b', u'2')
+        self.assertFalse('a' in cache.front)
+        self.assertEqual(back.get('b'), u'2')
+        self.assertEqual(
+            create_response_cache(self.path, 10).get('b'), u'2')
+
+    def test_threads(self):
+        cache = create_response_cache(self.path, 10)
+
+        def fill(start):
+            for idx in range(start, start + 50):
+                cache.set(str(idx), unicode(idx))
+                self.assertEqual(cache.get(str(idx)), unicode(idx))
+        threads = [
+            threading.Thread(target=fill, args=(start,))
+            for start in range(0, 200, 50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache.back), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
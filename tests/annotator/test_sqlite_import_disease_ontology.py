@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Tests for importing the disease ontology into sqlite"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from annotator.sqlite_import_disease_ontology import (
+    load_disease_ontology, load_parsed_ontology, parse_disease_ontology)
+
+OWL_PATH = os.path.join(
+    os.path.dirname(__file__), 'resources', 'doid_sample.owl')
+OBO = 'http://purl.obolibrary.org/obo/'
+
+
+class SQLiteImportDiseaseOntologyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_directory)
+
+    def test_load_disease_ontology(self):
+        connection = sqlite3.connect(':memory:')
+        load_disease_ontology(connection, OWL_PATH, self.cache_directory)
+        self.assertEqual(sorted(connection.execute(
+            "SELECT * FROM synonyms WHERE uri != ?",
+            (OBO + 'DOID_0050117',))), sorted([
+                (u'viral infectious disease', OBO + u'DOID_934', 3),
+                (u'influenza', OBO + u'DOID_8469', 3),
+                (u'flu', OBO + u'DOID_8469', 2),
+                (u'grippe', OBO + u'DOID_8469', 2),
+                (u'avian influenza', OBO + u'DOID_0050180', 3),
+                (u'bird flu', OBO + u'DOID_0050180', 2),
+                (u'H5N1 influenza', OBO + u'DOID_0050180', 1),
+                (u'h5n1 influenza', OBO + u'DOID_0050180', 1),
+                (u'bacterial infectious disease', OBO + u'DOID_104', 3),
+                (u'bacterial infection', OBO + u'DOID_104', 2),
+                (u'tuberculosis', OBO + u'DOID_399', 3),
+                (u'TB', OBO + u'DOID_399', 2),
+                (u'HIV', OBO + u'DOID_526', 3),
+                (u'Ebola', OBO + u'DOID_4325', 3),
+                (u'EVD', OBO + u'DOID_4325', 3)]))
+        self.assertEqual(sorted(connection.execute(
+            "SELECT * FROM entity_labels")), sorted([
+                (OBO + u'DOID_0050117', u'disease by infectious agent'),
+                (OBO + u'DOID_934', u'viral infectious disease'),
+                (OBO + u'DOID_8469', u'influenza'),
+                (OBO + u'DOID_0050180', u'avian influenza'),
+                (OBO + u'DOID_104', u'bacterial infectious disease'),
+                (OBO + u'DOID_399', u'tuberculosis')]))
+
+    def test_parsed_ontology_cache(self):
+        parsed_ontology = parse_disease_ontology(OWL_PATH)
+        self.assertEqual(
+            load_parsed_ontology(OWL_PATH, self.cache_directory),
+            parsed_ontology)
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+        self.assertEqual(
+            load_parsed_ontology(OWL_PATH, self.cache_directory),
+            parsed_ontology)
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+        # Changed ontologies are parsed again.
+        changed_path = os.path.join(self.cache_directory, 'doid.owl')
+        with open(OWL_PATH) as f:
+            owl = f.read()
+        with open(changed_path, 'w') as f:
+            f.write(owl.replace('>grippe<', '>la grippe<'))
+        superclasses, synonyms = load_parsed_ontology(
+            changed_path, self.cache_directory)
+        self.assertIn(
+            [u'hasExactSynonym', u'la grippe'], synonyms[OBO + 'DOID_8469'])
+        self.assertEqual(len(os.listdir(self.cache_directory)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
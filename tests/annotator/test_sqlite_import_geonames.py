@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for importing the geonames.org table into sqlite"""
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from annotator.sqlite_import_geonames import (
+    load_geonames, update_geonames, get_import_metadata)
+from annotator.geoname_store import SQLiteGeonameStore
+import test_geoname_store
+from test_geoname_store import create_geoname_database
+
+# Alternatenames are separated by commas in the geonames.org table, so names
+# containing them are not used.
+GEONAMES = [
+    geoname[:-1] + ([name for name in geoname[-1] if u',' not in name],)
+    for geoname in test_geoname_store.GEONAMES]
+
+
+def geonames_table_line(geoname):
+    geonameid, name, asciiname, latitude, longitude = geoname[:5]
+    return u'\t'.join([
+        geonameid, name, asciiname, u','.join(geoname[-1]),
+        unicode(latitude), unicode(longitude)
+    ] + list(geoname[5:13]) + [
+        unicode(geoname[13]), u'', u'100', u'Europe/Paris', u'2017-01-01'
+    ]).encode('utf-8') + b'\n'
+
+
+class InterruptedFile(object):
+    """A file that fails after the given number of bytes are read from it"""
+
+    def __init__(self, path, size):
+        self.f = open(path, 'rb')
+        self.size = size
+
+    def read(self, size):
+        if self.f.tell() >= self.size:
+            raise IOError("The connection was lost.")
+        return self.f.read(min(size, self.size - self.f.tell()))
+
+
+class SQLiteImportGeonamesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.table_path = os.path.join(self.directory, 'allCountries.txt')
+        with open(self.table_path, 'wb') as f:
+            for geoname in GEONAMES:
+                f.write(geonames_table_line(geoname))
+        self.expected_store = SQLiteGeonameStore(
+            create_geoname_database(GEONAMES))
+        self.names = [
+            name.lower() for geoname in GEONAMES for name in geoname[-1]]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, file_name, lines):
+        path = os.path.join(self.directory, file_name)
+        with open(path, 'wb') as f:
+            for line in lines:
+                f.write(line)
+        return path
+
+    def assertStoresMatch(self, store, expected_store=None):
+        expected_store = expected_store or self.expected_store
+
+        def lookup(store):
+            return {
+                name: sorted(records)
+                for name, records in store.lookup(self.names).items()}
+        self.assertEqual(lookup(store), lookup(expected_store))
+        self.assertEqual(
+            store.get_admin_divisions(['US.WA', 'US.DC']),
+            expected_store.get_admin_divisions(['US.WA', 'US.DC']))
+        self.assertEqual(
+            store.nearest_geonames(47.6, -122.3, 3),
+            expected_store.nearest_geonames(47.6, -122.3, 3))
+
+    def test_load_geonames(self):
+        connection = sqlite3.connect(os.path.join(self.directory, 'db'))
+        load_geonames(connection, self.table_path, workers=1)
+        self.assertStoresMatch(SQLiteGeonameStore(connection))
+
+    def test_parse_workers(self):
+        connection = sqlite3.connect(os.path.join(self.directory, 'db'))
+        load_geonames(connection, self.table_path, batch_size=1, workers=2)
+        self.assertEqual(
+            list(connection.execute(
+                "SELECT geonameid FROM geonames ORDER BY rowid")),
+            [(geoname[0],) for geoname in GEONAMES])
+        self.assertStoresMatch(SQLiteGeonameStore(connection))
+
+    def test_resume(self):
+        db_path = os.path.join(self.directory, 'db')
+        # The import fails while reading the third geoname, after the
+        # first two were checkpointed.
+        connection = sqlite3.connect(db_path)
+        interrupt_offset = sum(
+            len(geonames_table_line(geoname)) for geoname in GEONAMES[:2]) + 1
+        with self.assertRaises(IOError):
+            load_geonames(
+                connection,
+                InterruptedFile(self.table_path, interrupt_offset),
+                batch_size=1, workers=1)
+        connection.close()
+        connection = sqlite3.connect(db_path)
+        self.assertEqual(
+            list(connection.execute(
+                "SELECT geonameid FROM geonames ORDER BY rowid")),
+            [(u'5809844',), (u'5815135',)])
+        load_geonames(connection, self.table_path, batch_size=1, workers=2)
+        self.assertEqual(
+            list(connection.execute("SELECT count(*) FROM geonames")),
+            [(len(GEONAMES),)])
+        self.assertStoresMatch(SQLiteGeonameStore(connection))
+
+    def test_update_geonames(self):
+        seattle, washington_state, washington_dc, paris = GEONAMES
+        connection = sqlite3.connect(os.path.join(self.directory, 'db'))
+        load_geonames(connection, self.write_file(
+            'allCountries.txt',
+            [geonames_table_line(geoname) for geoname in GEONAMES[:3]]),
+            workers=1)
+        updated_seattle = seattle[:13] + (
+            700000, [u'Seattle', u'Sietl', u'Сиэтл', u'Jet City'])
+        paths = [
+            self.write_file('alternateNamesDeletes-2017-01-02.txt', [
+                u'1\t5809844\tSietl\n'.encode('utf-8'),
+                # Geonames keep their own names.
+                u'2\t2988507\tParis\n'.encode('utf-8')]),
+            self.write_file('alternateNamesModifications-2017-01-02.txt', [
+                u'3\t5809844\ten\tEmerald City\t\t\t1\t\t\t\n'.encode(
+                    'utf-8'),
+                u'4\t5809844\tlink\thttps://en.wikipedia.org/wiki/Seattle'
+                u'\t\t\t\t\t\t\n'.encode('utf-8'),
+                u'5\t4140963\ten\tDC\t\t\t\t\t\t\n'.encode('utf-8')]),
+            self.write_file('deletes-2017-01-02.txt', [
+                u'4140963\tWashington\tduplicate\n'.encode('utf-8')]),
+            # The modifications from the previous day are applied first.
+            self.write_file('modifications-2017-01-01.txt', [
+                geonames_table_line(seattle), geonames_table_line(paris)]),
+            self.write_file('modifications-2017-01-02.txt', [
+                geonames_table_line(updated_seattle)]),
+        ]
+        update_geonames(connection, paths)
+        # The alternatenames of updated geonames are found with an index.
+        plan = [row[3] for row in connection.execute("""EXPLAIN QUERY PLAN
+            DELETE FROM alternatenames WHERE geonameid IN (SELECT '1')""")]
+        self.assertTrue(any(
+            re.match(r'SEARCH( TABLE)? alternatenames USING INDEX', detail)
+            for detail in plan), plan)
+        self.names += [u'jet city', u'emerald city', u'dc']
+        expected_connection = create_geoname_database([
+            updated_seattle[:-1] + (
+                [u'Seattle', u'Сиэтл', u'Jet City', u'Emerald City'],),
+            washington_state,
+            paris])
+        self.assertStoresMatch(
+            SQLiteGeonameStore(connection),
+            SQLiteGeonameStore(expected_connection))
+        for query in [
+                "SELECT * FROM alternatename_counts ORDER BY geonameid",
+                "SELECT * FROM admin_divisions ORDER BY admin_path"]:
+            self.assertEqual(
+                list(connection.execute(query)),
+                list(expected_connection.execute(query)))
+
+    def test_pruning_rules(self):
+        seattle, washington_state, washington_dc, paris = GEONAMES
+        pruning_rules = {
+            'feature_classes': ['P'], 'min_population': 650000,
+            'countries': None}
+        for workers in [1, 2]:
+            connection = sqlite3.connect(
+                os.path.join(self.directory, 'db%d' % workers))
+            load_geonames(
+                connection, self.table_path, batch_size=3, workers=workers,
+                pruning_rules=pruning_rules)
+            self.assertEqual(
+                get_import_metadata(connection)['pruning_rules'],
+                {'feature_classes': ['P'], 'min_population': 650000})
+            self.assertStoresMatch(
+                SQLiteGeonameStore(connection),
+                SQLiteGeonameStore(create_geoname_database([seattle, paris])))
+        # Updates keep the database pruned.
+        update_geonames(connection, [
+            self.write_file('modifications-2017-01-01.txt', [
+                geonames_table_line(seattle[:13] + (600000, seattle[-1])),
+                geonames_table_line(washington_dc[:13] + (
+                    700000, washington_dc[-1]))])])
+        self.assertStoresMatch(
+            SQLiteGeonameStore(connection),
+            SQLiteGeonameStore(create_geoname_database([
+                washington_dc[:13] + (700000, washington_dc[-1]), paris])))
+        self.assertEqual(
+            [tuple(row) for row in connection.execute(
+                "SELECT * FROM alternatename_counts ORDER BY geonameid")],
+            [(u'2988507', 4), (u'4140963', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()